@@ -0,0 +1,135 @@
+import asyncio
+import sqlite3
+import threading
+from contextlib import asynccontextmanager
+import os
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional
+import aiosqlite
+
+from .logger import get_logger
+
+DATABASE_PATH = os.getenv("DATABASE_PATH")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "4"))
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "256"))
+
+logger = get_logger("core.database")
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}",
+)
+
+
+class Database:
+    """
+    Shared access to the SQLite database.
+
+    Request handlers use a small pool of long-lived `aiosqlite` connections,
+    so queries run off the event loop without paying a connect per call.
+    Worker threads (downloads, metadata) use `sync_connection()`, which keeps
+    one plain `sqlite3` connection per thread. Every connection runs in WAL
+    mode with `synchronous=NORMAL`, a busy timeout and a prepared statement
+    cache.
+    """
+
+    def __init__(self, path: str = DATABASE_PATH, pool_size: int = DB_POOL_SIZE):
+        self.path = path
+        self.pool_size = pool_size
+        self._pool: Optional[asyncio.Queue] = None
+        self._connections: List[aiosqlite.Connection] = []
+        self._open_lock = threading.Lock()
+        self._local = threading.local()
+
+    async def connect(self):
+        with self._open_lock:
+            if self._pool is not None:
+                return
+            self._pool = asyncio.Queue()
+
+        for _ in range(self.pool_size):
+            # Autocommit: single statements commit without an extra round
+            # trip to the connection thread, transaction() opens its own
+            conn = await aiosqlite.connect(
+                self.path,
+                cached_statements=DB_STATEMENT_CACHE_SIZE,
+                isolation_level=None,
+            )
+            conn.row_factory = aiosqlite.Row
+            for pragma in PRAGMAS:
+                await conn.execute(pragma)
+            self._connections.append(conn)
+            self._pool.put_nowait(conn)
+
+        logger.info(f"Database pool opened with {self.pool_size} connection(s)")
+
+    async def close(self):
+        if self._pool is None:
+            return
+
+        for conn in self._connections:
+            await conn.close()
+        self._connections = []
+        self._pool = None
+        logger.info("Database pool closed")
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[aiosqlite.Connection]:
+        if self._pool is None:
+            await self.connect()
+
+        pool = self._pool
+        conn = await pool.get()
+        try:
+            yield conn
+        finally:
+            pool.put_nowait(conn)
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[aiosqlite.Connection]:
+        async with self.connection() as conn:
+            await conn.execute("BEGIN")
+            try:
+                yield conn
+                await conn.execute("COMMIT")
+            except BaseException:
+                await conn.execute("ROLLBACK")
+                raise
+
+    async def fetch_one(
+        self, query: str, params: Iterable[Any] = ()
+    ) -> Optional[Dict[str, Any]]:
+        async with self.connection() as conn:
+            rows = await conn.execute_fetchall(query, params)
+            return dict(rows[0]) if rows else None
+
+    async def fetch_all(
+        self, query: str, params: Iterable[Any] = ()
+    ) -> List[Dict[str, Any]]:
+        async with self.connection() as conn:
+            rows = await conn.execute_fetchall(query, params)
+            return [dict(row) for row in rows]
+
+    async def execute(self, query: str, params: Iterable[Any] = ()) -> int:
+        """Run a single write statement, returning the number of changed rows."""
+        async with self.connection() as conn:
+            changes = conn.total_changes
+            await conn.execute_fetchall(query, params)
+            return conn.total_changes - changes
+
+    def sync_connection(self) -> sqlite3.Connection:
+        """Return this thread's long-lived `sqlite3` connection."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.path, cached_statements=DB_STATEMENT_CACHE_SIZE
+            )
+            conn.row_factory = sqlite3.Row
+            for pragma in PRAGMAS:
+                conn.execute(pragma)
+            self._local.conn = conn
+        return conn
+
+
+database = Database()
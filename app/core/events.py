@@ -0,0 +1,134 @@
+import asyncio
+from collections import OrderedDict
+import os
+from typing import Any, Dict, List, Optional, Set
+
+from .logger import get_logger
+
+EVENT_BUS_MAX_PENDING = int(os.getenv("EVENT_BUS_MAX_PENDING", "64"))
+EVENT_BUS_MAX_SUBSCRIBERS = int(os.getenv("EVENT_BUS_MAX_SUBSCRIBERS", "10000"))
+
+logger = get_logger("core.events")
+
+
+class Subscription:
+    """
+    One listener on the bus, for a single download or for all of them.
+
+    Undelivered events are coalesced per download (a newer event replaces
+    an older one for the same job) and capped at `max_pending`, so a slow
+    or idle subscriber costs a bounded amount of memory.
+    """
+
+    def __init__(self, download_id: Optional[str], max_pending: int):
+        self.download_id = download_id
+        self.max_pending = max_pending
+        self._pending: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._ready = asyncio.Event()
+
+    def push(self, event: Dict[str, Any]):
+        key = event["download_id"]
+        self._pending.pop(key, None)
+        self._pending[key] = event
+        while len(self._pending) > self.max_pending:
+            self._pending.popitem(last=False)
+        self._ready.set()
+
+    async def get(self, timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Wait for events and return all pending ones, [] on timeout."""
+        if not self._pending:
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+
+        events = list(self._pending.values())
+        self._pending.clear()
+        self._ready.clear()
+        return events
+
+
+class EventBus:
+    """
+    In-process pub/sub for download state transitions and progress ticks.
+
+    `publish` may be called from any thread; events are handed to the event
+    loop and fanned out there, to subscribers of that download and to
+    subscribers of all downloads.
+    """
+
+    def __init__(
+        self,
+        max_pending: int = EVENT_BUS_MAX_PENDING,
+        max_subscribers: int = EVENT_BUS_MAX_SUBSCRIBERS,
+    ):
+        self.max_pending = max_pending
+        self.max_subscribers = max_subscribers
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._all: Set[Subscription] = set()
+        self._by_download: Dict[str, Set[Subscription]] = {}
+        self._count = 0
+
+    @property
+    def subscriber_count(self) -> int:
+        return self._count
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+
+    def stop(self):
+        self._loop = None
+
+    def subscribe(self, download_id: Optional[str] = None) -> Optional[Subscription]:
+        """Returns None when the subscriber limit has been reached."""
+        if self._count >= self.max_subscribers:
+            return None
+
+        subscription = Subscription(download_id, self.max_pending)
+        if download_id is None:
+            self._all.add(subscription)
+        else:
+            self._by_download.setdefault(download_id, set()).add(subscription)
+        self._count += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        if subscription.download_id is None:
+            subscribers = self._all
+        else:
+            subscribers = self._by_download.get(subscription.download_id, set())
+
+        if subscription in subscribers:
+            subscribers.discard(subscription)
+            self._count -= 1
+        if subscription.download_id is not None and not subscribers:
+            self._by_download.pop(subscription.download_id, None)
+
+    def publish(self, event: Dict[str, Any]):
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+
+        if running is loop:
+            self._dispatch(event)
+            return
+
+        try:
+            loop.call_soon_threadsafe(self._dispatch, event)
+        except RuntimeError:
+            # Loop closed during shutdown, nobody is listening anymore
+            pass
+
+    def _dispatch(self, event: Dict[str, Any]):
+        for subscription in self._all:
+            subscription.push(event)
+        for subscription in self._by_download.get(event["download_id"], ()):
+            subscription.push(event)
+
+
+event_bus = EventBus()
@@ -1,10 +1,27 @@
 import sys
+import atexit
+import copy
 import logging
+import os
+import queue
+import threading
 from pathlib import Path
 from loguru import logger
 
+from .metrics import metrics
+
+LOG_DIR = os.getenv("LOG_DIR", "logs")
+# Per-sink levels; OFF disables the sink
+LOG_CONSOLE_LEVEL = os.getenv("LOG_CONSOLE_LEVEL", "INFO").upper()
+LOG_FILE_LEVEL = os.getenv("LOG_FILE_LEVEL", "DEBUG").upper()
+# One JSON object per line instead of the text format
+LOG_JSON = os.getenv("LOG_JSON", "false").lower() == "true"
+# Write logs from a background thread, dropping messages when the queue is full
+LOG_ASYNC = os.getenv("LOG_ASYNC", "true").lower() == "true"
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
 # Create logs directory if it doesn't exist
-LOGS_DIR = Path("logs")
+LOGS_DIR = Path(LOG_DIR)
 LOGS_DIR.mkdir(exist_ok=True)
 
 # Configure loguru
@@ -14,7 +31,7 @@ config = {
         {
             "sink": sys.stdout,
             "format": "<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>",
-            "level": "INFO",
+            "level": LOG_CONSOLE_LEVEL,
         },
         # File handler
         {
@@ -22,17 +39,111 @@ config = {
             "format": "{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function}:{line} - {message}",
             "rotation": "1 day",
             "retention": "7 days",
-            "level": "DEBUG",
+            "level": LOG_FILE_LEVEL,
         },
     ],
 }
 
+log_messages_dropped = metrics.counter(
+    "log_messages_dropped", "Log messages dropped because the log queue was full"
+)
+
+
+class QueueSink:
+    """
+    Frontend sink handing records to a background writer thread.
+
+    The calling thread only copies the record into a bounded queue; the
+    configured sinks (formatting, file writes, rotation) run on the writer
+    thread, through a separate `backend` logger. When the queue is full the
+    record is dropped and counted, so logging never blocks the event loop.
+    """
+
+    def __init__(self, backend, maxsize: int = LOG_QUEUE_SIZE):
+        # Every record is replayed with its original time, location and extra
+        self._current = None
+        self._backend = backend.patch(lambda record: record.update(self._current))
+        self._queue: queue.Queue = queue.Queue(maxsize)
+        self._dropped = 0
+        self._thread = None
+        self._start_thread()
+
+    def _start_thread(self):
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def after_fork(self):
+        # Threads do not survive fork; worker processes get their own writer
+        self._queue = queue.Queue(self._queue.maxsize)
+        self._dropped = 0
+        self._start_thread()
+
+    def write(self, message):
+        record = message.record
+        try:
+            self._queue.put_nowait(record.copy())
+        except queue.Full:
+            self._dropped += 1
+            log_messages_dropped.inc()
+
+    def _run(self):
+        while True:
+            record = self._queue.get()
+            if record is None:
+                break
+
+            if self._dropped:
+                dropped, self._dropped = self._dropped, 0
+                self._emit(
+                    {
+                        **record,
+                        "level": logger.level("WARNING"),
+                        "message": f"Log queue full, dropped {dropped} message(s)",
+                        "exception": None,
+                    }
+                )
+            self._emit(record)
+
+    def _emit(self, record):
+        self._current = record
+        try:
+            self._backend.log(record["level"].name, record["message"])
+        except Exception:
+            # A failing sink must not kill the writer thread
+            pass
+
+    def stop(self):
+        """Write out queued records, used at interpreter exit."""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+
+
 # Remove default logger
 logger.remove()
 
-# Add new configurations
-for handler in config["handlers"]:
-    logger.add(**handler)
+handlers = [
+    {**handler, "serialize": LOG_JSON}
+    for handler in config["handlers"]
+    if handler["level"] != "OFF"
+]
+
+if LOG_ASYNC and handlers:
+    # The backend is an independent copy holding the real sinks
+    backend = copy.deepcopy(logger)
+    for handler in handlers:
+        backend.add(**handler)
+
+    queue_sink = QueueSink(backend)
+    # Records below every sink's level are discarded before any formatting
+    min_level = min(logger.level(handler["level"]).no for handler in handlers)
+    logger.add(queue_sink.write, level=min_level, format="{message}")
+    atexit.register(queue_sink.stop)
+    os.register_at_fork(after_in_child=queue_sink.after_fork)
+else:
+    # Add new configurations
+    for handler in handlers:
+        logger.add(**handler)
 
 
 # Function to get logger for specific module
@@ -0,0 +1,76 @@
+import json
+import os
+from datetime import date, datetime
+from typing import Any, Mapping, Optional
+from fastapi.responses import JSONResponse, Response
+from starlette.types import Receive, Scope, Send
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+# Serialize trusted list/stats payloads straight to JSON, skipping the
+# response model; off by default
+FAST_JSON_RESPONSES = os.getenv("FAST_JSON_RESPONSES", "false").lower() == "true"
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response rendered with orjson when it is installed, or the standard
+    library otherwise. Content must already be plain JSON data (datetimes
+    allowed); nothing is validated or run through `jsonable_encoder`.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content)
+        return json.dumps(
+            content, default=_default, ensure_ascii=False, separators=(",", ":")
+        ).encode("utf-8")
+
+
+class MemoryResponse(Response):
+    """
+    Response whose body is sent from a memoryview in slices, without copying
+    it. Each slice waits for the previous one to be taken by the server, so
+    slow clients get backpressure instead of a buffered copy of the file.
+    """
+
+    chunk_size = 256 * 1024
+
+    def __init__(
+        self,
+        content: memoryview,
+        status_code: int = 200,
+        headers: Optional[Mapping[str, str]] = None,
+        media_type: Optional[str] = None,
+    ):
+        super().__init__(b"", status_code, headers, media_type)
+        self.headers["content-length"] = str(len(content))
+        self.view = content
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        await send(
+            {
+                "type": "http.response.start",
+                "status": self.status_code,
+                "headers": self.raw_headers,
+            }
+        )
+        if scope["method"] != "HEAD":
+            for start in range(0, len(self.view), self.chunk_size):
+                await send(
+                    {
+                        "type": "http.response.body",
+                        "body": self.view[start : start + self.chunk_size],
+                        "more_body": True,
+                    }
+                )
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
@@ -1,15 +1,27 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import os
-from dotenv import load_dotenv
 
 from .routes.downloads import router as downloads_router
 from .core.logger import get_logger
+from .core.compression import COMPRESSION_ENABLED, CompressionMiddleware
+from .core.metrics import MetricsMiddleware
+from .core.database import database
+from .core.events import event_bus
 from .migrations.migration_manager import MigrationManager
 from .routes.audio import router as audio_router
+from .routes.feed import router as feed_router
+from .routes.metrics import router as metrics_router
+from .services.analytics_service import access_rollup
+from .services.cache_sync import cache_sync
+from .services.download_scheduler import download_scheduler
+from .services.evictor import storage_evictor
+from .services.feed_service import feed_cache
+from .services.filestats_service import access_aggregator
+from .services.file_index import file_index
+from .services.hot_cache import hot_cache
+from .services.transcoder import transcoder
 
-# Load environment variables
-load_dotenv()
 DATABASE_PATH = os.getenv("DATABASE_PATH")
 DOWNLOADS_PATH = os.getenv("DOWNLOADS_PATH", "./downloads")
 
@@ -26,6 +38,20 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compresses JSON and XML responses; audio and event streams pass through
+if COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware)
+
+# Outermost, so timings include compression; exposed on /metrics
+app.add_middleware(MetricsMiddleware)
+
+# Downloads completed or removed by other worker processes
+cache_sync.subscribe("completed_downloads", feed_cache.invalidate)
+cache_sync.subscribe("completed_downloads", file_index.rescan)
+cache_sync.subscribe("completed_downloads", transcoder.invalidate)
+# After the file index, which it reads
+cache_sync.subscribe("completed_downloads", hot_cache.invalidate)
+
 
 @app.on_event("startup")
 async def startup_event():
@@ -37,9 +63,59 @@ async def startup_event():
     # Create downloads directory
     os.makedirs(DOWNLOADS_PATH, exist_ok=True)
 
+    # Open the shared database connection pool
+    await database.connect()
+
+    # Index the downloads directory before serving files
+    await file_index.start()
+
+    # Serve the feed rendered by the previous run until something changes
+    feed_cache.load()
+
+    # Follow changes made by other worker processes
+    await cache_sync.start()
+
+    # Status events are fanned out on this loop
+    event_bus.start()
+
+    # Post-process completed downloads into the configured renditions
+    transcoder.start()
+
+    # Start download workers, resuming any pending jobs
+    download_scheduler.start()
+
+    # Start periodic flushing of buffered file access stats
+    await access_aggregator.start()
+
+    # Start rolling up access events into the analytics tables
+    await access_rollup.start()
+
+    # Keep stored audio within the storage budget
+    await storage_evictor.start()
+
+    # Keep the most played files in memory
+    await hot_cache.start()
+
     logger.info("Application startup completed")
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    logger.info("Shutting down application")
+    download_scheduler.stop()
+    transcoder.stop()
+    event_bus.stop()
+    await access_aggregator.stop()
+    await access_rollup.stop()
+    await storage_evictor.stop()
+    await hot_cache.stop()
+    await cache_sync.stop()
+    await file_index.stop()
+    await database.close()
+
+
 # Include routers
 app.include_router(downloads_router)
 app.include_router(audio_router)
+app.include_router(feed_router)
+app.include_router(metrics_router)
@@ -0,0 +1,45 @@
+import sqlite3
+from ..core.logger import get_logger
+from .migration_manager import MigrationManager, column_exists
+
+logger = get_logger("migrations.005_add_job_queue_columns")
+
+COLUMNS = {
+    "attempts": "INTEGER DEFAULT 0",
+    "next_attempt_at": "TIMESTAMP",
+    "error": "TEXT",
+}
+
+
+def migrate(conn: sqlite3.Connection):
+    c = conn.cursor()
+
+    # Add new columns
+    for column, definition in COLUMNS.items():
+        if column_exists(conn, "downloads", column):
+            logger.warning(f"Column {column} already exists")
+            continue
+        c.execute(f"ALTER TABLE downloads ADD COLUMN {column} {definition}")
+        logger.info(f"Migration successful: Added {column} column")
+
+    # Split legacy "error: <message>" statuses into status + error columns
+    c.execute(
+        """
+        UPDATE downloads
+        SET error = substr(status, 8), status = 'error'
+        WHERE status LIKE 'error:%'
+        """
+    )
+
+    # Index used by the scheduler to pick the next pending job
+    c.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_downloads_queue
+        ON downloads (status, next_attempt_at, created_at)
+        """
+    )
+    logger.info("Migration successful: Added job queue columns")
+
+
+if __name__ == "__main__":
+    MigrationManager.run_standalone(migrate)
@@ -0,0 +1,42 @@
+import sqlite3
+from ..core.logger import get_logger
+from .migration_manager import MigrationManager
+
+logger = get_logger("migrations.006_unique_video_id")
+
+
+def migrate(conn: sqlite3.Connection):
+    c = conn.cursor()
+
+    # Keep a single row per video: the completed one if any, else the newest
+    c.execute(
+        """
+        DELETE FROM downloads
+        WHERE video_id IS NOT NULL
+        AND id NOT IN (
+            SELECT id FROM (
+                SELECT id, ROW_NUMBER() OVER (
+                    PARTITION BY video_id
+                    ORDER BY status = 'completed' DESC, created_at DESC
+                ) AS rank
+                FROM downloads
+                WHERE video_id IS NOT NULL
+            )
+            WHERE rank = 1
+        )
+        """
+    )
+    if c.rowcount:
+        logger.warning(f"Removed {c.rowcount} duplicate download rows")
+
+    c.execute(
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_downloads_video_id
+        ON downloads (video_id)
+        """
+    )
+    logger.info("Migration successful: Added unique index on video_id")
+
+
+if __name__ == "__main__":
+    MigrationManager.run_standalone(migrate)
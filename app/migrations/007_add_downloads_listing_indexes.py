@@ -0,0 +1,23 @@
+import sqlite3
+from ..core.logger import get_logger
+from .migration_manager import MigrationManager
+
+logger = get_logger("migrations.007_add_downloads_listing_indexes")
+
+
+def migrate(conn: sqlite3.Connection):
+    c = conn.cursor()
+
+    # Keyset pagination of /api/files: filter on status, walk the sort key.
+    # The expression must match the one used by DownloadService exactly.
+    c.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_downloads_status_sort
+        ON downloads (status, COALESCE(completed_at, created_at), id)
+        """
+    )
+    logger.info("Migration successful: Added downloads listing indexes")
+
+
+if __name__ == "__main__":
+    MigrationManager.run_standalone(migrate)
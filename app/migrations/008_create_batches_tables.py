@@ -0,0 +1,33 @@
+import sqlite3
+from ..core.logger import get_logger
+from .migration_manager import MigrationManager
+
+logger = get_logger("migrations.008_create_batches_tables")
+
+
+def migrate(conn: sqlite3.Connection):
+    c = conn.cursor()
+
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS batches
+        (id TEXT PRIMARY KEY,
+         source TEXT,
+         created_at TIMESTAMP)
+        """
+    )
+    # Downloads are shared between batches (one row per video_id), so
+    # membership lives in its own table
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS batch_downloads
+        (batch_id TEXT NOT NULL,
+         download_id TEXT NOT NULL,
+         PRIMARY KEY (batch_id, download_id))
+        """
+    )
+    logger.info("Migration successful: Created batches tables")
+
+
+if __name__ == "__main__":
+    MigrationManager.run_standalone(migrate)
@@ -0,0 +1,60 @@
+import sqlite3
+from ..core.logger import get_logger
+from .migration_manager import MigrationManager
+
+logger = get_logger("migrations.009_add_file_access_stats_indexes")
+
+
+def migrate(conn: sqlite3.Connection):
+    c = conn.cursor()
+
+    # /audio/stats walks file_access by (access_count DESC, filename)
+    c.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_file_access_count
+        ON file_access (access_count DESC, filename)
+        """
+    )
+
+    # Row counts maintained by triggers, so totals do not need COUNT(*).
+    # Rows removed by INSERT OR REPLACE do not fire delete triggers, the
+    # app only ever upserts file_access.
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS table_counts
+        (name TEXT PRIMARY KEY,
+         count INTEGER NOT NULL)
+        """
+    )
+    c.execute("SELECT 1 FROM table_counts WHERE name = 'file_access'")
+    if c.fetchone() is None:
+        c.execute(
+            """
+            INSERT INTO table_counts (name, count)
+            SELECT 'file_access', COUNT(*) FROM file_access
+            """
+        )
+    c.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS file_access_count_insert
+        AFTER INSERT ON file_access
+        BEGIN
+            UPDATE table_counts SET count = count + 1 WHERE name = 'file_access';
+        END
+        """
+    )
+    c.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS file_access_count_delete
+        AFTER DELETE ON file_access
+        BEGIN
+            UPDATE table_counts SET count = count - 1 WHERE name = 'file_access';
+        END
+        """
+    )
+
+    logger.info("Migration successful: Added file_access stats index and row count")
+
+
+if __name__ == "__main__":
+    MigrationManager.run_standalone(migrate)
@@ -0,0 +1,75 @@
+import sqlite3
+from ..core.logger import get_logger
+from .migration_manager import MigrationManager
+
+logger = get_logger("migrations.010_create_access_analytics_tables")
+
+
+def migrate(conn: sqlite3.Connection):
+    c = conn.cursor()
+
+    # Raw plays, append only; rowid order is insertion order, which the
+    # compactor uses as its watermark
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS access_events
+        (id INTEGER PRIMARY KEY,
+         filename TEXT NOT NULL,
+         accessed_at TIMESTAMP NOT NULL)
+        """
+    )
+    c.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_access_events_accessed_at
+        ON access_events (accessed_at)
+        """
+    )
+
+    # Rollups, bucketed on UTC hour and day starts
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS access_hourly
+        (filename TEXT NOT NULL,
+         bucket TIMESTAMP NOT NULL,
+         count INTEGER NOT NULL,
+         PRIMARY KEY (filename, bucket)) WITHOUT ROWID
+        """
+    )
+    c.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_access_hourly_bucket
+        ON access_hourly (bucket, filename, count)
+        """
+    )
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS access_daily
+        (filename TEXT NOT NULL,
+         bucket TIMESTAMP NOT NULL,
+         count INTEGER NOT NULL,
+         PRIMARY KEY (filename, bucket)) WITHOUT ROWID
+        """
+    )
+    c.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_access_daily_bucket
+        ON access_daily (bucket, filename, count)
+        """
+    )
+
+    # Last access_events id rolled up
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS access_rollup_state
+        (id INTEGER PRIMARY KEY CHECK (id = 1),
+         last_event_id INTEGER NOT NULL)
+        """
+    )
+    c.execute(
+        "INSERT OR IGNORE INTO access_rollup_state (id, last_event_id) VALUES (1, 0)"
+    )
+    logger.info("Migration successful: Created access analytics tables")
+
+
+if __name__ == "__main__":
+    MigrationManager.run_standalone(migrate)
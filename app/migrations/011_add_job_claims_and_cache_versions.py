@@ -0,0 +1,75 @@
+import sqlite3
+from ..core.logger import get_logger
+from .migration_manager import MigrationManager, column_exists
+
+logger = get_logger("migrations.011_add_job_claims_and_cache_versions")
+
+COLUMNS = {
+    # Scheduler holding a `downloading` job, and when it last said so
+    "claimed_by": "TEXT",
+    "heartbeat_at": "TIMESTAMP",
+}
+
+# Columns that change what the feed and the file listings show
+COMPLETED_COLUMNS = "status, filename, videoname, completed_at"
+
+
+def migrate(conn: sqlite3.Connection):
+    c = conn.cursor()
+
+    for column, definition in COLUMNS.items():
+        if column_exists(conn, "downloads", column):
+            logger.warning(f"Column {column} already exists")
+            continue
+        c.execute(f"ALTER TABLE downloads ADD COLUMN {column} {definition}")
+        logger.info(f"Migration successful: Added {column} column")
+
+    # Polled by every worker process to invalidate its in-memory caches
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS cache_versions
+        (name TEXT PRIMARY KEY,
+         version INTEGER NOT NULL)
+        """
+    )
+    c.execute(
+        "INSERT OR IGNORE INTO cache_versions (name, version) VALUES ('completed_downloads', 0)"
+    )
+
+    # Bumped by triggers, so every writer invalidates without knowing about it
+    bump = "UPDATE cache_versions SET version = version + 1 WHERE name = 'completed_downloads';"
+    c.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS completed_downloads_insert
+        AFTER INSERT ON downloads
+        WHEN NEW.status = 'completed'
+        BEGIN
+            {bump}
+        END
+        """
+    )
+    c.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS completed_downloads_update
+        AFTER UPDATE OF {COMPLETED_COLUMNS} ON downloads
+        WHEN OLD.status = 'completed' OR NEW.status = 'completed'
+        BEGIN
+            {bump}
+        END
+        """
+    )
+    c.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS completed_downloads_delete
+        AFTER DELETE ON downloads
+        WHEN OLD.status = 'completed'
+        BEGIN
+            {bump}
+        END
+        """
+    )
+    logger.info("Migration successful: Added job claims and cache versions")
+
+
+if __name__ == "__main__":
+    MigrationManager.run_standalone(migrate)
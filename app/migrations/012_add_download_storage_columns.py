@@ -0,0 +1,36 @@
+import sqlite3
+from ..core.logger import get_logger
+from .migration_manager import MigrationManager, column_exists
+
+logger = get_logger("migrations.012_add_download_storage_columns")
+
+COLUMNS = {
+    # Key of the file in storage, SHA-256 of its content and its size in bytes
+    "storage_path": "TEXT",
+    "checksum": "TEXT",
+    "size": "INTEGER",
+}
+
+
+def migrate(conn: sqlite3.Connection):
+    c = conn.cursor()
+
+    for column, definition in COLUMNS.items():
+        if column_exists(conn, "downloads", column):
+            logger.warning(f"Column {column} already exists")
+            continue
+        c.execute(f"ALTER TABLE downloads ADD COLUMN {column} {definition}")
+        logger.info(f"Migration successful: Added {column} column")
+
+    # Public filename -> storage path, used for every file index lookup
+    c.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_downloads_filename
+        ON downloads (filename)
+        """
+    )
+    logger.info("Migration successful: Added download storage columns")
+
+
+if __name__ == "__main__":
+    MigrationManager.run_standalone(migrate)
@@ -0,0 +1,51 @@
+import sqlite3
+from ..core.logger import get_logger
+from .migration_manager import MigrationManager
+
+logger = get_logger("migrations.013_create_renditions_table")
+
+
+def migrate(conn: sqlite3.Connection):
+    c = conn.cursor()
+
+    # Transcoded versions of a download, one row per configured rendition
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS renditions
+        (download_id TEXT NOT NULL,
+         name TEXT NOT NULL,
+         status TEXT NOT NULL,
+         storage_path TEXT,
+         checksum TEXT,
+         size INTEGER,
+         content_type TEXT,
+         error TEXT,
+         claimed_by TEXT,
+         updated_at TIMESTAMP,
+         PRIMARY KEY (download_id, name))
+        """
+    )
+    c.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_renditions_status
+        ON renditions (status, updated_at)
+        """
+    )
+
+    # Finished renditions change the feed's enclosures
+    c.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS completed_renditions_update
+        AFTER UPDATE OF status ON renditions
+        WHEN NEW.status = 'completed' OR OLD.status = 'completed'
+        BEGIN
+            UPDATE cache_versions SET version = version + 1
+            WHERE name = 'completed_downloads';
+        END
+        """
+    )
+    logger.info("Migration successful: Created renditions table")
+
+
+if __name__ == "__main__":
+    MigrationManager.run_standalone(migrate)
@@ -0,0 +1,29 @@
+import sqlite3
+from ..core.logger import get_logger
+from .migration_manager import MigrationManager
+
+logger = get_logger("migrations.014_add_storage_path_indexes")
+
+
+def migrate(conn: sqlite3.Connection):
+    c = conn.cursor()
+
+    # Identical content shares one stored object; the evictor checks for
+    # other references before deleting it
+    c.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_downloads_storage_path
+        ON downloads (storage_path)
+        """
+    )
+    c.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_renditions_storage_path
+        ON renditions (storage_path)
+        """
+    )
+    logger.info("Migration successful: Added storage path indexes")
+
+
+if __name__ == "__main__":
+    MigrationManager.run_standalone(migrate)
@@ -0,0 +1,32 @@
+import sqlite3
+from ..core.logger import get_logger
+from .migration_manager import MigrationManager
+
+logger = get_logger("migrations.015_create_audio_info_table")
+
+
+def migrate(conn: sqlite3.Connection):
+    c = conn.cursor()
+
+    # Container details and waveform of stored audio, by content checksum so
+    # identical files share one row
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS audio_info
+        (checksum TEXT PRIMARY KEY,
+         codec TEXT,
+         duration REAL,
+         bitrate INTEGER,
+         sample_rate INTEGER,
+         channels INTEGER,
+         data_offset INTEGER,
+         data_size INTEGER,
+         peaks BLOB,
+         analyzed_at TIMESTAMP)
+        """
+    )
+    logger.info("Migration successful: Created audio_info table")
+
+
+if __name__ == "__main__":
+    MigrationManager.run_standalone(migrate)
@@ -0,0 +1,57 @@
+import sqlite3
+from ..core.logger import get_logger
+from .migration_manager import MigrationManager
+
+logger = get_logger("migrations.016_autoincrement_access_events")
+
+
+def migrate(conn: sqlite3.Connection):
+    c = conn.cursor()
+
+    # Without AUTOINCREMENT, SQLite reuses ids once retention has emptied
+    # the table, and new events at or below the rollup watermark were
+    # never rolled up. Rebuild the table so ids only ever grow.
+    c.execute(
+        """
+        CREATE TABLE access_events_new
+        (id INTEGER PRIMARY KEY AUTOINCREMENT,
+         filename TEXT NOT NULL,
+         accessed_at TIMESTAMP NOT NULL)
+        """
+    )
+    c.execute(
+        """
+        INSERT INTO access_events_new (id, filename, accessed_at)
+        SELECT id, filename, accessed_at FROM access_events
+        """
+    )
+    c.execute("DROP TABLE access_events")
+    c.execute("ALTER TABLE access_events_new RENAME TO access_events")
+    c.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_access_events_accessed_at
+        ON access_events (accessed_at)
+        """
+    )
+
+    # Continue numbering above the watermark, even if the table is empty
+    c.execute("SELECT last_event_id FROM access_rollup_state WHERE id = 1")
+    row = c.fetchone()
+    last_event_id = row[0] if row else 0
+    c.execute("SELECT seq FROM sqlite_sequence WHERE name = 'access_events'")
+    row = c.fetchone()
+    if row is None:
+        c.execute(
+            "INSERT INTO sqlite_sequence (name, seq) VALUES ('access_events', ?)",
+            (last_event_id,),
+        )
+    elif row[0] < last_event_id:
+        c.execute(
+            "UPDATE sqlite_sequence SET seq = ? WHERE name = 'access_events'",
+            (last_event_id,),
+        )
+    logger.info("Migration successful: Made access_events ids monotonic")
+
+
+if __name__ == "__main__":
+    MigrationManager.run_standalone(migrate)
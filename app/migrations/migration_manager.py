@@ -1,48 +1,148 @@
 import os
 import importlib
-from typing import List
+import sqlite3
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Tuple
 import re
+from ..core.database import DATABASE_PATH, DB_BUSY_TIMEOUT_MS
 from ..core.logger import get_logger
 
+try:
+    import fcntl
+except ImportError:  # Windows: rely on BEGIN IMMEDIATE alone
+    fcntl = None
+
 logger = get_logger("migrations.manager")
 
+MIGRATION_FILE = re.compile(r"^(\d+)_\w+\.py$")
+
+
+def connect() -> sqlite3.Connection:
+    # Ensure data directory exists
+    os.makedirs(os.path.dirname(DATABASE_PATH), exist_ok=True)
+
+    # Transactions are opened explicitly, one per migration
+    conn = sqlite3.connect(DATABASE_PATH, isolation_level=None)
+    conn.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+    return conn
+
+
+@contextmanager
+def migration_lock() -> Iterator[None]:
+    """
+    Exclusive lock next to the database file, held while migrating, so
+    worker processes starting together apply migrations one at a time.
+    """
+    if fcntl is None:
+        yield
+        return
+
+    with open(DATABASE_PATH + ".migrate.lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def column_exists(conn: sqlite3.Connection, table: str, column: str) -> bool:
+    return any(row[1] == column for row in conn.execute(f"PRAGMA table_info({table})"))
+
+
+def migration_files() -> List[Tuple[int, str]]:
+    """(version, module name) of every numbered migration, in order."""
+    migrations_dir = os.path.dirname(os.path.abspath(__file__))
+    migrations = []
+    for filename in os.listdir(migrations_dir):
+        match = MIGRATION_FILE.match(filename)
+        if match:
+            migrations.append((int(match.group(1)), filename[:-3]))
+    return sorted(migrations)
+
 
 class MigrationManager:
+    """
+    Applies numbered migrations once each, recording them in
+    `schema_migrations`.
+
+    An up-to-date database costs a single query at startup: migration modules
+    are only imported when pending. Each migration runs in its own
+    transaction together with its version row, so a failed migration leaves
+    no partial schema change behind and is retried on the next start. Worker
+    processes starting together are serialized by `migration_lock()`.
+    """
+
     @staticmethod
     def run_migrations():
-        logger.info("Starting database migrations")
+        conn = connect()
+        try:
+            with migration_lock():
+                MigrationManager._run_pending(conn)
+        finally:
+            conn.close()
 
-        # Get the current directory (migrations folder)
-        migrations_dir = os.path.dirname(os.path.abspath(__file__))
-
-        # Get all Python files that start with a number (migration files)
-        migration_files = [
-            f
-            for f in os.listdir(migrations_dir)
-            if f.endswith(".py") and re.match(r"^\d+", f)
+    @staticmethod
+    def _run_pending(conn: sqlite3.Connection):
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS schema_migrations
+            (version INTEGER PRIMARY KEY,
+             name TEXT NOT NULL,
+             applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP)
+            """
+        )
+        applied = {row[0] for row in conn.execute("SELECT version FROM schema_migrations")}
+        pending = [
+            (version, name) for version, name in migration_files() if version not in applied
         ]
+        if not pending:
+            logger.info(f"Database schema is up to date (version {max(applied, default=0)})")
+            return
 
-        # Sort files by number prefix
-        migration_files.sort()
+        logger.info(f"Applying {len(pending)} pending migration(s)")
+        for version, name in pending:
+            MigrationManager._apply(conn, version, name)
+        logger.info("All migrations completed successfully")
 
-        # Run each migration
-        for migration_file in migration_files:
-            try:
-                # Convert filename to module name
-                module_name = migration_file[:-3]  # Remove .py extension
-                logger.info(f"Running migration: {module_name}")
+    @staticmethod
+    def _apply(conn: sqlite3.Connection, version: int, name: str):
+        module = importlib.import_module(f"..migrations.{name}", package=__package__)
 
-                # Import the migration module
-                module = importlib.import_module(
-                    f"..migrations.{module_name}", package=__package__
-                )
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Another process may have applied it while we waited, e.g. where
+            # the file lock is unavailable
+            if conn.execute(
+                "SELECT 1 FROM schema_migrations WHERE version = ?", (version,)
+            ).fetchone():
+                conn.execute("ROLLBACK")
+                return
 
-                # Run the migration
-                module.migrate()
-                logger.info(f"Successfully completed migration: {module_name}")
+            logger.info(f"Running migration: {name}")
+            module.migrate(conn)
+            conn.execute(
+                "INSERT INTO schema_migrations (version, name) VALUES (?, ?)",
+                (version, name),
+            )
+            conn.execute("COMMIT")
+            logger.info(f"Successfully completed migration: {name}")
 
-            except Exception as e:
-                logger.error(f"Error running migration {migration_file}: {str(e)}")
-                raise e
+        except Exception as e:
+            conn.execute("ROLLBACK")
+            logger.error(f"Error running migration {name}: {str(e)}")
+            raise e
 
-        logger.info("All migrations completed successfully")
+    @staticmethod
+    def run_standalone(migrate: Callable[[sqlite3.Connection], None]):
+        """Run a single migration in a transaction, without recording it."""
+        conn = connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                migrate(conn)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
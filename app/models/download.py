@@ -1,6 +1,6 @@
 from pydantic import BaseModel, HttpUrl
 from datetime import datetime
-from typing import Optional
+from typing import Any, Dict, List, Optional
 
 
 class DownloadRequest(BaseModel):
@@ -10,24 +10,78 @@ class DownloadRequest(BaseModel):
     status: str
 
 
+class DownloadProgress(BaseModel):
+    bytes_downloaded: int
+    total_bytes: Optional[int] = None
+    throughput_bps: float
+
+
 class DownloadStatus(BaseModel):
     id: str
     url: str
     video_id: str
     status: str
+    videoname: Optional[str] = None
     filename: Optional[str] = None
+    error: Optional[str] = None
+    attempts: int = 0
     created_at: datetime
     completed_at: Optional[datetime] = None
+    progress: Optional[DownloadProgress] = None
 
 
 class FileInfo(BaseModel):
     id: str
     url: str
     filename: str
-    filepath: str
-    size: int
+    filepath: Optional[str] = None
+    size: Optional[int] = None
     created_at: datetime | None
     completed_at: datetime | None
     video_id: str | None
     videoname: str | None
     status: str
+    # Seconds, bits per second and codec name, once the file has been analyzed
+    duration: Optional[float] = None
+    bitrate: Optional[int] = None
+    codec: Optional[str] = None
+
+
+class FilePage(BaseModel):
+    # Rows are FileInfo dicts, possibly projected with `fields=`
+    data: List[Dict[str, Any]]
+    next_cursor: Optional[str] = None
+    limit: int
+
+
+class BatchDownloadRequest(BaseModel):
+    urls: List[HttpUrl] = []
+    # A playlist or channel URL, expanded into its videos
+    playlist_url: Optional[HttpUrl] = None
+
+
+class BatchDownloadItem(BaseModel):
+    id: str
+    video_id: str
+    status: str
+    videoname: Optional[str] = None
+    progress: Optional[DownloadProgress] = None
+
+
+class BatchProgress(BaseModel):
+    total: int
+    pending: int = 0
+    downloading: int = 0
+    completed: int = 0
+    error: int = 0
+    percent: float
+
+
+class BatchStatus(BaseModel):
+    id: str
+    source: Optional[str] = None
+    created_at: datetime
+    progress: BatchProgress
+    downloads: List[BatchDownloadItem]
+    # Submitted URLs that are not YouTube videos, playlists or channels
+    rejected: List[str] = []
@@ -1,11 +1,25 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Request, Response
 from fastapi.responses import FileResponse
-from typing import List, Optional, Union
+from typing import List, Literal, Optional, Tuple, Union
 from datetime import datetime
-import os
+from email.utils import parsedate_to_datetime
 from pydantic import BaseModel
 from ..core.logger import get_logger
+from ..core.responses import FAST_JSON_RESPONSES, FastJSONResponse, MemoryResponse
+from ..utils.pagination import decode_cursor, encode_cursor
+from ..services.analytics_service import AccessAnalytics
+from ..services.audio_info import audio_info_store
+from ..services.download_scheduler import download_scheduler
+from ..services.evictor import EVICTION_RETRY_AFTER, storage_evictor
 from ..services.filestats_service import FileStats
+from ..services.hot_cache import hot_cache, hot_cache_bytes_served
+from ..services.transcoder import transcoder
+from ..services.file_index import (
+    ALLOWED_EXTENSIONS,
+    FileEntry,
+    file_index,
+    get_extension,
+)
 
 logger = get_logger("routes.audio")
 
@@ -22,22 +36,108 @@ class PaginatedStats(BaseModel):
     total: int
     skip: int
     limit: int
+    # Pass as `cursor` for the next page; constant time at any depth
+    next_cursor: Optional[str] = None
+
+
+class TrendingFile(BaseModel):
+    filename: str
+    plays: int
+
+
+class TrendingStats(BaseModel):
+    data: List[TrendingFile]
+    hours: int
+
+
+class TimeseriesPoint(BaseModel):
+    bucket: datetime
+    count: int
+
+
+class AccessTimeseries(BaseModel):
+    filename: str
+    granularity: str
+    points: List[TimeseriesPoint]
+
+
+class AudioPeaks(BaseModel):
+    filename: str
+    codec: str
+    duration: float
+    bitrate: int
+    sample_rate: int
+    channels: int
+    # Audio data lies at [data_offset, data_offset + data_size) in the file;
+    # a byte offset for t seconds is about data_offset + t * bitrate / 8
+    data_offset: int
+    data_size: int
+    # Peak amplitude (0-255) of consecutive, equally long slices of the audio
+    peaks: List[int]
 
 
 router = APIRouter(prefix="/audio", tags=["audio"])
 file_stats = FileStats()
+access_analytics = AccessAnalytics()
 
-DOWNLOADS_PATH = os.getenv("DOWNLOADS_PATH", "./downloads")
-ALLOWED_EXTENSIONS = {".mp3", ".wav", ".ogg", ".flac", ".m4a"}
 MAX_FILE_SIZE_MB = 300
 
 
 @router.get("/stats", response_model=PaginatedStats)
-async def get_all_stats(skip: int = 0, limit: int = 10):
-    stats = await file_stats.get_stats(skip, limit)
-    total = await file_stats.get_total_count()
+async def get_all_stats(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(10, ge=1, le=500),
+    cursor: Optional[str] = None,
+):
+    after = None
+    if cursor is not None:
+        after = decode_cursor(cursor, 2)
+        if (
+            after is None
+            or not isinstance(after[0], int)
+            or not isinstance(after[1], str)
+        ):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        skip = 0
+
+    page = await file_stats.get_stats_page(limit, skip=skip, after=after)
+    stats = {
+        "data": page["data"],
+        "total": page["total"],
+        "skip": skip,
+        "limit": limit,
+        "next_cursor": encode_cursor(*page["next"]) if page["next"] else None,
+    }
+
+    # Rows come from our own queries, no need to validate them again
+    if FAST_JSON_RESPONSES:
+        return FastJSONResponse(stats)
+    return PaginatedStats(**stats)
+
 
-    return PaginatedStats(data=stats, total=total, skip=skip, limit=limit)
+# Analytics read the hourly/daily rollups, which lag plays by up to
+# STATS_FLUSH_INTERVAL + ACCESS_ROLLUP_INTERVAL seconds.
+# Declared before /stats/{filename} so "trending" is not taken for a filename
+@router.get("/stats/trending", response_model=TrendingStats)
+async def get_trending(
+    hours: int = Query(168, ge=1, le=24 * 366), limit: int = Query(10, ge=1, le=500)
+):
+    data = await access_analytics.get_trending(hours, limit)
+    return TrendingStats(data=data, hours=hours)
+
+
+@router.get("/stats/{filename}/timeseries", response_model=AccessTimeseries)
+async def get_file_timeseries(
+    filename: str,
+    granularity: Literal["hour", "day"] = "day",
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+):
+    try:
+        points = await access_analytics.get_timeseries(filename, granularity, since, until)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return AccessTimeseries(filename=filename, granularity=granularity, points=points)
 
 
 @router.get("/stats/{filename}", response_model=FileAccessStats)
@@ -48,31 +148,197 @@ async def get_file_stats(filename: str):
     return stat
 
 
-@router.get("/{filename}")
-async def serve_audio(filename: str):
-    file_path = os.path.join(DOWNLOADS_PATH, filename)
+def _is_not_modified(request: Request, entry: FileEntry) -> bool:
+    # If-None-Match takes precedence over If-Modified-Since (RFC 9110 13.2.2)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        etags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return entry.etag in etags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return int(entry.mtime) <= since.timestamp()
+
+    return False
 
-    # Validate file exists
-    if not os.path.exists(file_path):
-        raise HTTPException(status_code=404, detail="File not found")
 
+def _is_playback_start(request: Request) -> bool:
+    # Players issue many range requests per listen, only count the first one
+    if request.method != "GET":
+        return False
+    http_range = request.headers.get("range")
+    return http_range is None or http_range.replace(" ", "").startswith("bytes=0-")
+
+
+def _single_range(http_range: str, size: int) -> Optional[Tuple[int, int]]:
+    """Inclusive bounds of a single satisfiable byte range, None for anything else."""
+    unit, _, spec = http_range.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, dash, last = spec.strip().partition("-")
+    if not dash:
+        return None
+    try:
+        if not first:
+            # Suffix range: the last N bytes
+            length = int(last)
+            return (max(size - length, 0), size - 1) if length > 0 else None
+        start, end = int(first), int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start > end or start >= size:
+        return None
+    return start, min(end, size - 1)
+
+
+def _accept_quality(accept: str, content_type: str) -> float:
+    """q-value an Accept header gives a media type, from its most specific match."""
+    major = content_type.split("/")[0]
+    specificity, quality = -1, 0.0
+    for part in accept.split(","):
+        media_range, *params = [param.strip() for param in part.split(";")]
+        media_range = media_range.lower()
+        if media_range == content_type:
+            match = 2
+        elif media_range == f"{major}/*":
+            match = 1
+        elif media_range == "*/*":
+            match = 0
+        else:
+            continue
+
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if match > specificity:
+            specificity, quality = match, q
+    return quality
+
+
+def _negotiate_rendition(request: Request, entry: FileEntry) -> Optional[str]:
+    # Only a rendition preferred strictly over the original is chosen
+    accept = request.headers.get("accept")
+    if not accept or not transcoder.enabled:
+        return None
+    chosen, best = None, _accept_quality(accept, entry.content_type)
+    for name, rendition in transcoder.renditions.items():
+        quality = _accept_quality(accept, rendition.codec.content_type)
+        if quality > best:
+            chosen, best = name, quality
+    return chosen
+
+
+@router.get("/{filename}/peaks", response_model=AudioPeaks)
+async def get_peaks(
+    filename: str, request: Request, format: Literal["json", "binary"] = "json"
+):
+    """Waveform of a file, raw bytes with `format=binary`."""
+    info = await audio_info_store.get(filename)
+    if info is None or info["peaks"] is None:
+        raise HTTPException(status_code=404, detail="Waveform not available")
+
+    # Peaks only change with the content, which the checksum names
+    headers = {"ETag": f'"{info["checksum"]}-{format}"'}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None and headers["ETag"] in {
+        tag.strip().removeprefix("W/") for tag in if_none_match.split(",")
+    }:
+        return Response(status_code=304, headers=headers)
+
+    if format == "binary":
+        return Response(
+            bytes(info["peaks"]), media_type="application/octet-stream", headers=headers
+        )
+    return FastJSONResponse(
+        AudioPeaks(filename=filename, **{**info, "peaks": list(info["peaks"])}).model_dump(),
+        headers=headers,
+    )
+
+
+@router.api_route("/{filename}", methods=["GET", "HEAD"])
+async def serve_audio(filename: str, request: Request, rendition: Optional[str] = None):
     # Validate file extension
-    if not any(filename.lower().endswith(ext) for ext in ALLOWED_EXTENSIONS):
+    if get_extension(filename) not in ALLOWED_EXTENSIONS:
         raise HTTPException(status_code=400, detail="Invalid file type")
 
+    # Validate file exists, from the in-memory index (stats the file on a miss)
+    entry = file_index.get(filename) or await file_index.reload(filename)
+    if entry is None:
+        # Evicted to stay within the storage budget: download it again
+        if await storage_evictor.restore(filename):
+            download_scheduler.notify()
+            raise HTTPException(
+                status_code=503,
+                detail="File is being downloaded again",
+                headers={"Retry-After": str(EVICTION_RETRY_AFTER)},
+            )
+        raise HTTPException(status_code=404, detail="File not found")
+
+    # Transcoded renditions, by name or by Accept; the original is served
+    # until the rendition has been built
+    if rendition is not None and rendition not in transcoder.renditions:
+        raise HTTPException(status_code=400, detail="Unknown rendition")
+    rendition = rendition or _negotiate_rendition(request, entry)
+    if rendition is not None:
+        entry = await transcoder.get(filename, rendition) or entry
+
     # Validate file size
-    file_size_mb = os.path.getsize(file_path) / (1024 * 1024)
+    file_size_mb = entry.size / (1024 * 1024)
     if file_size_mb > MAX_FILE_SIZE_MB:
         raise HTTPException(status_code=400, detail="File too large")
 
+    headers = {
+        "ETag": entry.etag,
+        "Last-Modified": entry.last_modified,
+        "Accept-Ranges": "bytes",
+    }
+    if transcoder.enabled:
+        headers["Vary"] = "Accept"
+
+    # Conditional requests from re-polling clients cost headers only
+    if _is_not_modified(request, entry):
+        return Response(status_code=304, headers=headers)
+
     # Update stats
-    await file_stats.record_access(filename)
+    if _is_playback_start(request):
+        await file_stats.record_access(filename)
+
+    # Hot files are sent straight from memory; HEAD, multi-range,
+    # unsatisfiable and If-Range requests are left to FileResponse
+    http_range = request.headers.get("range")
+    if request.method == "GET" and "if-range" not in request.headers:
+        bounds = (0, entry.size - 1) if http_range is None else _single_range(http_range, entry.size)
+        data = hot_cache.get(entry) if bounds is not None else None
+        if data is not None:
+            start, end = bounds
+            headers["Content-Disposition"] = f"inline; filename={entry.filename}"
+            if http_range is not None:
+                headers["Content-Range"] = f"bytes {start}-{end}/{entry.size}"
+            hot_cache_bytes_served.inc(amount=end - start + 1)
+            return MemoryResponse(
+                data[start : end + 1],
+                status_code=200 if http_range is None else 206,
+                media_type=entry.content_type,
+                headers=headers,
+            )
 
+    # FileResponse answers HEAD, single and multi-range (206) requests, and
+    # uses the ASGI pathsend extension for zero-copy when the server has it
+    headers["Content-Disposition"] = f"inline; filename={entry.filename}"
     return FileResponse(
-        file_path,
-        media_type="audio/mp4",  # For .m4a files
-        headers={
-            "Accept-Ranges": "bytes",
-            "Content-Disposition": f"inline; filename={filename}",
-        },
+        entry.path,
+        stat_result=entry.stat,
+        media_type=entry.content_type,
+        headers=headers,
     )
@@ -1,10 +1,19 @@
-from fastapi import APIRouter, BackgroundTasks
+from datetime import datetime
+from fastapi import APIRouter, Query
+from fastapi.responses import StreamingResponse
 from pydantic import HttpUrl
-from typing import List
+from typing import Optional
 
-from ..models.download import DownloadRequest, DownloadStatus, FileInfo
+from ..models.download import (
+    BatchDownloadRequest,
+    BatchStatus,
+    DownloadRequest,
+    DownloadStatus,
+    FilePage,
+)
 from ..use_cases.download_use_cases import DownloadUseCases
 from ..core.logger import get_logger
+from ..core.responses import FAST_JSON_RESPONSES, FastJSONResponse
 
 logger = get_logger("routes.downloads")
 
@@ -13,8 +22,32 @@ download_use_cases = DownloadUseCases()
 
 
 @router.post("/download", response_model=DownloadRequest)
-async def create_download(url: HttpUrl, background_tasks: BackgroundTasks):
-    return await download_use_cases.create_download(str(url), background_tasks)
+async def create_download(url: HttpUrl):
+    return await download_use_cases.create_download(str(url))
+
+
+@router.post("/downloads/batch", response_model=BatchStatus)
+async def create_batch(request: BatchDownloadRequest):
+    return await download_use_cases.create_batch(
+        [str(url) for url in request.urls],
+        str(request.playlist_url) if request.playlist_url else None,
+    )
+
+
+@router.get("/downloads/batch/{batch_id}", response_model=BatchStatus)
+async def get_batch(batch_id: str):
+    return await download_use_cases.get_batch(batch_id)
+
+
+# Declared before /status/{download_id} so "stream" is not taken for an id
+@router.get("/status/stream")
+async def stream_status(download_id: Optional[str] = None):
+    events = await download_use_cases.subscribe_status(download_id)
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.get("/status/{download_id}", response_model=DownloadStatus)
@@ -22,6 +55,28 @@ async def get_status(download_id: str):
     return await download_use_cases.get_download_status(download_id)
 
 
-@router.get("/files", response_model=List[FileInfo])
-async def list_files():
-    return await download_use_cases.list_files()
+@router.get("/files", response_model=FilePage)
+async def list_files(
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    status: str = "completed",
+    completed_after: Optional[datetime] = None,
+    completed_before: Optional[datetime] = None,
+    video_id: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated FileInfo fields"),
+):
+    page = await download_use_cases.list_files(
+        limit=limit,
+        cursor=cursor,
+        status=status,
+        completed_after=completed_after,
+        completed_before=completed_before,
+        video_id=video_id,
+        fields=fields,
+    )
+
+    # Rows come from our own queries; the fast path skips the response
+    # model, otherwise FastAPI validates them against FilePage
+    if FAST_JSON_RESPONSES:
+        return FastJSONResponse(page)
+    return page
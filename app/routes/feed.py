@@ -0,0 +1,57 @@
+from fastapi import APIRouter, Request, Response
+import os
+
+from ..core.logger import get_logger
+from ..services.feed_service import feed_cache
+
+# Public URL of the API, used for enclosure links; defaults to the request's
+PUBLIC_BASE_URL = os.getenv("PUBLIC_BASE_URL")
+FEED_CACHE_MAX_AGE = int(os.getenv("FEED_CACHE_MAX_AGE", "300"))
+
+logger = get_logger("routes.feed")
+
+router = APIRouter(tags=["feed"])
+
+
+def _accepts_gzip(request: Request) -> bool:
+    for coding in request.headers.get("accept-encoding", "").split(","):
+        name, _, params = coding.strip().partition(";")
+        if name.strip().lower() in ("gzip", "*"):
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+
+@router.api_route("/feed.xml", methods=["GET", "HEAD"])
+async def get_feed(request: Request):
+    base_url = (PUBLIC_BASE_URL or str(request.base_url)).rstrip("/")
+    document = await feed_cache.get(base_url)
+
+    # Both encodings are rendered with the feed, nothing is compressed here.
+    # Each gets its own strong ETag, so caches never swap one for the other
+    body, etag = document.body, document.etag
+    gzipped = _accepts_gzip(request)
+    if gzipped:
+        body, etag = document.gzip_body, document.etag[:-1] + '-gzip"'
+
+    headers = {
+        "ETag": etag,
+        "Last-Modified": document.last_modified,
+        "Cache-Control": f"public, max-age={FEED_CACHE_MAX_AGE}",
+        "Vary": "Accept-Encoding",
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        etags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        if etag in etags or "*" in etags:
+            return Response(status_code=304, headers=headers)
+
+    if gzipped:
+        headers["Content-Encoding"] = "gzip"
+
+    if request.method == "HEAD":
+        headers["Content-Length"] = str(len(body))
+        return Response(
+            status_code=200, headers=headers, media_type="application/rss+xml"
+        )
+    return Response(content=body, headers=headers, media_type="application/rss+xml")
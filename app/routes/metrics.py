@@ -0,0 +1,49 @@
+from fastapi import APIRouter, Response
+
+from ..core.database import database
+from ..core.events import event_bus
+from ..core.logger import get_logger
+from ..core.metrics import metrics
+from ..services.download_scheduler import download_scheduler
+from ..services.file_index import file_index
+from ..services.progress import progress_registry
+
+logger = get_logger("routes.metrics")
+
+router = APIRouter(tags=["metrics"])
+
+metrics.gauge(
+    "download_jobs_active",
+    "Downloads running on the workers",
+    function=lambda: download_scheduler.active_jobs,
+)
+download_jobs_pending = metrics.gauge(
+    "download_jobs_pending", "Downloads waiting in the queue, including retries"
+)
+metrics.gauge(
+    "download_progress_tracked",
+    "Downloads with live progress in this process",
+    function=lambda: len(progress_registry),
+)
+metrics.gauge(
+    "status_stream_subscribers",
+    "Open /api/status/stream connections",
+    function=lambda: event_bus.subscriber_count,
+)
+metrics.gauge(
+    "file_index_files", "Audio files in the file index", function=lambda: len(file_index)
+)
+
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    # The queue lives in the database, count it when scraped
+    row = await database.fetch_one(
+        "SELECT COUNT(*) AS pending FROM downloads WHERE status = 'pending'"
+    )
+    download_jobs_pending.set(row["pending"])
+
+    return Response(
+        content=metrics.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
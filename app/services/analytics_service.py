@@ -0,0 +1,223 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+import os
+from typing import Any, Dict, List, Optional
+
+from ..core.database import database
+from ..core.logger import get_logger
+from ..core.metrics import db_query_duration
+
+ACCESS_ROLLUP_INTERVAL = float(os.getenv("ACCESS_ROLLUP_INTERVAL", "60"))
+# Retention per table, 0 keeps rows forever
+ACCESS_EVENTS_RETENTION_HOURS = int(os.getenv("ACCESS_EVENTS_RETENTION_HOURS", "48"))
+ACCESS_HOURLY_RETENTION_DAYS = int(os.getenv("ACCESS_HOURLY_RETENTION_DAYS", "30"))
+ACCESS_DAILY_RETENTION_DAYS = int(os.getenv("ACCESS_DAILY_RETENTION_DAYS", "0"))
+
+logger = get_logger("services.analytics_service")
+
+# strftime formats of the bucket start, per rollup table
+BUCKETS = {
+    "hour": ("access_hourly", "%Y-%m-%d %H:00:00", timedelta(hours=1)),
+    "day": ("access_daily", "%Y-%m-%d 00:00:00", timedelta(days=1)),
+}
+MAX_TIMESERIES_POINTS = 2000
+
+
+def _format_timestamp(value: datetime) -> str:
+    # Same format as the stored timestamps, so comparisons are textual
+    return value.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _to_naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    # Timestamps are stored as naive UTC
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _bucket_start(value: datetime, granularity: str) -> datetime:
+    if granularity == "day":
+        return value.replace(hour=0, minute=0, second=0, microsecond=0)
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+class AccessRollup:
+    """
+    Background compactor folding `access_events` into the hourly and daily
+    rollups.
+
+    Every `interval` seconds the events appended since the last run (tracked
+    by id in `access_rollup_state`) are added to their buckets, and rows
+    older than each table's retention are deleted, all in one transaction.
+    """
+
+    def __init__(
+        self,
+        interval: float = ACCESS_ROLLUP_INTERVAL,
+        events_retention_hours: int = ACCESS_EVENTS_RETENTION_HOURS,
+        hourly_retention_days: int = ACCESS_HOURLY_RETENTION_DAYS,
+        daily_retention_days: int = ACCESS_DAILY_RETENTION_DAYS,
+    ):
+        self.interval = interval
+        self.events_retention_hours = events_retention_hours
+        self.hourly_retention_days = hourly_retention_days
+        self.daily_retention_days = daily_retention_days
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        # Unprocessed events stay in access_events for the next run
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.compact()
+            except Exception as e:
+                logger.error(f"Error compacting access events: {e}")
+
+    @db_query_duration.time("access_rollup.compact")
+    async def compact(self) -> int:
+        """Roll up new events and apply retention. Returns events rolled up."""
+        now = datetime.utcnow()
+        async with database.transaction() as conn:
+            rows = await conn.execute_fetchall(
+                "SELECT last_event_id FROM access_rollup_state WHERE id = 1"
+            )
+            last_id = rows[0]["last_event_id"] if rows else 0
+            rows = await conn.execute_fetchall("SELECT MAX(id) AS max_id FROM access_events")
+            max_id = rows[0]["max_id"] or 0
+
+            if max_id > last_id:
+                for table, bucket_format, _ in BUCKETS.values():
+                    await conn.execute(
+                        f"""
+                        INSERT INTO {table} (filename, bucket, count)
+                        SELECT filename, strftime('{bucket_format}', accessed_at), COUNT(*)
+                        FROM access_events
+                        WHERE id > ? AND id <= ?
+                        GROUP BY 1, 2
+                        ON CONFLICT(filename, bucket) DO UPDATE SET
+                            count = count + excluded.count
+                        """,
+                        (last_id, max_id),
+                    )
+                await conn.execute(
+                    "UPDATE access_rollup_state SET last_event_id = ? WHERE id = 1",
+                    (max_id,),
+                )
+
+            # Raw events are only dropped once rolled up
+            if self.events_retention_hours > 0:
+                cutoff = now - timedelta(hours=self.events_retention_hours)
+                await conn.execute(
+                    "DELETE FROM access_events WHERE accessed_at < ? AND id <= ?",
+                    (_format_timestamp(cutoff), max_id),
+                )
+            for table, retention_days in (
+                ("access_hourly", self.hourly_retention_days),
+                ("access_daily", self.daily_retention_days),
+            ):
+                if retention_days > 0:
+                    cutoff = now - timedelta(days=retention_days)
+                    await conn.execute(
+                        f"DELETE FROM {table} WHERE bucket < ?",
+                        (_format_timestamp(cutoff),),
+                    )
+
+        rolled_up = max_id - last_id if max_id > last_id else 0
+        if rolled_up:
+            logger.debug(f"Rolled up {rolled_up} access event(s)")
+        return rolled_up
+
+
+access_rollup = AccessRollup()
+
+
+class AccessAnalytics:
+    """Queries over the rollup tables; raw events are never scanned."""
+
+    def __init__(self):
+        self.db = database
+
+    @db_query_duration.time("access_analytics.get_timeseries")
+    async def get_timeseries(
+        self,
+        filename: str,
+        granularity: str = "day",
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Plays per bucket in [since, until), zero-filled. Defaults to the last
+        48 hours for hourly buckets and the last 30 days for daily ones.
+        """
+        table, _, step = BUCKETS[granularity]
+        since, until = _to_naive_utc(since), _to_naive_utc(until)
+        until = until or datetime.utcnow()
+        if since is None:
+            since = until - (timedelta(hours=48) if granularity == "hour" else timedelta(days=30))
+
+        start = _bucket_start(since, granularity)
+        if (until - start) / step > MAX_TIMESERIES_POINTS:
+            raise ValueError(f"Time range exceeds {MAX_TIMESERIES_POINTS} buckets")
+
+        try:
+            rows = await self.db.fetch_all(
+                f"""
+                SELECT bucket, count FROM {table}
+                WHERE filename = ? AND bucket >= ? AND bucket < ?
+                ORDER BY bucket
+                """,
+                (filename, _format_timestamp(start), _format_timestamp(until)),
+            )
+        except Exception as e:
+            logger.error(f"Error getting access timeseries: {e}")
+            raise
+
+        counts = {row["bucket"]: row["count"] for row in rows}
+        points = []
+        bucket = start
+        while bucket < until:
+            points.append({"bucket": bucket, "count": counts.get(_format_timestamp(bucket), 0)})
+            bucket += step
+        return points
+
+    @db_query_duration.time("access_analytics.get_trending")
+    async def get_trending(self, hours: int = 168, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Most played files over the last `hours`. Uses the hourly rollup while
+        the window is within its retention, whole days otherwise.
+        """
+        now = datetime.utcnow()
+        since = now - timedelta(hours=hours)
+        if ACCESS_HOURLY_RETENTION_DAYS <= 0 or hours <= ACCESS_HOURLY_RETENTION_DAYS * 24:
+            table, granularity = "access_hourly", "hour"
+        else:
+            table, granularity = "access_daily", "day"
+
+        try:
+            return await self.db.fetch_all(
+                f"""
+                SELECT filename, SUM(count) AS plays
+                FROM {table}
+                WHERE bucket >= ?
+                GROUP BY filename
+                ORDER BY plays DESC, filename
+                LIMIT ?
+                """,
+                (_format_timestamp(_bucket_start(since, granularity)), limit),
+            )
+        except Exception as e:
+            logger.error(f"Error getting trending files: {e}")
+            raise
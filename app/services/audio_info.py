@@ -0,0 +1,155 @@
+import asyncio
+import math
+import os
+import subprocess
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+import numpy
+
+from .storage import storage
+from .transcoder import FFMPEG_PATH, TRANSCODE_TIMEOUT
+from ..core.database import database
+from ..core.logger import get_logger
+from ..utils.audio_headers import AudioHeaders, parse_headers
+
+# Waveform resolution, capped so long episodes stay a few kilobytes
+AUDIO_PEAKS_PER_SECOND = float(os.getenv("AUDIO_PEAKS_PER_SECOND", "10"))
+AUDIO_PEAKS_MAX = int(os.getenv("AUDIO_PEAKS_MAX", "8000"))
+# Compressed audio is decoded to mono at this rate to find the peaks
+PEAKS_SAMPLE_RATE = 8000
+
+COLUMNS = (
+    "codec",
+    "duration",
+    "bitrate",
+    "sample_rate",
+    "channels",
+    "data_offset",
+    "data_size",
+    "peaks",
+)
+
+logger = get_logger("services.audio_info")
+
+
+def _decode(path: str, headers: AudioHeaders) -> Optional[numpy.ndarray]:
+    """16-bit samples of a file, mapped straight from 16-bit PCM WAV, else decoded by ffmpeg."""
+    if headers.codec == "pcm_s16le":
+        # Channels stay interleaved; a peak is the loudest of them anyway
+        return numpy.memmap(
+            path,
+            dtype="<i2",
+            mode="r",
+            offset=headers.data_offset,
+            shape=(headers.data_size // 2,),
+        )
+
+    try:
+        result = subprocess.run(
+            [
+                FFMPEG_PATH, "-v", "error", "-nostdin", "-i", path, "-vn",
+                "-ac", "1", "-ar", str(PEAKS_SAMPLE_RATE), "-f", "s16le", "-",
+            ],
+            capture_output=True,
+            timeout=TRANSCODE_TIMEOUT,
+            check=True,
+        )
+    except (OSError, subprocess.SubprocessError) as e:
+        logger.warning("Could not decode {} for waveform peaks: {}", path, e)
+        return None
+    return numpy.frombuffer(result.stdout, dtype="<i2")
+
+
+def compute_peaks(samples: numpy.ndarray, buckets: int) -> bytes:
+    """Peak amplitude of `buckets` equal slices of the samples, one byte (0-255) each."""
+    buckets = min(buckets, len(samples))
+    if buckets <= 0:
+        return b""
+    frames = samples[: len(samples) - len(samples) % buckets].reshape(buckets, -1)
+    # Widened first: -(-32768) does not fit in int16
+    peaks = numpy.maximum(
+        frames.max(axis=1).astype(numpy.int32), -frames.min(axis=1).astype(numpy.int32)
+    )
+    return (numpy.minimum(peaks, 32767) * 255 // 32767).astype(numpy.uint8).tobytes()
+
+
+def analyze(path: str) -> Optional[Dict[str, Any]]:
+    """
+    Container details of an audio file and its waveform peaks. Blocking;
+    the peaks need a full decode of compressed files.
+    """
+    headers = parse_headers(path)
+    if headers is None:
+        return None
+
+    peaks = None
+    if headers.duration > 0:
+        samples = _decode(path, headers)
+        if samples is not None:
+            buckets = min(AUDIO_PEAKS_MAX, math.ceil(headers.duration * AUDIO_PEAKS_PER_SECOND))
+            peaks = compute_peaks(samples, buckets)
+    return {**headers._asdict(), "peaks": peaks}
+
+
+class AudioInfoStore:
+    """
+    Audio details in the `audio_info` table, keyed by content checksum.
+
+    Filled by the download workers as files are stored; files stored before
+    that, or whose waveform could not be computed, are analyzed the first
+    time they are asked for.
+    """
+
+    def __init__(self):
+        # checksum -> analysis running for a request, shared by concurrent ones
+        self._pending: Dict[str, asyncio.Task] = {}
+
+    def save(self, checksum: str, info: Dict[str, Any]):
+        conn = database.sync_connection()
+        conn.execute(
+            f"""
+            INSERT OR REPLACE INTO audio_info (checksum, {", ".join(COLUMNS)}, analyzed_at)
+            VALUES (?, {", ".join("?" * len(COLUMNS))}, ?)
+            """,
+            (checksum, *(info[column] for column in COLUMNS), datetime.utcnow()),
+        )
+        conn.commit()
+
+    async def get(self, filename: str) -> Optional[Dict[str, Any]]:
+        row = await database.fetch_one(
+            f"""
+            SELECT d.checksum, d.storage_path, a.analyzed_at,
+                   {", ".join(f"a.{column}" for column in COLUMNS)}
+            FROM downloads d LEFT JOIN audio_info a ON a.checksum = d.checksum
+            WHERE d.filename = ? AND d.status = 'completed' AND d.storage_path IS NOT NULL
+            LIMIT 1
+            """,
+            (filename,),
+        )
+        if row is None:
+            return None
+        # Rows without peaks are retried, e.g. once ffmpeg is installed
+        if row["analyzed_at"] is not None and row["peaks"] is not None:
+            return row
+
+        checksum = row["checksum"]
+        task = self._pending.get(checksum)
+        if task is None:
+            task = asyncio.create_task(
+                asyncio.to_thread(self._analyze, checksum, storage.path(row["storage_path"]))
+            )
+            self._pending[checksum] = task
+            task.add_done_callback(lambda _: self._pending.pop(checksum, None))
+        info = await asyncio.shield(task)
+        return {**row, **info} if info is not None else None
+
+    def _analyze(self, checksum: str, path: str) -> Optional[Dict[str, Any]]:
+        info = analyze(path)
+        if info is not None:
+            self.save(checksum, info)
+            logger.info("Analyzed {}: {}, {:.1f}s", path, info["codec"], info["duration"])
+        return info
+
+
+audio_info_store = AudioInfoStore()
@@ -0,0 +1,95 @@
+import asyncio
+import os
+from typing import Any, Callable, Dict, List, Optional
+
+from ..core.database import database
+from ..core.logger import get_logger
+
+# Seconds between polls of cache_versions, 0 disables cross-process invalidation
+CACHE_SYNC_INTERVAL = float(os.getenv("CACHE_SYNC_INTERVAL", "2"))
+
+# Read inside a writer's transaction to acknowledge its own bump
+VERSION_QUERY = "SELECT version FROM cache_versions WHERE name = ?"
+
+logger = get_logger("services.cache_sync")
+
+
+class CacheSync:
+    """
+    Invalidates in-memory caches when another worker process changes the
+    data behind them.
+
+    Named versions in `cache_versions` are bumped by triggers, so any
+    process writing the underlying rows invalidates every other one; e.g.
+    `completed_downloads` moves whenever a completed download is added,
+    changed or removed. Every process polls the table and calls the
+    listeners subscribed to a name whose version moved.
+    Listeners may be plain functions or coroutine functions.
+
+    A writer that already updated this process's caches acknowledges its
+    own bump, which is then not polled as a change.
+    """
+
+    def __init__(self, interval: float = CACHE_SYNC_INTERVAL):
+        self.interval = interval
+        self._listeners: Dict[str, List[Callable[[], Any]]] = {}
+        self._versions: Dict[str, int] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(self, name: str, listener: Callable[[], Any]):
+        self._listeners.setdefault(name, []).append(listener)
+
+    def acknowledge(self, name: str, before: int, after: int):
+        """
+        Record a bump from `before` to `after` made by this process, read in
+        the writing transaction. Safe to call from any thread; a bump that
+        was polled meanwhile only invalidates once more.
+        """
+        if self._versions.get(name) == before:
+            self._versions[name] = after
+
+    async def start(self):
+        if self._task is None and self.interval > 0:
+            self._versions = await self._fetch()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _fetch(self) -> Dict[str, int]:
+        rows = await database.fetch_all("SELECT name, version FROM cache_versions")
+        return {row["name"]: row["version"] for row in rows}
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.poll()
+            except Exception as e:
+                logger.error(f"Error polling cache versions: {e}")
+
+    async def poll(self):
+        versions = await self._fetch()
+        changed = [
+            name for name, version in versions.items() if self._versions.get(name) != version
+        ]
+        self._versions = versions
+
+        for name in changed:
+            logger.debug("Cache {} changed, invalidating", name)
+            for listener in self._listeners.get(name, ()):
+                try:
+                    result = listener()
+                    if asyncio.iscoroutine(result):
+                        await result
+                except Exception as e:
+                    logger.error(f"Error invalidating cache {name}: {e}")
+
+
+cache_sync = CacheSync()
@@ -0,0 +1,511 @@
+import sqlite3
+import threading
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from functools import partial
+import os
+from typing import Any, Dict, List, Optional
+
+from .audio_info import audio_info_store
+from .cache_sync import VERSION_QUERY, cache_sync
+from .downloader import download_audio
+from .feed_service import feed_cache
+from .file_index import file_index
+from .progress import progress_registry
+from .storage import storage
+from .metadata_service import metadata_cache, resolve_video
+from .transcoder import transcoder
+from .youtube_provider import YouTubeProvider
+from ..core.database import database
+from ..core.events import event_bus
+from ..core.logger import get_logger
+from ..core.metrics import db_query_duration, metrics
+from ..utils.claims import is_orphaned_claim, new_claim_id
+
+DOWNLOAD_WORKERS = int(os.getenv("DOWNLOAD_WORKERS", "3"))
+DOWNLOAD_EXECUTOR = os.getenv("DOWNLOAD_EXECUTOR", "thread")  # "thread" or "process"
+DOWNLOAD_MAX_ATTEMPTS = int(os.getenv("DOWNLOAD_MAX_ATTEMPTS", "3"))
+DOWNLOAD_RETRY_BACKOFF = float(os.getenv("DOWNLOAD_RETRY_BACKOFF", "10"))
+DOWNLOAD_POLL_INTERVAL = float(os.getenv("DOWNLOAD_POLL_INTERVAL", "30"))
+METADATA_WORKERS = int(os.getenv("METADATA_WORKERS", "2"))
+PROGRESS_EVENT_INTERVAL = float(os.getenv("PROGRESS_EVENT_INTERVAL", "1"))
+# Claimed jobs are kept alive by heartbeats; a claim not renewed within the
+# timeout belongs to a dead worker and is requeued
+DOWNLOAD_HEARTBEAT_INTERVAL = float(os.getenv("DOWNLOAD_HEARTBEAT_INTERVAL", "10"))
+DOWNLOAD_CLAIM_TIMEOUT = float(os.getenv("DOWNLOAD_CLAIM_TIMEOUT", "60"))
+
+logger = get_logger("services.download_scheduler")
+
+download_attempts = metrics.counter(
+    "download_attempts", "Finished download attempts by outcome", ("result",)
+)
+download_bytes = metrics.counter("download_bytes", "Audio bytes downloaded")
+download_duration = metrics.histogram(
+    "download_duration_seconds",
+    "Time from dispatch until a download is stored",
+    buckets=(1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800),
+)
+download_throughput = metrics.histogram(
+    "download_throughput_bytes_per_second",
+    "Average throughput of completed downloads",
+    buckets=(64e3, 256e3, 1e6, 2.5e6, 5e6, 10e6, 25e6, 50e6, 100e6),
+)
+
+
+class DownloadScheduler:
+    """
+    Drains the `downloads` table as a persistent job queue.
+
+    A dispatcher thread claims `pending` rows while a worker slot is free and
+    hands them to a bounded thread or process pool, so downloads never run on
+    the event loop. Failed jobs go back to `pending` with exponential backoff
+    until `max_attempts` is reached.
+
+    Several worker processes can drain the same table: a claim records the
+    scheduler holding the job (`claimed_by`) and is renewed by a heartbeat
+    thread. Claims whose heartbeat stopped, or whose process on this host is
+    gone, are requeued, so a job left `downloading` by a crashed or restarted
+    worker is resumed without another worker's running job being taken.
+
+    Video metadata is resolved on a separate small pool so titles show up
+    while jobs are still queued behind busy download workers.
+    """
+
+    def __init__(
+        self,
+        workers: int = DOWNLOAD_WORKERS,
+        executor: str = DOWNLOAD_EXECUTOR,
+        max_attempts: int = DOWNLOAD_MAX_ATTEMPTS,
+        retry_backoff: float = DOWNLOAD_RETRY_BACKOFF,
+        poll_interval: float = DOWNLOAD_POLL_INTERVAL,
+        heartbeat_interval: float = DOWNLOAD_HEARTBEAT_INTERVAL,
+        claim_timeout: float = DOWNLOAD_CLAIM_TIMEOUT,
+        provider: Optional[YouTubeProvider] = None,
+    ):
+        if executor not in ("thread", "process"):
+            raise ValueError(f"Unknown download executor: {executor}")
+
+        self.workers = workers
+        self.executor_kind = executor
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.claim_timeout = claim_timeout
+        # None uses the provider selected by YOUTUBE_PROVIDER
+        self.provider = provider
+        self.worker_id: Optional[str] = None
+
+        self._executor: Optional[Executor] = None
+        self._metadata_executor: Optional[ThreadPoolExecutor] = None
+        self._dispatcher: Optional[threading.Thread] = None
+        self._heartbeat: Optional[threading.Thread] = None
+        self._slots = threading.BoundedSemaphore(workers)
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._active: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._last_progress_event: Dict[str, float] = {}
+
+    @property
+    def active_jobs(self) -> int:
+        with self._lock:
+            return len(self._active)
+
+    def start(self):
+        if self._dispatcher is not None:
+            return
+
+        # Set here rather than in __init__ so forked workers get their own
+        self.worker_id = new_claim_id()
+        resumed = self._requeue_orphaned_claims() + self._requeue_stale_claims()
+        if resumed:
+            logger.info(f"Resuming {resumed} interrupted download(s)")
+        # Other workers may be writing; only files idle for an hour are abandoned
+        removed = storage.remove_stale_partials(3600)
+        if removed:
+            logger.info(f"Removed {removed} abandoned partial download(s)")
+
+        if self.executor_kind == "process":
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        else:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="download-worker"
+            )
+        self._metadata_executor = ThreadPoolExecutor(
+            max_workers=METADATA_WORKERS, thread_name_prefix="metadata-worker"
+        )
+
+        self._stopping.clear()
+        self._dispatcher = threading.Thread(
+            target=self._run, name="download-dispatcher", daemon=True
+        )
+        self._dispatcher.start()
+        self._heartbeat = threading.Thread(
+            target=self._run_heartbeat, name="download-heartbeat", daemon=True
+        )
+        self._heartbeat.start()
+        logger.info(
+            f"Download scheduler started with {self.workers} {self.executor_kind} worker(s)"
+        )
+
+    def stop(self):
+        if self._dispatcher is None:
+            return
+
+        self._stopping.set()
+        self._wakeup.set()
+        self._dispatcher.join()
+        self._dispatcher = None
+        self._heartbeat.join()
+        self._heartbeat = None
+
+        # Running downloads cannot be interrupted; they stay `downloading` and
+        # are resumed once their claim goes stale if the process exits before
+        # they finish.
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+        self._metadata_executor.shutdown(wait=False, cancel_futures=True)
+        self._metadata_executor = None
+        logger.info("Download scheduler stopped")
+
+    def notify(self):
+        """Wake the dispatcher after new jobs have been inserted."""
+        self._wakeup.set()
+
+    def resolve_metadata(self, download_id: str, url: str, video_id: str):
+        """Resolve video metadata in the background and store the title."""
+        if self._metadata_executor is None:
+            return
+        self._metadata_executor.submit(
+            self._resolve_metadata, download_id, url, video_id
+        )
+
+    def _resolve_metadata(self, download_id: str, url: str, video_id: str):
+        try:
+            metadata, _ = resolve_video(url, video_id, self.provider)
+            self._execute(
+                "UPDATE downloads SET videoname = ? WHERE id = ?",
+                (metadata["title"], download_id),
+            )
+            progress_registry.annotate(download_id, videoname=metadata["title"])
+            logger.info(
+                f"Resolved metadata for video: {metadata['title']} (ID: {video_id})"
+            )
+        except Exception as e:
+            # Not fatal: the download job resolves metadata again on its own
+            logger.warning(f"Error resolving metadata for {video_id}: {str(e)}")
+
+    def _run(self):
+        while not self._stopping.is_set():
+            if not self._slots.acquire(timeout=self.poll_interval):
+                continue
+
+            # Clear before claiming so a notify() racing with an empty queue
+            # is not lost.
+            self._wakeup.clear()
+            try:
+                job = self._claim_next_job()
+            except Exception as e:
+                logger.error(f"Error claiming download job: {str(e)}", exc_info=True)
+                job = None
+
+            if job is None:
+                self._slots.release()
+                self._wakeup.wait(self._seconds_until_next_job())
+                continue
+
+            logger.info(
+                f"Dispatching download {job['id']} (attempt {job['attempts']}/{self.max_attempts})"
+            )
+            job["_dispatched_at"] = time.monotonic()
+            progress_registry.start(job["id"], job)
+            event_bus.publish(
+                {"download_id": job["id"], "status": "downloading", "attempts": job["attempts"]}
+            )
+
+            # Progress can only be reported from threads sharing the registry
+            on_progress = self._on_progress if self.executor_kind == "thread" else None
+            future = self._executor.submit(
+                download_audio,
+                job["url"],
+                job["id"],
+                job["filename"],
+                on_progress,
+                self.provider,
+            )
+            with self._lock:
+                self._active[job["id"]] = future
+            future.add_done_callback(partial(self._on_job_done, job))
+
+    def _run_heartbeat(self):
+        while not self._stopping.wait(self.heartbeat_interval):
+            try:
+                self._renew_claims()
+                if self._requeue_stale_claims():
+                    self._wakeup.set()
+            except Exception as e:
+                logger.error(f"Error renewing download claims: {str(e)}")
+
+    def _on_progress(self, download_id: str, bytes_downloaded: int, total_bytes: Optional[int]):
+        progress_registry.update(download_id, bytes_downloaded, total_bytes)
+
+        # Progress ticks are throttled, state transitions are always published
+        now = time.monotonic()
+        if now - self._last_progress_event.get(download_id, 0.0) < PROGRESS_EVENT_INTERVAL:
+            return
+        self._last_progress_event[download_id] = now
+
+        status = progress_registry.get(download_id)
+        if status is not None:
+            event_bus.publish(
+                {
+                    "download_id": download_id,
+                    "status": "downloading",
+                    "progress": status["progress"],
+                }
+            )
+
+    def _on_job_done(self, job: Dict[str, Any], future: Future):
+        try:
+            if future.cancelled():
+                return
+
+            error = future.exception()
+            if error is None:
+                result = future.result()
+                if result["audio_info"] is not None:
+                    audio_info_store.save(result["checksum"], result["audio_info"])
+                try:
+                    marked = self._mark_completed(job["id"], result)
+                except FileNotFoundError as e:
+                    # Retried below like any failed attempt
+                    error = e
+
+            if error is None:
+                if marked and transcoder.enabled:
+                    transcoder.enqueue(job["id"], result["key"])
+                entry = file_index.refresh(job["filename"])
+                feed_cache.invalidate()
+                download_attempts.inc("completed")
+                # A title of None means the file was already on disk
+                if entry is not None and result["title"] is not None:
+                    elapsed = time.monotonic() - job["_dispatched_at"]
+                    download_bytes.inc(amount=entry.size)
+                    download_duration.observe(elapsed)
+                    if elapsed > 0:
+                        download_throughput.observe(entry.size / elapsed)
+                logger.info(f"Download job completed: {job['id']}")
+                return
+
+            # Stream URLs may have expired, resolve the video again on retry
+            metadata_cache.invalidate(job["video_id"])
+            if job["attempts"] < self.max_attempts:
+                delay = self.retry_backoff * 2 ** (job["attempts"] - 1)
+                self._schedule_retry(job["id"], str(error), delay)
+                download_attempts.inc("retry")
+                logger.warning(
+                    f"Download {job['id']} failed, retrying in {delay:.0f}s: {str(error)}"
+                )
+            else:
+                self._mark_failed(job["id"], str(error))
+                download_attempts.inc("error")
+                logger.error(
+                    f"Download {job['id']} failed after {job['attempts']} attempt(s): {str(error)}"
+                )
+        except Exception as e:
+            logger.error(f"Error updating download job {job['id']}: {str(e)}")
+        finally:
+            # Only once the final status is in the database
+            progress_registry.finish(job["id"])
+            self._last_progress_event.pop(job["id"], None)
+            with self._lock:
+                self._active.pop(job["id"], None)
+            self._slots.release()
+            self._wakeup.set()
+
+    def _execute(self, query: str, params: tuple = ()) -> Optional[sqlite3.Row]:
+        conn = database.sync_connection()
+        try:
+            # fetchall() steps the statement to completion, which RETURNING
+            # needs before the transaction can be committed.
+            rows = conn.execute(query, params).fetchall()
+            conn.commit()
+            return rows[0] if rows else None
+        except BaseException:
+            conn.rollback()
+            raise
+
+    @db_query_duration.time("scheduler.claim_next_job")
+    def _claim_next_job(self) -> Optional[Dict[str, Any]]:
+        row = self._execute(
+            """
+            UPDATE downloads
+            SET status = 'downloading', attempts = attempts + 1,
+                claimed_by = ?, heartbeat_at = ?
+            WHERE id = (
+                SELECT id FROM downloads
+                WHERE status = 'pending'
+                AND (next_attempt_at IS NULL OR next_attempt_at <= ?)
+                ORDER BY created_at
+                LIMIT 1
+            )
+            RETURNING id, url, video_id, videoname, status, filename, error,
+                      attempts, created_at, completed_at
+            """,
+            (self.worker_id, datetime.utcnow(), datetime.utcnow()),
+        )
+        if not row:
+            return None
+
+        job = dict(row)
+        job["created_at"] = datetime.fromisoformat(job["created_at"])
+        return job
+
+    def _seconds_until_next_job(self) -> float:
+        row = self._execute(
+            "SELECT MIN(next_attempt_at) AS due FROM downloads WHERE status = 'pending'"
+        )
+        if not row or not row["due"]:
+            return self.poll_interval
+
+        due = datetime.fromisoformat(row["due"]) - datetime.utcnow()
+        return min(self.poll_interval, max(due.total_seconds(), 0.0))
+
+    @db_query_duration.time("scheduler.renew_claims")
+    def _renew_claims(self):
+        self._execute(
+            """
+            UPDATE downloads SET heartbeat_at = ?
+            WHERE status = 'downloading' AND claimed_by = ?
+            """,
+            (datetime.utcnow(), self.worker_id),
+        )
+
+    def _requeue(self, where: str, params: tuple) -> List[str]:
+        conn = database.sync_connection()
+        try:
+            rows = conn.execute(
+                f"""
+                UPDATE downloads SET status = 'pending', claimed_by = NULL
+                WHERE status = 'downloading' AND {where}
+                RETURNING id
+                """,
+                params,
+            ).fetchall()
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        return [row["id"] for row in rows]
+
+    def _requeue_stale_claims(self) -> int:
+        """Requeue jobs whose worker stopped renewing its claim."""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.claim_timeout)
+        ids = self._requeue("(heartbeat_at IS NULL OR heartbeat_at < ?)", (cutoff,))
+        if ids:
+            logger.warning(f"Requeued {len(ids)} download(s) with a stale claim: {ids}")
+        return len(ids)
+
+    def _requeue_orphaned_claims(self) -> int:
+        """
+        Requeue jobs claimed by processes on this host that no longer exist,
+        without waiting for their claim to time out.
+        """
+        conn = database.sync_connection()
+        rows = conn.execute(
+            "SELECT DISTINCT claimed_by FROM downloads WHERE status = 'downloading'"
+        ).fetchall()
+
+        requeued = 0
+        for (claimed_by,) in rows:
+            if is_orphaned_claim(claimed_by):
+                requeued += len(self._requeue("claimed_by = ?", (claimed_by,)))
+        return requeued
+
+    @db_query_duration.time("scheduler.mark_completed")
+    def _mark_completed(self, download_id: str, result: Dict[str, Any]) -> bool:
+        conn = database.sync_connection()
+        try:
+            # The evictor deletes objects under the write lock, so one that
+            # exists now stays until this reference is committed
+            conn.execute("BEGIN IMMEDIATE")
+            if not os.path.exists(storage.path(result["key"])):
+                raise FileNotFoundError(f"Stored file {result['key']} was evicted meanwhile")
+            version = conn.execute(VERSION_QUERY, ("completed_downloads",)).fetchone()[0]
+            # Evicted downloads fetched again keep their original completion date
+            rows = conn.execute(
+                """
+                UPDATE downloads
+                SET status = 'completed', completed_at = COALESCE(completed_at, ?), error = NULL,
+                    videoname = COALESCE(videoname, ?), claimed_by = NULL,
+                    storage_path = ?, checksum = ?, size = ?
+                WHERE id = ? AND claimed_by = ?
+                RETURNING videoname, filename
+                """,
+                (
+                    datetime.utcnow(),
+                    result["title"],
+                    result["key"],
+                    result["checksum"],
+                    result["size"],
+                    download_id,
+                    self.worker_id,
+                ),
+            ).fetchall()
+            bumped = conn.execute(VERSION_QUERY, ("completed_downloads",)).fetchone()[0]
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        # The caller refreshes this process's caches for the file itself
+        cache_sync.acknowledge("completed_downloads", version, bumped)
+        row = rows[0] if rows else None
+        if row is None:
+            logger.warning(f"Lost the claim on download {download_id}, not marking it completed")
+            return False
+        event_bus.publish(
+            {
+                "download_id": download_id,
+                "status": "completed",
+                "videoname": row["videoname"],
+                "filename": row["filename"],
+            }
+        )
+        return True
+
+    @db_query_duration.time("scheduler.schedule_retry")
+    def _schedule_retry(self, download_id: str, error: str, delay: float):
+        row = self._execute(
+            """
+            UPDATE downloads
+            SET status = 'pending', next_attempt_at = ?, error = ?, claimed_by = NULL
+            WHERE id = ? AND claimed_by = ?
+            RETURNING id
+            """,
+            (datetime.utcnow() + timedelta(seconds=delay), error, download_id, self.worker_id),
+        )
+        if row is None:
+            return
+        event_bus.publish(
+            {"download_id": download_id, "status": "pending", "error": error, "retry_in": delay}
+        )
+
+    @db_query_duration.time("scheduler.mark_failed")
+    def _mark_failed(self, download_id: str, error: str):
+        row = self._execute(
+            """
+            UPDATE downloads
+            SET status = 'error', completed_at = ?, error = ?, claimed_by = NULL
+            WHERE id = ? AND claimed_by = ?
+            RETURNING id
+            """,
+            (datetime.utcnow(), error, download_id, self.worker_id),
+        )
+        if row is None:
+            return
+        event_bus.publish({"download_id": download_id, "status": "error", "error": error})
+
+
+download_scheduler = DownloadScheduler()
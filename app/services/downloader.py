@@ -1,55 +1,79 @@
-from pytubefix import YouTube
-from pytubefix.cli import on_progress
-import sqlite3
-from datetime import datetime
 import os
-from dotenv import load_dotenv
+from typing import Any, Callable, Dict, Optional
 
+from .audio_info import analyze
+from .metadata_service import resolve_video
+from .storage import storage
+from .youtube_provider import YouTubeProvider, youtube_provider
+from ..utils.youtube import extract_video_id
 from ..core.logger import get_logger
 
-# Load environment variables
-load_dotenv()
-DATABASE_PATH = os.getenv("DATABASE_PATH")
 DOWNLOADS_PATH = os.getenv("DOWNLOADS_PATH", "./downloads")
 
 logger = get_logger("services.downloader")
 
+ProgressCallback = Callable[[str, int, Optional[int]], None]
 
-async def download_audio(url: str, download_id: str, filename: str):
+
+def download_audio(
+    url: str,
+    download_id: str,
+    filename: str,
+    on_progress: Optional[ProgressCallback] = None,
+    provider: Optional[YouTubeProvider] = None,
+) -> Dict[str, Any]:
+    """
+    Download the audio stream of a YouTube video into storage.
+
+    Runs inside a download worker (thread or process), so it is a plain
+    blocking function. Errors are raised to the scheduler, which owns the
+    job status and retry policy.
+
+    The stream is hashed as it is written, so the result carries the
+    storage key, checksum and size to record with the job, along with the
+    file's audio details (`audio_info`, None if it could not be analyzed).
+    `on_progress(download_id, bytes, total)` is called after every chunk.
+    `provider` defaults to the one selected by YOUTUBE_PROVIDER.
+    """
     logger.info(f"Starting download process for ID: {download_id}")
-    conn = sqlite3.connect(DATABASE_PATH)
-    c = conn.cursor()
 
-    try:
-        # Initialize YouTube object
-        yt = YouTube(url, on_progress_callback=on_progress)
-        logger.info(f"Downloading audio from: {yt.title}")
+    legacy_path = os.path.join(DOWNLOADS_PATH, filename)
+    if os.path.exists(legacy_path):
+        # Files from before sharded storage are complete, adopt them
+        logger.info(f"Audio already on disk, moving it into storage: {filename}")
+        stored = storage.import_file(legacy_path)
+        return {**stored._asdict(), "title": None, "audio_info": _analyze(stored.key)}
 
-        # Get audio stream
-        audio_stream = yt.streams.get_audio_only()
-        logger.debug(f"Selected audio stream: {audio_stream}")
+    # Reuse metadata resolved when the job was created, if still cached
+    provider = provider or youtube_provider
+    metadata, yt = resolve_video(url, extract_video_id(url), provider)
+    logger.info(f"Downloading audio from: {metadata['title']}")
 
-        # Download the audio with the specified filename
-        audio_stream.download(output_path=DOWNLOADS_PATH, filename=filename)
+    # Get audio stream
+    audio_stream = yt.streams.get_audio_only()
+    logger.debug(f"Selected audio stream: {audio_stream}")
 
-        logger.info(f"Download completed: {filename}")
+    total_bytes = audio_stream.filesize or None
 
-        # Update database with success status
-        c.execute(
-            "UPDATE downloads SET status = ?, completed_at = ? WHERE id = ?",
-            ("completed", datetime.utcnow(), download_id),
-        )
+    def on_chunk(downloaded: int):
+        if on_progress is not None:
+            on_progress(download_id, downloaded, total_bytes)
 
+    stored = storage.write(
+        provider.stream(audio_stream.url),
+        os.path.splitext(filename)[1].lower(),
+        expected_size=total_bytes,
+        on_chunk=on_chunk,
+    )
+
+    logger.info(f"Download completed: {filename} ({stored.size} bytes, {stored.key})")
+    return {**stored._asdict(), "title": metadata["title"], "audio_info": _analyze(stored.key)}
+
+
+def _analyze(key: str) -> Optional[Dict[str, Any]]:
+    # Details are nice to have, a file that cannot be analyzed is still served
+    try:
+        return analyze(storage.path(key))
     except Exception as e:
-        error_message = f"Error downloading audio: {str(e)}"
-        logger.error(error_message, exc_info=True)
-
-        # Update database with error status
-        c.execute(
-            "UPDATE downloads SET status = ?, completed_at = ? WHERE id = ?",
-            (f"error: {str(e)}", datetime.utcnow(), download_id),
-        )
-
-    finally:
-        conn.commit()
-        conn.close()
+        logger.warning(f"Could not analyze {key}: {e}")
+        return None
@@ -1,136 +1,242 @@
-import sqlite3
 from datetime import datetime
-import os
-from dotenv import load_dotenv
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 
+from ..core.database import database
+from ..core.metrics import db_query_duration
 from ..core.logger import get_logger
 
-# Load environment variables
-load_dotenv()
-DATABASE_PATH = os.getenv("DATABASE_PATH")
-DOWNLOADS_PATH = os.getenv("DOWNLOADS_PATH", "./downloads")
-
 logger = get_logger("services.download_service")
 
 
+def _parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
+
+
 class DownloadService:
     @staticmethod
-    def create_download(
-        download_id: str, url: str, video_id: str, video_name: str, filename: str
-    ) -> Dict[str, Any]:
-        conn = sqlite3.connect(DATABASE_PATH)
-        c = conn.cursor()
-        try:
-            c.execute(
-                "INSERT INTO downloads (id, url, video_id, videoname, filename, status, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                (
-                    download_id,
-                    str(url),
-                    video_id,
-                    video_name,
-                    filename,
-                    "pending",
-                    datetime.utcnow(),
-                ),
+    @db_query_duration.time("downloads.create_download")
+    async def create_download(
+        download_id: str,
+        url: str,
+        video_id: str,
+        video_name: Optional[str],
+        filename: str,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Insert a pending download. Returns None when a row for the same
+        video_id already exists (enforced by a unique index).
+        """
+        inserted = await database.execute(
+            """
+            INSERT INTO downloads (id, url, video_id, videoname, filename, status, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(video_id) DO NOTHING
+            """,
+            (
+                download_id,
+                str(url),
+                video_id,
+                video_name,
+                filename,
+                "pending",
+                datetime.utcnow(),
+            ),
+        )
+        if not inserted:
+            return None
+
+        return {
+            "id": download_id,
+            "url": url,
+            "video_id": video_id,
+            "status": "pending",
+        }
+
+    @staticmethod
+    @db_query_duration.time("downloads.get_download_by_video_id")
+    async def get_download_by_video_id(video_id: str) -> Optional[Dict[str, Any]]:
+        return await database.fetch_one(
+            "SELECT id, url, video_id, status, filename FROM downloads WHERE video_id = ?",
+            (video_id,),
+        )
+
+    @staticmethod
+    @db_query_duration.time("downloads.requeue_download")
+    async def requeue_download(download_id: str) -> bool:
+        """Reset a finished (completed, failed or evicted) download back to pending."""
+        # Evicted episodes keep their place in the feed
+        updated = await database.execute(
+            """
+            UPDATE downloads
+            SET status = 'pending', attempts = 0, next_attempt_at = NULL, error = NULL,
+                completed_at = CASE WHEN status = 'evicted' THEN completed_at END
+            WHERE id = ? AND status IN ('completed', 'error', 'evicted')
+            """,
+            (download_id,),
+        )
+        return updated > 0
+
+    @staticmethod
+    @db_query_duration.time("downloads.get_download_status")
+    async def get_download_status(download_id: str) -> Optional[Dict[str, Any]]:
+        result = await database.fetch_one(
+            """
+            SELECT id, url, video_id, videoname, status, filename,
+                   error, attempts, created_at, completed_at
+            FROM downloads
+            WHERE id = ?
+            """,
+            (download_id,),
+        )
+
+        if not result:
+            return None
+
+        result["attempts"] = result["attempts"] or 0
+        result["created_at"] = _parse_timestamp(result["created_at"])
+        result["completed_at"] = _parse_timestamp(result["completed_at"])
+        return result
+
+    @staticmethod
+    @db_query_duration.time("downloads.get_downloads_page")
+    async def get_downloads_page(
+        status: str,
+        limit: int,
+        cursor: Optional[Tuple[str, str]] = None,
+        completed_after: Optional[datetime] = None,
+        completed_before: Optional[datetime] = None,
+        video_id: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Return up to `limit` downloads newest first, starting after `cursor`.
+
+        Rows are ordered on (completed_at, id), falling back to created_at for
+        downloads that have not finished yet, so every page is a range scan
+        on idx_downloads_status_sort. `sort_key` in each row is the cursor
+        value for the next page. Audio details are joined in where the file
+        has been analyzed.
+        """
+        conditions = ["status = ?"]
+        params: List[Any] = [status]
+
+        if video_id is not None:
+            conditions.append("video_id = ?")
+            params.append(video_id)
+        if completed_after is not None:
+            conditions.append("COALESCE(completed_at, created_at) >= ?")
+            params.append(completed_after)
+        if completed_before is not None:
+            conditions.append("COALESCE(completed_at, created_at) < ?")
+            params.append(completed_before)
+        if cursor is not None:
+            # The <= bound is what the planner seeks on; a row-value < is
+            # only applied as a filter, scanning every row before the cursor
+            conditions.append(
+                "COALESCE(completed_at, created_at) <= ?"
+                " AND (COALESCE(completed_at, created_at) < ? OR id < ?)"
             )
-            conn.commit()
-            return {
-                "id": download_id,
-                "url": url,
-                "video_id": video_id,
-                "status": "pending",
-            }
-        finally:
-            conn.close()
+            params.extend((cursor[0], cursor[0], cursor[1]))
+
+        rows = await database.fetch_all(
+            f"""
+            SELECT id, url, video_id, videoname, status, filename, created_at,
+                   completed_at, COALESCE(completed_at, created_at) AS sort_key,
+                   a.duration, a.bitrate, a.codec
+            FROM downloads LEFT JOIN audio_info a ON a.checksum = downloads.checksum
+            WHERE {" AND ".join(conditions)}
+            ORDER BY COALESCE(completed_at, created_at) DESC, id DESC
+            LIMIT ?
+            """,
+            (*params, limit),
+        )
+
+        for row in rows:
+            row["created_at"] = _parse_timestamp(row["created_at"])
+            row["completed_at"] = _parse_timestamp(row["completed_at"])
+        return rows
 
     @staticmethod
-    def get_download_status(download_id: str) -> Optional[Dict[str, Any]]:
-        conn = sqlite3.connect(DATABASE_PATH)
-        c = conn.cursor()
-        try:
-            c.execute(
+    @db_query_duration.time("downloads.create_batch")
+    async def create_batch(
+        batch_id: str, source: Optional[str], jobs: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Insert a batch and its downloads in a single transaction.
+
+        `jobs` hold id, url, video_id and filename for every requested video.
+        Videos that already have a row are linked to the batch as they are,
+        except failed ones, which are reset to pending. Returns one row per
+        video, flagged `created` or `requeued` when this call changed it.
+        """
+        now = datetime.utcnow()
+        video_ids = [job["video_id"] for job in jobs]
+        placeholders = ",".join("?" * len(video_ids))
+
+        async with database.transaction() as conn:
+            await conn.execute(
+                "INSERT INTO batches (id, source, created_at) VALUES (?, ?, ?)",
+                (batch_id, source, now),
+            )
+            await conn.executemany(
                 """
-                SELECT id, url, video_id, videoname, status, filename, 
-                       created_at, completed_at 
-                FROM downloads 
-                WHERE id = ?
+                INSERT INTO downloads (id, url, video_id, filename, status, created_at)
+                VALUES (?, ?, ?, ?, 'pending', ?)
+                ON CONFLICT(video_id) DO NOTHING
+                """,
+                [
+                    (job["id"], job["url"], job["video_id"], job["filename"], now)
+                    for job in jobs
+                ],
+            )
+            requeued = await conn.execute_fetchall(
+                f"""
+                UPDATE downloads
+                SET status = 'pending', attempts = 0, next_attempt_at = NULL,
+                    error = NULL, completed_at = NULL
+                WHERE video_id IN ({placeholders}) AND status = 'error'
+                RETURNING id
                 """,
-                (download_id,),
+                video_ids,
+            )
+            rows = await conn.execute_fetchall(
+                f"""
+                SELECT id, url, video_id, status, filename
+                FROM downloads
+                WHERE video_id IN ({placeholders})
+                """,
+                video_ids,
+            )
+            await conn.executemany(
+                "INSERT INTO batch_downloads (batch_id, download_id) VALUES (?, ?)",
+                [(batch_id, row["id"]) for row in rows],
             )
-            result = c.fetchone()
-
-            if not result:
-                return None
-
-            return {
-                "id": result[0],
-                "url": result[1],
-                "video_id": result[2],
-                "videoname": result[3],
-                "status": result[4],
-                "filename": result[5],
-                "created_at": datetime.fromisoformat(result[6]) if result[6] else None,
-                "completed_at": (
-                    datetime.fromisoformat(result[7]) if result[7] else None
-                ),
-            }
-        finally:
-            conn.close()
+
+        created_ids = {job["id"] for job in jobs}
+        requeued_ids = {row["id"] for row in requeued}
+        results = [dict(row) for row in rows]
+        for row in results:
+            row["created"] = row["id"] in created_ids
+            row["requeued"] = row["id"] in requeued_ids
+        return results
 
     @staticmethod
-    def get_completed_downloads() -> List[Dict[str, Any]]:
-        conn = sqlite3.connect(DATABASE_PATH)
-        c = conn.cursor()
-        try:
-            c.execute(
-                """
-                SELECT id, url, video_id, videoname, status, filename, created_at, completed_at 
-                FROM downloads 
-                WHERE status = 'completed' 
-                AND filename IS NOT NULL
-                """
-            )
-            db_files = c.fetchall()
-
-            files = []
-            for db_file in db_files:
-                (
-                    download_id,
-                    url,
-                    video_id,
-                    videoname,
-                    status,
-                    filename,
-                    created_at,
-                    completed_at,
-                ) = db_file
-
-                file_path = os.path.join(DOWNLOADS_PATH, filename)
-                if os.path.exists(file_path):
-                    file_stats = os.stat(file_path)
-                    files.append(
-                        {
-                            "id": download_id,
-                            "url": url,
-                            "filename": filename,
-                            "filepath": file_path,
-                            "size": file_stats.st_size,
-                            "created_at": (
-                                datetime.fromisoformat(created_at)
-                                if created_at
-                                else None
-                            ),
-                            "completed_at": (
-                                datetime.fromisoformat(completed_at)
-                                if completed_at
-                                else None
-                            ),
-                            "video_id": video_id,
-                            "videoname": videoname,
-                            "status": status,
-                        }
-                    )
-            return files
-        finally:
-            conn.close()
+    @db_query_duration.time("downloads.get_batch")
+    async def get_batch(batch_id: str) -> Optional[Dict[str, Any]]:
+        batch = await database.fetch_one(
+            "SELECT id, source, created_at FROM batches WHERE id = ?", (batch_id,)
+        )
+        if batch is None:
+            return None
+
+        batch["created_at"] = _parse_timestamp(batch["created_at"])
+        batch["downloads"] = await database.fetch_all(
+            """
+            SELECT d.id, d.video_id, d.videoname, d.status, d.filename
+            FROM batch_downloads b
+            JOIN downloads d ON d.id = b.download_id
+            WHERE b.batch_id = ?
+            ORDER BY d.created_at, d.id
+            """,
+            (batch_id,),
+        )
+        return batch
@@ -0,0 +1,298 @@
+import asyncio
+from collections import Counter
+import os
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional
+
+from .feed_service import feed_cache
+from .file_index import file_index
+from .storage import storage
+from .transcoder import transcoder
+from ..core.database import database
+from ..core.logger import get_logger
+from ..core.metrics import metrics
+
+# Storage budget for downloaded audio and its renditions; 0 disables a limit
+STORAGE_MAX_BYTES = int(os.getenv("STORAGE_MAX_BYTES", "0"))
+STORAGE_MAX_FILES = int(os.getenv("STORAGE_MAX_FILES", "0"))
+# Once over budget, evict down to this share of it so the next few
+# downloads do not trigger another round straight away
+EVICTION_LOW_WATERMARK = float(os.getenv("EVICTION_LOW_WATERMARK", "0.9"))
+EVICTION_INTERVAL = float(os.getenv("EVICTION_INTERVAL", "300"))
+# Downloads completed more recently than this are never evicted
+EVICTION_MIN_AGE = float(os.getenv("EVICTION_MIN_AGE", "86400"))
+# A play counts half as much after this many hours without another one
+EVICTION_HALF_LIFE_HOURS = float(os.getenv("EVICTION_HALF_LIFE_HOURS", "168"))
+# Seconds clients are told to wait while an evicted file is downloaded again
+EVICTION_RETRY_AFTER = int(os.getenv("EVICTION_RETRY_AFTER", "30"))
+
+logger = get_logger("services.evictor")
+
+evicted_files = metrics.counter("evicted_files", "Downloads evicted to stay within budget")
+evicted_bytes = metrics.counter("evicted_bytes", "Bytes freed by evicting downloads")
+restored_files = metrics.counter(
+    "restored_files", "Evicted downloads queued again because they were requested"
+)
+storage_used_bytes = metrics.gauge(
+    "storage_used_bytes", "Bytes of stored audio and renditions at the last eviction check"
+)
+storage_used_files = metrics.gauge(
+    "storage_used_files", "Stored audio and rendition files at the last eviction check"
+)
+
+
+class Candidate(NamedTuple):
+    download_id: str
+    filename: str
+    storage_path: str
+    keys: List[str]
+    score: float
+
+
+def score(access_count: int, last_used: datetime, now: datetime, half_life_hours: float) -> float:
+    """
+    LRU/LFU hybrid: plays, decayed by the time since the last one. A file
+    played often long ago and one played once yesterday can rank alike;
+    files never played rank by how long ago they were downloaded.
+    """
+    hours = max((now - last_used).total_seconds() / 3600, 0.0)
+    return (1 + access_count) * 0.5 ** (hours / half_life_hours)
+
+
+class StorageEvictor:
+    """
+    Keeps stored audio within a byte and/or file budget.
+
+    Every `interval` seconds, when the stored objects (downloads and their
+    renditions, identical content counted once) exceed the budget, the
+    coldest completed downloads by `score()` are marked `evicted` and their
+    objects deleted, until usage is back under the low watermark. Objects
+    still referenced by another download or rendition are kept.
+
+    Evicted downloads stay in the feed. Requesting one queues it for
+    download again, see `restore()`. Files from before sharded storage are
+    not tracked and never evicted.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = STORAGE_MAX_BYTES,
+        max_files: int = STORAGE_MAX_FILES,
+        low_watermark: float = EVICTION_LOW_WATERMARK,
+        interval: float = EVICTION_INTERVAL,
+        min_age: float = EVICTION_MIN_AGE,
+        half_life_hours: float = EVICTION_HALF_LIFE_HOURS,
+    ):
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.low_watermark = low_watermark
+        self.interval = interval
+        self.min_age = min_age
+        self.half_life_hours = half_life_hours
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0 or self.max_files > 0
+
+    async def start(self):
+        if self._task is None and self.enabled and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.evict)
+            except Exception as e:
+                logger.error("Error evicting downloads: {}", e)
+            await asyncio.sleep(self.interval)
+
+    def _over(self, used_bytes: int, used_files: int, share: float) -> bool:
+        return (self.max_bytes > 0 and used_bytes > self.max_bytes * share) or (
+            self.max_files > 0 and used_files > self.max_files * share
+        )
+
+    def evict(self) -> int:
+        """Run one eviction round, returning the number of evicted downloads."""
+        conn = database.sync_connection()
+        downloads = conn.execute(
+            """
+            SELECT d.id, d.filename, d.storage_path, d.size, d.completed_at,
+                   f.access_count, f.last_accessed
+            FROM downloads d LEFT JOIN file_access f ON f.filename = d.filename
+            WHERE d.status = 'completed' AND d.storage_path IS NOT NULL
+            """
+        ).fetchall()
+        renditions = conn.execute(
+            """
+            SELECT download_id, storage_path, size FROM renditions
+            WHERE status = 'completed' AND storage_path IS NOT NULL
+            """
+        ).fetchall()
+
+        sizes: Dict[str, int] = {}
+        references: Counter = Counter()
+        keys: Dict[str, List[str]] = {}
+        for row in downloads:
+            sizes[row["storage_path"]] = row["size"] or 0
+            references[row["storage_path"]] += 1
+            keys[row["id"]] = [row["storage_path"]]
+        for row in renditions:
+            sizes[row["storage_path"]] = row["size"] or 0
+            references[row["storage_path"]] += 1
+            keys.setdefault(row["download_id"], []).append(row["storage_path"])
+
+        used_bytes, used_files = sum(sizes.values()), len(sizes)
+        storage_used_bytes.set(used_bytes)
+        storage_used_files.set(used_files)
+        if not self._over(used_bytes, used_files, 1.0):
+            return 0
+
+        now = datetime.utcnow()
+        candidates = []
+        for row in downloads:
+            completed_at = datetime.fromisoformat(row["completed_at"])
+            if (now - completed_at).total_seconds() < self.min_age:
+                continue
+            last_used = completed_at
+            if row["last_accessed"]:
+                last_used = max(last_used, datetime.fromisoformat(row["last_accessed"]))
+            candidates.append(
+                Candidate(
+                    download_id=row["id"],
+                    filename=row["filename"],
+                    storage_path=row["storage_path"],
+                    keys=keys[row["id"]],
+                    score=score(row["access_count"] or 0, last_used, now, self.half_life_hours),
+                )
+            )
+        candidates.sort(key=lambda candidate: candidate.score)
+
+        evicted = 0
+        for candidate in candidates:
+            if not self._over(used_bytes, used_files, self.low_watermark):
+                break
+            freed = self._evict(candidate)
+            if freed is None:
+                continue
+            for key in candidate.keys:
+                references[key] -= 1
+                if references[key] <= 0 and key in sizes:
+                    used_bytes -= sizes.pop(key)
+                    used_files -= 1
+            evicted += 1
+            evicted_files.inc()
+            evicted_bytes.inc(amount=freed)
+
+        if evicted:
+            storage_used_bytes.set(used_bytes)
+            storage_used_files.set(used_files)
+            feed_cache.invalidate()
+            transcoder.invalidate()
+            logger.info(
+                "Evicted {} download(s), {} bytes in {} file(s) remain",
+                evicted,
+                used_bytes,
+                used_files,
+            )
+        elif self._over(used_bytes, used_files, 1.0):
+            logger.warning("Storage is over budget but no download is old enough to evict")
+        return evicted
+
+    def _evict(self, candidate: Candidate) -> Optional[int]:
+        """Evict one download, returning the bytes freed, or None if it changed meanwhile."""
+        conn = database.sync_connection()
+        try:
+            # Immediate, so no other writer can add a reference between the
+            # checks below and the commit
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                """
+                UPDATE downloads SET status = 'evicted', storage_path = NULL
+                WHERE id = ? AND status = 'completed' AND storage_path = ?
+                RETURNING id
+                """,
+                (candidate.download_id, candidate.storage_path),
+            ).fetchone()
+            if row is None:
+                conn.rollback()
+                return None
+            rendition_keys = [
+                row["storage_path"]
+                for row in conn.execute(
+                    "DELETE FROM renditions WHERE download_id = ? RETURNING storage_path",
+                    (candidate.download_id,),
+                ).fetchall()
+                if row["storage_path"]
+            ]
+            freed = 0
+            for key in {candidate.storage_path, *rendition_keys}:
+                # Identical content shares the object; deleted under the write
+                # lock, which writers also take to check it exists before use
+                if conn.execute(
+                    """
+                    SELECT 1 FROM downloads WHERE storage_path = ?
+                    UNION ALL
+                    SELECT 1 FROM renditions WHERE storage_path = ?
+                    LIMIT 1
+                    """,
+                    (key, key),
+                ).fetchone():
+                    continue
+                try:
+                    freed += os.path.getsize(storage.path(key))
+                except FileNotFoundError:
+                    pass
+                storage.delete(key)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+        file_index.refresh(candidate.filename)
+        logger.info("Evicted {} (score {:.3f})", candidate.filename, candidate.score)
+        return freed
+
+    async def restore(self, filename: str) -> bool:
+        """
+        Queue an evicted download again. True while the file is being
+        downloaded again, so the caller can ask the client to retry.
+        """
+        row = await database.fetch_one(
+            """
+            UPDATE downloads
+            SET status = 'pending', attempts = 0, next_attempt_at = NULL, error = NULL
+            WHERE id = (
+                SELECT id FROM downloads WHERE filename = ? AND status = 'evicted' LIMIT 1
+            )
+            RETURNING id
+            """,
+            (filename,),
+        )
+        if row is not None:
+            restored_files.inc()
+            logger.info("Downloading evicted file {} again (ID: {})", filename, row["id"])
+            return True
+
+        # Already queued by an earlier request, or by another worker process
+        row = await database.fetch_one(
+            """
+            SELECT 1 FROM downloads
+            WHERE filename = ? AND status IN ('pending', 'downloading') AND checksum IS NOT NULL
+            LIMIT 1
+            """,
+            (filename,),
+        )
+        return row is not None
+
+
+storage_evictor = StorageEvictor()
@@ -0,0 +1,269 @@
+import asyncio
+from email.utils import format_datetime
+import gzip
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import quote
+from xml.sax.saxutils import escape, quoteattr
+
+from .file_index import CONTENT_TYPES, file_index, get_extension
+from ..core.database import database
+from ..core.logger import get_logger
+from ..core.metrics import cache_requests, db_query_duration
+
+DATABASE_PATH = os.getenv("DATABASE_PATH")
+FEED_TITLE = os.getenv("FEED_TITLE", "Podcastarr")
+FEED_DESCRIPTION = os.getenv("FEED_DESCRIPTION", "Audio downloaded from YouTube")
+FEED_AUTHOR = os.getenv("FEED_AUTHOR", "Podcastarr")
+FEED_IMAGE_URL = os.getenv("FEED_IMAGE_URL")
+FEED_LANGUAGE = os.getenv("FEED_LANGUAGE", "en")
+FEED_MAX_ITEMS = int(os.getenv("FEED_MAX_ITEMS", "300"))
+# Rendition linked from enclosures once it is built, e.g. "opus-64k"
+FEED_RENDITION = os.getenv("FEED_RENDITION")
+FEED_CACHE_PATH = os.getenv(
+    "FEED_CACHE_PATH",
+    os.path.join(os.path.dirname(DATABASE_PATH or "./data/downloads.db"), "feed.xml"),
+)
+
+logger = get_logger("services.feed_service")
+
+
+class FeedDocument(NamedTuple):
+    body: bytes
+    gzip_body: bytes
+    etag: str
+    last_modified: str
+    base_url: str
+
+
+def _format_item(
+    row: Dict[str, Any],
+    size: int,
+    content_type: str,
+    base_url: str,
+    rendition: Optional[str] = None,
+) -> str:
+    title = row["videoname"] or row["video_id"]
+    published = datetime.fromisoformat(row["completed_at"]).replace(tzinfo=timezone.utc)
+    enclosure_url = f"{base_url}/audio/{quote(row['filename'])}"
+    if rendition is not None:
+        enclosure_url += f"?rendition={quote(rendition)}"
+    return (
+        "<item>"
+        f"<title>{escape(title)}</title>"
+        f"<link>{escape(row['url'])}</link>"
+        f'<guid isPermaLink="false">{escape(row["id"])}</guid>'
+        f"<pubDate>{format_datetime(published, usegmt=True)}</pubDate>"
+        f"<enclosure url={quoteattr(enclosure_url)} length=\"{size}\""
+        f" type={quoteattr(content_type)}/>"
+        f"<itunes:title>{escape(title)}</itunes:title>"
+        "</item>"
+    )
+
+
+class FeedCache:
+    """
+    The podcast RSS feed, kept rendered and gzipped in memory.
+
+    The feed is rebuilt on the first request after `invalidate()`, which the
+    scheduler calls when a download completes. Items are rendered once and
+    reused across rebuilds while their row and file are unchanged. The last
+    rendered feed is mirrored to disk so a restart serves it without a rebuild.
+    """
+
+    def __init__(self, path: str = FEED_CACHE_PATH, max_items: int = FEED_MAX_ITEMS):
+        self.path = path
+        self.max_items = max_items
+        self._document: Optional[FeedDocument] = None
+        self._version = 0
+        self._built_version = -1
+        self._version_lock = threading.Lock()
+        self._build_lock: Optional[asyncio.Lock] = None
+        # download id -> (signature, rendered <item>)
+        self._items: Dict[str, Tuple[tuple, str]] = {}
+
+    def invalidate(self):
+        """Mark the feed stale. Safe to call from any thread."""
+        with self._version_lock:
+            self._version += 1
+
+    def load(self):
+        """Load the feed mirrored to disk by a previous run, if any."""
+        try:
+            with open(self.path + ".json") as f:
+                meta = json.load(f)
+            with open(self.path, "rb") as f:
+                body = f.read()
+        except (FileNotFoundError, ValueError):
+            return
+
+        if hashlib.sha1(body).hexdigest()[:16] != meta.get("etag", "").strip('"'):
+            logger.warning(f"Ignoring inconsistent feed cache at {self.path}")
+            return
+
+        self._document = FeedDocument(
+            body=body,
+            gzip_body=gzip.compress(body),
+            etag=meta["etag"],
+            last_modified=meta["last_modified"],
+            base_url=meta["base_url"],
+        )
+        with self._version_lock:
+            self._built_version = self._version
+        logger.info(f"Loaded cached feed from {self.path}")
+
+    async def get(self, base_url: str) -> FeedDocument:
+        document = self._document
+        if (
+            document is not None
+            and document.base_url == base_url
+            and self._built_version == self._version
+        ):
+            cache_requests.inc("feed", "hit")
+            return document
+
+        if self._build_lock is None:
+            self._build_lock = asyncio.Lock()
+
+        # Concurrent pollers after an invalidation wait for a single rebuild
+        async with self._build_lock:
+            document = self._document
+            if (
+                document is None
+                or document.base_url != base_url
+                or self._built_version != self._version
+            ):
+                cache_requests.inc("feed", "miss")
+                document = await self._rebuild(base_url)
+            else:
+                cache_requests.inc("feed", "hit")
+            return document
+
+    @db_query_duration.time("feed.rebuild")
+    async def _rebuild(self, base_url: str) -> FeedDocument:
+        with self._version_lock:
+            version = self._version
+
+        rows = await database.fetch_all(
+            """
+            SELECT d.id, d.url, d.video_id, d.videoname, d.status, d.filename, d.size,
+                   d.completed_at, r.size AS rendition_size, r.content_type AS rendition_type
+            FROM downloads d
+            LEFT JOIN renditions r
+            ON r.download_id = d.id AND r.name = ? AND r.status = 'completed'
+            WHERE d.status = 'completed'
+            -- Evicted files are downloaded again on request
+            OR (d.status IN ('evicted', 'pending', 'downloading') AND d.checksum IS NOT NULL)
+            ORDER BY COALESCE(d.completed_at, d.created_at) DESC, d.id DESC
+            LIMIT ?
+            """,
+            (FEED_RENDITION, self.max_items),
+        )
+        document = await asyncio.to_thread(self._render, rows, base_url)
+
+        self._document = document
+        self._built_version = version
+        logger.info(f"Feed rebuilt with {document.body.count(b'<item>')} item(s)")
+        return document
+
+    def _render(self, rows: List[Dict[str, Any]], base_url: str) -> FeedDocument:
+        items = {}
+        fragments = []
+        latest = None
+        for row in rows:
+            if not row["filename"] or not row["completed_at"]:
+                continue
+            if row["status"] == "completed":
+                entry = file_index.get(row["filename"])
+                # Same rule as /api/files: no file, no episode
+                if entry is None:
+                    continue
+                size, content_type = entry.size, entry.content_type
+            else:
+                size = row["size"]
+                content_type = CONTENT_TYPES.get(get_extension(row["filename"]), "audio/mpeg")
+            rendition = None
+            if row["rendition_size"] is not None:
+                size, content_type = row["rendition_size"], row["rendition_type"]
+                rendition = FEED_RENDITION
+
+            signature = (
+                row["videoname"],
+                row["completed_at"],
+                row["filename"],
+                size,
+                rendition,
+                base_url,
+            )
+            cached = self._items.get(row["id"])
+            if cached is None or cached[0] != signature:
+                cached = (
+                    signature,
+                    _format_item(row, size, content_type, base_url, rendition),
+                )
+            items[row["id"]] = cached
+            fragments.append(cached[1])
+            latest = latest or row["completed_at"]
+        self._items = items
+
+        if latest is not None:
+            updated = datetime.fromisoformat(latest).replace(tzinfo=timezone.utc)
+        else:
+            updated = datetime.now(timezone.utc)
+        last_modified = format_datetime(updated, usegmt=True)
+
+        image = ""
+        if FEED_IMAGE_URL:
+            image = f"<itunes:image href={quoteattr(FEED_IMAGE_URL)}/>"
+
+        body = (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<rss version="2.0" xmlns:itunes="http://www.itunes.com/dtds/podcast-1.0.dtd">'
+            "<channel>"
+            f"<title>{escape(FEED_TITLE)}</title>"
+            f"<link>{escape(base_url)}</link>"
+            f"<description>{escape(FEED_DESCRIPTION)}</description>"
+            f"<language>{escape(FEED_LANGUAGE)}</language>"
+            f"<lastBuildDate>{last_modified}</lastBuildDate>"
+            f"<itunes:author>{escape(FEED_AUTHOR)}</itunes:author>"
+            f"{image}"
+            f"{''.join(fragments)}"
+            "</channel></rss>"
+        ).encode("utf-8")
+
+        document = FeedDocument(
+            body=body,
+            gzip_body=gzip.compress(body),
+            etag=f'"{hashlib.sha1(body).hexdigest()[:16]}"',
+            last_modified=last_modified,
+            base_url=base_url,
+        )
+        self._save(document)
+        return document
+
+    def _save(self, document: FeedDocument):
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path + ".tmp", "wb") as f:
+                f.write(document.body)
+            os.replace(self.path + ".tmp", self.path)
+            with open(self.path + ".json.tmp", "w") as f:
+                json.dump(
+                    {
+                        "etag": document.etag,
+                        "last_modified": document.last_modified,
+                        "base_url": document.base_url,
+                    },
+                    f,
+                )
+            os.replace(self.path + ".json.tmp", self.path + ".json")
+        except OSError as e:
+            # The in-memory copy still serves, only restarts lose the cache
+            logger.warning(f"Could not write feed cache to {self.path}: {e}")
+
+
+feed_cache = FeedCache()
@@ -0,0 +1,216 @@
+import asyncio
+import os
+from email.utils import formatdate
+import threading
+from typing import Dict, Mapping, NamedTuple, Optional, Tuple
+
+from .storage import storage
+from ..core.database import database
+from ..core.logger import get_logger
+from ..core.metrics import cache_requests
+
+DOWNLOADS_PATH = os.getenv("DOWNLOADS_PATH", "./downloads")
+FILE_INDEX_RECONCILE_INTERVAL = float(os.getenv("FILE_INDEX_RECONCILE_INTERVAL", "60"))
+
+logger = get_logger("services.file_index")
+
+CONTENT_TYPES = {
+    ".mp3": "audio/mpeg",
+    ".wav": "audio/wav",
+    ".ogg": "audio/ogg",
+    ".flac": "audio/flac",
+    ".m4a": "audio/mp4",
+    ".opus": "audio/ogg",
+}
+ALLOWED_EXTENSIONS = set(CONTENT_TYPES)
+
+# Stored object and recorded size of a completed download
+LOCATE_QUERY = """
+    SELECT storage_path, size FROM downloads
+    WHERE filename = ? AND status = 'completed' AND storage_path IS NOT NULL
+    LIMIT 1
+"""
+
+
+class FileEntry(NamedTuple):
+    filename: str
+    path: str
+    size: int
+    mtime: float
+    content_type: str
+    etag: str
+    last_modified: str
+    stat: os.stat_result
+
+
+def get_extension(filename: str) -> str:
+    return os.path.splitext(filename)[1].lower()
+
+
+def build_entry(filename: str, path: str, stat: os.stat_result) -> FileEntry:
+    return FileEntry(
+        filename=filename,
+        path=path,
+        size=stat.st_size,
+        mtime=stat.st_mtime,
+        content_type=CONTENT_TYPES[get_extension(filename)],
+        etag=f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"',
+        last_modified=formatdate(stat.st_mtime, usegmt=True),
+        stat=stat,
+    )
+
+
+class FileIndex:
+    """
+    In-memory index of the served audio files, by public filename.
+
+    Completed downloads are located through their `storage_path`; files
+    from before sharded storage are still found at the top level of
+    DOWNLOADS_PATH. Filled at startup, updated by the download scheduler
+    whenever it finishes a file, and reconciled with the database and disk
+    periodically. Files whose size differs from the recorded one are
+    treated as corrupt and left out. Lookups never touch the filesystem or
+    database unless asked to refresh a miss.
+    """
+
+    def __init__(
+        self,
+        root: str = DOWNLOADS_PATH,
+        reconcile_interval: float = FILE_INDEX_RECONCILE_INTERVAL,
+    ):
+        self.root = root
+        self.reconcile_interval = reconcile_interval
+        self._entries: Dict[str, FileEntry] = {}
+        self._lock = threading.Lock()
+        # Filenames refreshed while a scan is running, which win over the scan
+        self._refreshed_during_scan: Optional[set] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, filename: str, record: bool = True) -> Optional[FileEntry]:
+        # Background lookups pass record=False to stay out of the hit ratio
+        entry = self._entries.get(filename)
+        if record:
+            cache_requests.inc("file_index", "miss" if entry is None else "hit")
+        return entry
+
+    def refresh(self, filename: str) -> Optional[FileEntry]:
+        """Re-stat a single file, adding, updating or dropping its entry."""
+        if get_extension(filename) not in ALLOWED_EXTENSIONS:
+            return None
+        return self._store(filename, self._stat_entry(filename, *self._locate(filename)))
+
+    async def reload(self, filename: str) -> Optional[FileEntry]:
+        """`refresh()` for async callers, locating the file through the pool."""
+        if get_extension(filename) not in ALLOWED_EXTENSIONS:
+            return None
+        row = await database.fetch_one(LOCATE_QUERY, (filename,))
+        return self._store(filename, self._stat_entry(filename, *self._resolve(filename, row)))
+
+    def _store(self, filename: str, entry: Optional[FileEntry]) -> Optional[FileEntry]:
+        with self._lock:
+            if entry is None:
+                self._entries.pop(filename, None)
+            else:
+                self._entries[filename] = entry
+            if self._refreshed_during_scan is not None:
+                self._refreshed_during_scan.add(filename)
+        return entry
+
+    def _locate(self, filename: str) -> Tuple[str, Optional[int]]:
+        row = database.sync_connection().execute(LOCATE_QUERY, (filename,)).fetchone()
+        return self._resolve(filename, row)
+
+    def _resolve(self, filename: str, row: Optional[Mapping]) -> Tuple[str, Optional[int]]:
+        """Path and recorded size of a file, falling back to the legacy location."""
+        if row is None:
+            return os.path.join(self.root, filename), None
+        return storage.path(row["storage_path"]), row["size"]
+
+    def _stat_entry(
+        self, filename: str, path: str, expected_size: Optional[int]
+    ) -> Optional[FileEntry]:
+        try:
+            stat = os.stat(path)
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        if expected_size is not None and stat.st_size != expected_size:
+            logger.error(
+                f"Not serving {filename}: {stat.st_size} bytes on disk, {expected_size} recorded"
+            )
+            return None
+        return build_entry(filename, path, stat)
+
+    def scan(self):
+        """Rebuild the whole index from the database and a directory listing."""
+        with self._lock:
+            self._refreshed_during_scan = set()
+
+        entries = {}
+        # Legacy files, stored flat in the downloads directory
+        try:
+            with os.scandir(self.root) as it:
+                for dir_entry in it:
+                    if get_extension(dir_entry.name) not in ALLOWED_EXTENSIONS:
+                        continue
+                    if not dir_entry.is_file():
+                        continue
+                    entries[dir_entry.name] = build_entry(
+                        dir_entry.name, dir_entry.path, dir_entry.stat()
+                    )
+        except FileNotFoundError:
+            logger.warning(f"Downloads directory not found: {self.root}")
+
+        rows = database.sync_connection().execute(
+            """
+            SELECT filename, storage_path, size FROM downloads
+            WHERE status = 'completed' AND storage_path IS NOT NULL
+            """
+        )
+        for row in rows:
+            if get_extension(row["filename"]) not in ALLOWED_EXTENSIONS:
+                continue
+            entry = self._stat_entry(row["filename"], storage.path(row["storage_path"]), row["size"])
+            if entry is not None:
+                entries[row["filename"]] = entry
+
+        with self._lock:
+            for filename in self._refreshed_during_scan:
+                if filename in self._entries:
+                    entries[filename] = self._entries[filename]
+                else:
+                    entries.pop(filename, None)
+            self._entries = entries
+            self._refreshed_during_scan = None
+        logger.debug(f"Indexed {len(entries)} audio file(s) in {self.root}")
+
+    async def rescan(self):
+        await asyncio.to_thread(self.scan)
+
+    async def start(self):
+        await self.rescan()
+        logger.info(f"File index loaded with {len(self)} file(s)")
+        if self._task is None and self.reconcile_interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.reconcile_interval)
+            try:
+                await self.rescan()
+            except Exception as e:
+                logger.error(f"Error reconciling file index: {e}")
+
+
+file_index = FileIndex()
@@ -1,82 +1,313 @@
+import asyncio
 from datetime import datetime
-import sqlite3
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Tuple
+from ..core.database import database
 from ..core.logger import get_logger
-from dotenv import load_dotenv
+from ..core.metrics import db_query_duration
 import os
 
 logger = get_logger("services.filestats_service")
 
-# Load environment variables
-load_dotenv()
-DATABASE_PATH = os.getenv("DATABASE_PATH")
+STATS_FLUSH_INTERVAL = float(os.getenv("STATS_FLUSH_INTERVAL", "5"))
+STATS_FLUSH_THRESHOLD = int(os.getenv("STATS_FLUSH_THRESHOLD", "500"))
+
+
+class AccessAggregator:
+    """
+    Write-behind buffer for `file_access` counters.
+
+    Accesses are coalesced in memory per filename and written in a single
+    transaction every `flush_interval` seconds, or as soon as
+    `flush_threshold` accesses are pending. Pending deltas are exposed so
+    readers can merge them into what is already stored. The same transaction
+    appends each access to `access_events` for the analytics rollups.
+    """
+
+    def __init__(
+        self,
+        flush_interval: float = STATS_FLUSH_INTERVAL,
+        flush_threshold: int = STATS_FLUSH_THRESHOLD,
+    ):
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        # filename -> (pending access count, last accessed)
+        self._pending: Dict[str, Tuple[int, str]] = {}
+        # (filename, accessed at) for every access since the last flush
+        self._events: List[Tuple[str, str]] = []
+        self._pending_total = 0
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._threshold_flush: Optional[asyncio.Task] = None
+
+    def record(self, filename: str):
+        # Same format as SQLite's CURRENT_TIMESTAMP, used by existing rows
+        now = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+        count, _ = self._pending.get(filename, (0, now))
+        self._pending[filename] = (count + 1, now)
+        self._events.append((filename, now))
+        self._pending_total += 1
+
+        if self._pending_total >= self.flush_threshold and (
+            self._threshold_flush is None or self._threshold_flush.done()
+        ):
+            self._threshold_flush = asyncio.get_running_loop().create_task(
+                self.flush()
+            )
+
+    def pending(self, filename: str) -> Optional[Tuple[int, str]]:
+        return self._pending.get(filename)
+
+    def pending_filenames(self) -> List[str]:
+        return list(self._pending)
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        # Do not lose counts buffered since the last tick
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing file access stats: {e}")
+
+    @db_query_duration.time("file_access.flush")
+    async def flush(self):
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+
+        async with self._flush_lock:
+            if not self._pending:
+                return
+
+            batch, self._pending = self._pending, {}
+            events, self._events = self._events, []
+            self._pending_total = 0
+            try:
+                async with database.transaction() as conn:
+                    await conn.executemany(
+                        """
+                        INSERT INTO file_access (filename, access_count, last_accessed)
+                        VALUES (?, ?, ?)
+                        ON CONFLICT(filename) DO UPDATE SET
+                            access_count = access_count + excluded.access_count,
+                            last_accessed = excluded.last_accessed
+                        """,
+                        [
+                            (filename, count, last_accessed)
+                            for filename, (count, last_accessed) in batch.items()
+                        ],
+                    )
+                    await conn.executemany(
+                        "INSERT INTO access_events (filename, accessed_at) VALUES (?, ?)",
+                        events,
+                    )
+                logger.debug(
+                    f"Flushed access stats for {len(batch)} file(s), {len(events)} event(s)"
+                )
+
+            except Exception:
+                # Put the batch back so the next flush retries it
+                self._events[:0] = events
+                for filename, (count, last_accessed) in batch.items():
+                    pending_count, pending_last = self._pending.get(
+                        filename, (0, last_accessed)
+                    )
+                    self._pending[filename] = (count + pending_count, pending_last)
+                    self._pending_total += count
+                raise
+
+
+access_aggregator = AccessAggregator()
 
 
 class FileStats:
     def __init__(self):
-        self.db_path = DATABASE_PATH
+        self.db = database
+        self.aggregator = access_aggregator
 
     async def record_access(self, filename: str):
-        try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.execute(
-                    """
-                    INSERT INTO file_access (filename, last_accessed)
-                    VALUES (?, CURRENT_TIMESTAMP)
-                    ON CONFLICT(filename) DO UPDATE SET
-                        access_count = access_count + 1,
-                        last_accessed = CURRENT_TIMESTAMP
-                """,
-                    (filename,),
-                )
+        # Buffered in memory, written to the database by the aggregator
+        self.aggregator.record(filename)
 
-        except Exception as e:
-            logger.error(f"Error recording file access: {e}")
-            raise
+    def _merge_pending(self, row: dict) -> dict:
+        pending = self.aggregator.pending(row["filename"])
+        if pending is not None:
+            count, last_accessed = pending
+            row["access_count"] += count
+            row["last_accessed"] = last_accessed
+        return row
 
-    async def get_stats(self, skip: int = 0, limit: int = 10) -> List[dict]:
+    async def _pending_only(self, conn) -> Dict[str, Tuple[int, str]]:
+        """Files accessed for the first time since the last flush."""
+        pending = self.aggregator.pending_filenames()
+        if not pending:
+            return {}
+
+        placeholders = ",".join("?" * len(pending))
+        stored = await conn.execute_fetchall(
+            f"SELECT filename FROM file_access WHERE filename IN ({placeholders})",
+            pending,
+        )
+        stored_names = {row["filename"] for row in stored}
+        return {
+            filename: self.aggregator.pending(filename)
+            for filename in pending
+            if filename not in stored_names and self.aggregator.pending(filename)
+        }
+
+    @db_query_duration.time("file_access.get_stats_page")
+    async def get_stats_page(
+        self,
+        limit: int = 10,
+        skip: int = 0,
+        after: Optional[Tuple[int, str]] = None,
+    ) -> Dict[str, Any]:
+        """
+        One page of files by access count, most accessed first.
+
+        Pages are walked on idx_file_access_count: `after` is the stored
+        (access_count, filename) of the last row of the previous page, and is
+        returned as `next` for the page after this one. `skip` is the legacy
+        OFFSET alternative. The page, its total and the unflushed counts are
+        read on a single connection.
+        """
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
-                cursor = conn.execute(
-                    """
-                    SELECT filename, access_count, last_accessed
-                    FROM file_access
-                    ORDER BY access_count DESC
-                    LIMIT ? OFFSET ?
-                """,
-                    (limit, skip),
-                )
-                return [dict(row) for row in cursor.fetchall()]
+            async with self.db.connection() as conn:
+                if after is not None:
+                    count, filename = after
+                    # Two index range scans, rather than an OR the planner
+                    # cannot seek on
+                    rows = await conn.execute_fetchall(
+                        """
+                        SELECT * FROM (
+                            SELECT filename, access_count, last_accessed
+                            FROM file_access
+                            WHERE access_count = ? AND filename > ?
+                            ORDER BY access_count DESC, filename
+                            LIMIT ?
+                        )
+                        UNION ALL
+                        SELECT * FROM (
+                            SELECT filename, access_count, last_accessed
+                            FROM file_access
+                            WHERE access_count < ?
+                            ORDER BY access_count DESC, filename
+                            LIMIT ?
+                        )
+                        LIMIT ?
+                        """,
+                        (count, filename, limit + 1, count, limit + 1, limit + 1),
+                    )
+                else:
+                    rows = await conn.execute_fetchall(
+                        """
+                        SELECT filename, access_count, last_accessed
+                        FROM file_access
+                        ORDER BY access_count DESC, filename
+                        LIMIT ? OFFSET ?
+                        """,
+                        (limit + 1, skip),
+                    )
+                total = await self._stored_count(conn)
+                pending_only = await self._pending_only(conn)
+
+            rows = [dict(row) for row in rows]
+            next_after = None
+            if len(rows) > limit:
+                rows = rows[:limit]
+                if rows:
+                    next_after = (rows[-1]["access_count"], rows[-1]["filename"])
+
+            # Unflushed new files go on the page whose stored count range
+            # they fall in, so each shows up exactly once while walking
+            floor = next_after[0] if next_after else 0
+            if after is not None:
+                ceiling = after[0]
+            elif skip and rows:
+                ceiling = rows[0]["access_count"]
+            else:
+                ceiling = float("inf")
+
+            rows = [self._merge_pending(row) for row in rows]
+            for filename, (count, last_accessed) in pending_only.items():
+                if floor < count <= ceiling:
+                    rows.append(
+                        {
+                            "filename": filename,
+                            "access_count": count,
+                            "last_accessed": last_accessed,
+                        }
+                    )
+
+            rows.sort(key=lambda row: (-row["access_count"], row["filename"]))
+            for row in rows:
+                row["last_accessed"] = datetime.fromisoformat(row["last_accessed"])
+
+            return {
+                "data": rows,
+                "next": next_after,
+                "total": total + len(pending_only),
+            }
 
         except Exception as e:
             logger.error(f"Error getting file stats: {e}")
             raise
 
+    async def _stored_count(self, conn) -> int:
+        # Maintained by triggers on file_access, see migration 009
+        rows = await conn.execute_fetchall(
+            "SELECT count FROM table_counts WHERE name = 'file_access'"
+        )
+        return rows[0]["count"] if rows else 0
+
+    @db_query_duration.time("file_access.get_total_count")
     async def get_total_count(self) -> int:
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.execute("SELECT COUNT(*) FROM file_access")
-                return cursor.fetchone()[0]
+            async with self.db.connection() as conn:
+                return await self._stored_count(conn) + len(await self._pending_only(conn))
 
         except Exception as e:
             logger.error(f"Error getting total count: {e}")
             raise
 
+    @db_query_duration.time("file_access.get_file_stats")
     async def get_file_stats(self, filename: str) -> Optional[dict]:
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
-                cursor = conn.execute(
-                    """
-                    SELECT filename, access_count, last_accessed
-                    FROM file_access
-                    WHERE filename = ?
+            row = await self.db.fetch_one(
+                """
+                SELECT filename, access_count, last_accessed
+                FROM file_access
+                WHERE filename = ?
                 """,
-                    (filename,),
-                )
-                row = cursor.fetchone()
-                return dict(row) if row else None
+                (filename,),
+            )
+            if row is not None:
+                return self._merge_pending(row)
+
+            pending = self.aggregator.pending(filename)
+            if pending is None:
+                return None
+
+            count, last_accessed = pending
+            return {
+                "filename": filename,
+                "access_count": count,
+                "last_accessed": last_accessed,
+            }
 
         except Exception as e:
             logger.error(f"Error getting file stats: {e}")
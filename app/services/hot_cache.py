@@ -0,0 +1,207 @@
+import asyncio
+import mmap
+import os
+from datetime import datetime
+from typing import Dict, NamedTuple, Optional
+
+from .evictor import score
+from .file_index import FileEntry, build_entry, file_index
+from ..core.database import database
+from ..core.logger import get_logger
+from ..core.metrics import cache_requests, metrics
+
+# Memory for the most played files; 0 disables the cache
+HOT_CACHE_MAX_BYTES = int(os.getenv("HOT_CACHE_MAX_BYTES", "0"))
+# "mmap" maps files (page cache, shared by worker processes),
+# "bytes" reads them onto the heap (kept even under memory pressure)
+HOT_CACHE_MODE = os.getenv("HOT_CACHE_MODE", "mmap")
+HOT_CACHE_MIN_PLAYS = int(os.getenv("HOT_CACHE_MIN_PLAYS", "3"))
+HOT_CACHE_INTERVAL = float(os.getenv("HOT_CACHE_INTERVAL", "30"))
+# Short, so a new release overtakes the back catalogue within hours
+HOT_CACHE_HALF_LIFE_HOURS = float(os.getenv("HOT_CACHE_HALF_LIFE_HOURS", "6"))
+
+logger = get_logger("services.hot_cache")
+
+hot_cache_bytes_served = metrics.counter(
+    "hot_cache_bytes_served", "Response bytes served from the hot-file cache instead of disk"
+)
+
+
+class CachedFile(NamedTuple):
+    etag: str
+    data: memoryview
+
+
+class HotFileCache:
+    """
+    Most played audio files held in memory, within a byte budget.
+
+    Every `interval` seconds, files with at least `min_plays` plays in
+    `file_access` are ranked by plays decayed by the time since the last
+    one (the evictor's `score()`), and the best that fit the budget are
+    loaded; the rest are dropped. A cached file is served only while its
+    index entry (mtime and size) matches the one it was loaded with, and
+    cached files are re-checked on disk at every refresh.
+
+    Responses slice the cached memoryview, so nothing is copied and a file
+    dropped from the cache stays valid for the responses still sending it.
+    Mapped files must be replaced rather than rewritten in place, which is
+    how storage writes them.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = HOT_CACHE_MAX_BYTES,
+        mode: str = HOT_CACHE_MODE,
+        min_plays: int = HOT_CACHE_MIN_PLAYS,
+        interval: float = HOT_CACHE_INTERVAL,
+        half_life_hours: float = HOT_CACHE_HALF_LIFE_HOURS,
+    ):
+        if mode not in ("mmap", "bytes"):
+            raise ValueError(f"Unknown hot cache mode: {mode}")
+        self.max_bytes = max_bytes
+        self.mode = mode
+        self.min_plays = min_plays
+        self.interval = interval
+        self.half_life_hours = half_life_hours
+        # path -> cached file; replaced as a whole, never mutated
+        self._files: Dict[str, CachedFile] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @property
+    def used_bytes(self) -> int:
+        return sum(len(cached.data) for cached in self._files.values())
+
+    def get(self, entry: FileEntry) -> Optional[memoryview]:
+        """Contents of an indexed file, if cached and unchanged since."""
+        if not self.enabled:
+            return None
+        cached = self._files.get(entry.path)
+        if cached is not None and cached.etag != entry.etag:
+            # Changed on disk; the next refresh loads the new version if still hot
+            files = dict(self._files)
+            files.pop(entry.path, None)
+            self._files = files
+            cached = None
+        cache_requests.inc("hot_cache", "miss" if cached is None else "hit")
+        return cached.data if cached is not None else None
+
+    async def start(self):
+        if self._task is None and self.enabled:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._files = {}
+
+    async def invalidate(self):
+        if self.enabled:
+            await asyncio.to_thread(self.refresh)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.refresh)
+            except Exception as e:
+                logger.error(f"Error refreshing hot-file cache: {e}")
+            await asyncio.sleep(self.interval)
+
+    def refresh(self):
+        """Load the files that are hot now, dropping the ones that no longer are."""
+        rows = (
+            database.sync_connection()
+            .execute(
+                """
+                SELECT filename, access_count, last_accessed FROM file_access
+                WHERE access_count >= ?
+                """,
+                (self.min_plays,),
+            )
+            .fetchall()
+        )
+        now = datetime.utcnow()
+        ranked = sorted(
+            rows,
+            key=lambda row: score(
+                row["access_count"],
+                datetime.fromisoformat(row["last_accessed"]),
+                now,
+                self.half_life_hours,
+            ),
+            reverse=True,
+        )
+
+        wanted: Dict[str, FileEntry] = {}
+        budget = self.max_bytes
+        for row in ranked:
+            entry = file_index.get(row["filename"], record=False)
+            if entry is None or entry.size == 0 or entry.size > budget or entry.path in wanted:
+                continue
+            wanted[entry.path] = entry
+            budget -= entry.size
+
+        # Release what is no longer wanted before loading anything new, so
+        # the budget holds while files change hands
+        files = {
+            path: cached
+            for path, cached in self._files.items()
+            if path in wanted and cached.etag == wanted[path].etag == self._disk_etag(wanted[path])
+        }
+        self._files = dict(files)
+
+        loaded = 0
+        for path, entry in wanted.items():
+            if path in files:
+                continue
+            cached = self._load(entry)
+            if cached is not None:
+                files[path] = cached
+                loaded += 1
+        self._files = files
+        if loaded:
+            logger.info(f"Hot-file cache holds {len(files)} file(s), {self.used_bytes} bytes")
+
+    def _disk_etag(self, entry: FileEntry) -> Optional[str]:
+        try:
+            return build_entry(entry.filename, entry.path, os.stat(entry.path)).etag
+        except OSError:
+            return None
+
+    def _load(self, entry: FileEntry) -> Optional[CachedFile]:
+        try:
+            with open(entry.path, "rb") as f:
+                stat = os.fstat(f.fileno())
+                if build_entry(entry.filename, entry.path, stat).etag != entry.etag:
+                    return None
+                if self.mode == "mmap":
+                    data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                    if hasattr(mmap, "MADV_WILLNEED"):
+                        data.madvise(mmap.MADV_WILLNEED)
+                else:
+                    data = f.read()
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not cache {entry.filename}: {e}")
+            return None
+        # The mapping is unmapped once the last view of it is released
+        return CachedFile(etag=entry.etag, data=memoryview(data))
+
+
+hot_cache = HotFileCache()
+
+metrics.gauge(
+    "hot_cache_bytes", "Bytes held by the hot-file cache", function=lambda: hot_cache.used_bytes
+)
+metrics.gauge("hot_cache_files", "Files held by the hot-file cache", function=lambda: len(hot_cache))
@@ -0,0 +1,138 @@
+from collections import OrderedDict
+import threading
+import time
+import os
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple
+
+from .youtube_provider import YouTubeProvider, youtube_provider
+from ..core.logger import get_logger
+from ..core.metrics import cache_requests
+
+if TYPE_CHECKING:
+    from pytubefix import YouTube
+
+METADATA_CACHE_SIZE = int(os.getenv("METADATA_CACHE_SIZE", "512"))
+# Stream URLs handed out by YouTube expire after a few hours, keep TTL well below
+METADATA_CACHE_TTL = float(os.getenv("METADATA_CACHE_TTL", "3600"))
+
+logger = get_logger("services.metadata_service")
+
+
+class MetadataCache:
+    """
+    Thread-safe TTL/LRU cache of resolved video metadata keyed by video_id.
+
+    Alongside the metadata dict it keeps the resolved `YouTube` object, so a
+    download started shortly after resolution reuses its stream manifest
+    instead of fetching it again.
+    """
+
+    def __init__(self, maxsize: int = METADATA_CACHE_SIZE, ttl: float = METADATA_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any], Any]]" = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    def get(self, video_id: str) -> Optional[Tuple[Dict[str, Any], Any]]:
+        with self._lock:
+            entry = self._entries.get(video_id)
+            if entry is None:
+                return None
+
+            expires_at, metadata, yt = entry
+            if expires_at < time.monotonic():
+                del self._entries[video_id]
+                return None
+
+            self._entries.move_to_end(video_id)
+            return metadata, yt
+
+    def set(self, video_id: str, metadata: Dict[str, Any], yt: Any):
+        with self._lock:
+            self._entries[video_id] = (time.monotonic() + self.ttl, metadata, yt)
+            self._entries.move_to_end(video_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, video_id: str):
+        with self._lock:
+            self._entries.pop(video_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+metadata_cache = MetadataCache()
+
+# Per-video locks so concurrent misses for the same video share one fetch
+_resolve_locks: Dict[str, threading.Lock] = {}
+_resolve_locks_guard = threading.Lock()
+
+
+def _after_fork():
+    # Process download workers are forked while metadata threads may hold
+    # these locks; the copies would stay locked forever in the child
+    global _resolve_locks, _resolve_locks_guard
+    _resolve_locks = {}
+    _resolve_locks_guard = threading.Lock()
+    metadata_cache._lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+def _extract_metadata(video_id: str, yt: "YouTube") -> Dict[str, Any]:
+    return {
+        "video_id": video_id,
+        "title": yt.title,
+        "author": yt.author,
+        "duration": yt.length,
+        "audio_streams": [
+            {
+                "itag": stream.itag,
+                "mime_type": stream.mime_type,
+                "abr": stream.abr,
+                "codecs": stream.codecs,
+            }
+            for stream in yt.streams.filter(only_audio=True)
+        ],
+    }
+
+
+def resolve_video(
+    url: str, video_id: str, provider: Optional[YouTubeProvider] = None
+) -> Tuple[Dict[str, Any], "YouTube"]:
+    """
+    Return the metadata and `YouTube` object for a video, hitting the network
+    only on a cache miss. Blocking; call it from a worker thread.
+    """
+    cached = metadata_cache.get(video_id)
+    if cached is not None:
+        cache_requests.inc("metadata", "hit")
+        logger.debug("Metadata cache hit for video: {}", video_id)
+        return cached
+
+    with _resolve_locks_guard:
+        lock = _resolve_locks.setdefault(video_id, threading.Lock())
+
+    try:
+        with lock:
+            # Another thread may have resolved it while we were waiting
+            cached = metadata_cache.get(video_id)
+            if cached is not None:
+                cache_requests.inc("metadata", "hit")
+                return cached
+
+            cache_requests.inc("metadata", "miss")
+            logger.debug("Metadata cache miss for video: {}", video_id)
+            yt = (provider or youtube_provider).video(url)
+            metadata = _extract_metadata(video_id, yt)
+            metadata_cache.set(video_id, metadata, yt)
+            return metadata, yt
+    finally:
+        with _resolve_locks_guard:
+            if not lock.locked():
+                _resolve_locks.pop(video_id, None)
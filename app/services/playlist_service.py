@@ -0,0 +1,27 @@
+from itertools import islice
+import os
+from typing import List
+
+from .youtube_provider import youtube_provider
+from ..utils.youtube import extract_playlist_id, is_channel_url
+from ..core.logger import get_logger
+
+BATCH_MAX_VIDEOS = int(os.getenv("BATCH_MAX_VIDEOS", "500"))
+
+logger = get_logger("services.playlist_service")
+
+
+def is_collection_url(url: str) -> bool:
+    return extract_playlist_id(url) is not None or is_channel_url(url)
+
+
+def expand_collection(url: str, limit: int = BATCH_MAX_VIDEOS) -> List[str]:
+    """
+    Return the video URLs of a playlist or channel, at most `limit` of them.
+
+    Blocking: pages through the provider, call it off the event loop.
+    """
+    # Paged lazily, so only the pages up to `limit` are fetched
+    video_urls = list(islice(youtube_provider.collection(url), limit))
+    logger.info("Expanded {} to {} video(s)", url, len(video_urls))
+    return video_urls
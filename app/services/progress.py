@@ -0,0 +1,70 @@
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from ..core.logger import get_logger
+
+logger = get_logger("services.progress")
+
+
+class ProgressRegistry:
+    """
+    In-memory state of the downloads currently running in this process.
+
+    The scheduler registers a job with its status record when it claims it,
+    the downloader reports bytes as they are written, and the entry is
+    dropped once the final status is in the database. Status lookups for
+    running jobs are answered from here without touching the database.
+    """
+
+    def __init__(self):
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+    def start(self, download_id: str, record: Dict[str, Any]):
+        with self._lock:
+            self._jobs[download_id] = {
+                **record,
+                "progress": {
+                    "bytes_downloaded": 0,
+                    "total_bytes": None,
+                    "throughput_bps": 0.0,
+                },
+                "_started": time.monotonic(),
+            }
+
+    def update(self, download_id: str, bytes_downloaded: int, total_bytes: Optional[int]):
+        with self._lock:
+            job = self._jobs.get(download_id)
+            if job is None:
+                return
+            elapsed = time.monotonic() - job["_started"]
+            job["progress"] = {
+                "bytes_downloaded": bytes_downloaded,
+                "total_bytes": total_bytes,
+                "throughput_bps": bytes_downloaded / elapsed if elapsed > 0 else 0.0,
+            }
+
+    def annotate(self, download_id: str, **fields: Any):
+        """Update fields of a running job's status record."""
+        with self._lock:
+            job = self._jobs.get(download_id)
+            if job is not None:
+                job.update(fields)
+
+    def get(self, download_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(download_id)
+            if job is None:
+                return None
+            return {k: v for k, v in job.items() if not k.startswith("_")}
+
+    def finish(self, download_id: str):
+        with self._lock:
+            self._jobs.pop(download_id, None)
+
+
+progress_registry = ProgressRegistry()
@@ -0,0 +1,178 @@
+import hashlib
+import os
+import time
+import uuid
+from typing import Callable, Iterable, NamedTuple, Optional
+
+DOWNLOADS_PATH = os.getenv("DOWNLOADS_PATH", "./downloads")
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local")
+DOWNLOAD_BUFFER_SIZE = int(os.getenv("DOWNLOAD_BUFFER_SIZE", str(1024 * 1024)))
+
+# Suffix of files being written; never matches ALLOWED_EXTENSIONS, so
+# half-written files are invisible to serve_audio and the file index
+PARTIAL_SUFFIX = ".part"
+
+
+class StoredObject(NamedTuple):
+    key: str
+    checksum: str
+    size: int
+
+
+def object_key(checksum: str, extension: str) -> str:
+    """Two levels of 256 shards, e.g. "3f/a9/3fa9...e1.m4a"."""
+    return f"{checksum[:2]}/{checksum[2:4]}/{checksum}{extension}"
+
+
+def _fsync_directory(path: str):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class Storage:
+    """
+    Content-addressed store for audio files.
+
+    Objects are keyed by the SHA-256 of their content; the `downloads` table
+    maps each public filename to its key, checksum and size. Backends only
+    need to implement these methods; `path()` must return a local file the
+    audio routes can serve.
+    """
+
+    def write(
+        self,
+        chunks: Iterable[bytes],
+        extension: str,
+        expected_size: Optional[int] = None,
+        on_chunk: Optional[Callable[[int], None]] = None,
+    ) -> StoredObject:
+        raise NotImplementedError
+
+    def import_file(self, path: str) -> StoredObject:
+        raise NotImplementedError
+
+    def temp_path(self, extension: str) -> str:
+        """A fresh local path to produce a file at before `import_file()`."""
+        raise NotImplementedError
+
+    def path(self, key: str) -> str:
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    def remove_stale_partials(self, max_age: float) -> int:
+        raise NotImplementedError
+
+
+class LocalStorage(Storage):
+    """
+    Objects sharded into hashed subdirectories of `root`, so no directory
+    grows past a few hundred entries.
+
+    Writes stream to a `.part` file under `root/.tmp` while hashing, are
+    fsynced and atomically renamed to their key, so an object under its key
+    is always complete and matches its checksum.
+    """
+
+    def __init__(self, root: str = DOWNLOADS_PATH):
+        self.root = root
+        self.tmp_dir = os.path.join(root, ".tmp")
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def write(
+        self,
+        chunks: Iterable[bytes],
+        extension: str,
+        expected_size: Optional[int] = None,
+        on_chunk: Optional[Callable[[int], None]] = None,
+    ) -> StoredObject:
+        """
+        Store a stream of chunks. `on_chunk(bytes_written)` is called after
+        every chunk; a stream shorter or longer than `expected_size` raises
+        IOError and leaves nothing behind.
+        """
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        partial_path = os.path.join(self.tmp_dir, uuid.uuid4().hex + PARTIAL_SUFFIX)
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with open(partial_path, "wb", buffering=DOWNLOAD_BUFFER_SIZE) as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    digest.update(chunk)
+                    size += len(chunk)
+                    if on_chunk is not None:
+                        on_chunk(size)
+
+                f.flush()
+                os.fsync(f.fileno())
+
+            if expected_size is not None and size != expected_size:
+                raise IOError(f"Incomplete download: got {size} of {expected_size} bytes")
+
+            return self._commit(partial_path, digest.hexdigest(), extension, size)
+
+        except BaseException:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            raise
+
+    def import_file(self, path: str) -> StoredObject:
+        """Hash a file already under `root` and move it to its key."""
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            while chunk := f.read(DOWNLOAD_BUFFER_SIZE):
+                digest.update(chunk)
+        size = os.path.getsize(path)
+        return self._commit(path, digest.hexdigest(), os.path.splitext(path)[1].lower(), size)
+
+    def temp_path(self, extension: str) -> str:
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        return os.path.join(self.tmp_dir, uuid.uuid4().hex + extension)
+
+    def _commit(self, source: str, checksum: str, extension: str, size: int) -> StoredObject:
+        key = object_key(checksum, extension)
+        target = self.path(key)
+        shard = os.path.dirname(target)
+        os.makedirs(shard, exist_ok=True)
+        # Identical content maps to the same key; replacing keeps one copy
+        os.replace(source, target)
+        _fsync_directory(shard)
+        return StoredObject(key=key, checksum=checksum, size=size)
+
+    def delete(self, key: str):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def remove_stale_partials(self, max_age: float) -> int:
+        """Remove writes abandoned by crashed workers, untouched for `max_age` seconds."""
+        removed = 0
+        cutoff = time.time() - max_age
+        try:
+            with os.scandir(self.tmp_dir) as it:
+                for entry in it:
+                    if entry.name.endswith(PARTIAL_SUFFIX) and entry.stat().st_mtime < cutoff:
+                        try:
+                            os.remove(entry.path)
+                            removed += 1
+                        except FileNotFoundError:
+                            pass
+        except FileNotFoundError:
+            pass
+        return removed
+
+
+BACKENDS = {"local": LocalStorage}
+
+if STORAGE_BACKEND not in BACKENDS:
+    raise ValueError(f"Unknown storage backend: {STORAGE_BACKEND}")
+
+storage: Storage = BACKENDS[STORAGE_BACKEND]()
@@ -0,0 +1,399 @@
+import asyncio
+import json
+import os
+import re
+import subprocess
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime, timedelta
+from functools import partial
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from .file_index import FileEntry, build_entry
+from .storage import storage
+from ..core.database import database
+from ..core.logger import get_logger
+from ..core.metrics import metrics
+from ..utils.claims import is_orphaned_claim, new_claim_id
+
+# Comma separated "<codec>-<bitrate>" names, e.g. "opus-64k,aac-128k"; empty disables
+RENDITIONS = os.getenv("RENDITIONS", "")
+FFMPEG_PATH = os.getenv("FFMPEG_PATH", "ffmpeg")
+TRANSCODE_WORKERS = int(os.getenv("TRANSCODE_WORKERS", "1"))
+TRANSCODE_TIMEOUT = float(os.getenv("TRANSCODE_TIMEOUT", "3600"))
+# Two-pass EBU R128 loudness normalization targets; -16 LUFS is the common
+# podcast level
+LOUDNORM_I = float(os.getenv("LOUDNORM_I", "-16"))
+LOUDNORM_TP = float(os.getenv("LOUDNORM_TP", "-1.5"))
+LOUDNORM_LRA = float(os.getenv("LOUDNORM_LRA", "11"))
+
+logger = get_logger("services.transcoder")
+
+transcode_jobs = metrics.counter(
+    "transcode_jobs", "Finished rendition transcodes by outcome", ("result",)
+)
+transcode_duration = metrics.histogram(
+    "transcode_duration_seconds",
+    "Time from submission until all renditions of a download are stored",
+    buckets=(1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600),
+)
+
+
+class Codec(NamedTuple):
+    encoder: str
+    extension: str
+    content_type: str
+    sample_rate: int
+    options: Tuple[str, ...] = ()
+
+
+CODECS = {
+    "opus": Codec("libopus", ".opus", "audio/ogg", 48000),
+    # moov atom up front so players can start before the whole file arrives
+    "aac": Codec("aac", ".m4a", "audio/mp4", 48000, ("-movflags", "+faststart")),
+    "mp3": Codec("libmp3lame", ".mp3", "audio/mpeg", 44100),
+}
+
+
+class Rendition(NamedTuple):
+    name: str
+    codec: Codec
+    bitrate: str
+
+
+def parse_renditions(spec: str) -> Dict[str, Rendition]:
+    renditions = {}
+    for name in filter(None, (part.strip() for part in spec.split(","))):
+        codec, _, bitrate = name.partition("-")
+        if codec not in CODECS or not re.fullmatch(r"\d+k", bitrate):
+            raise ValueError(f"Invalid rendition: {name}")
+        renditions[name] = Rendition(name, CODECS[codec], bitrate)
+    return renditions
+
+
+def _run_ffmpeg(args: List[str]) -> str:
+    result = subprocess.run(
+        [FFMPEG_PATH, "-hide_banner", "-nostdin", *args],
+        capture_output=True,
+        text=True,
+        timeout=TRANSCODE_TIMEOUT,
+    )
+    if result.returncode != 0:
+        last_line = (result.stderr.strip().splitlines() or ["no output"])[-1]
+        raise RuntimeError(f"ffmpeg exited with {result.returncode}: {last_line}")
+    return result.stderr
+
+
+def measure_loudness(source: str) -> Dict[str, str]:
+    """First loudnorm pass: analyze the source without writing anything."""
+    stderr = _run_ffmpeg(
+        [
+            "-i", source, "-vn",
+            "-af", f"loudnorm=I={LOUDNORM_I}:TP={LOUDNORM_TP}:LRA={LOUDNORM_LRA}"
+            ":print_format=json",
+            "-f", "null", "-",
+        ]
+    )
+    # The JSON summary is the last thing loudnorm prints
+    start = stderr.rfind("{")
+    if start < 0:
+        raise RuntimeError("ffmpeg printed no loudness measurement")
+    return json.loads(stderr[start:stderr.rindex("}") + 1])
+
+
+def transcode(source: str, renditions: List[Rendition]) -> Dict[str, Dict[str, Any]]:
+    """
+    Normalize and encode one source into every rendition. Runs in a worker
+    process; returns the stored object, or the error, per rendition name.
+    """
+    measured = measure_loudness(source)
+    # Second pass applies the measured values as a single linear gain, which
+    # keeps the dynamics intact instead of compressing on the fly
+    loudnorm = (
+        f"loudnorm=I={LOUDNORM_I}:TP={LOUDNORM_TP}:LRA={LOUDNORM_LRA}"
+        f":measured_I={measured['input_i']}:measured_TP={measured['input_tp']}"
+        f":measured_LRA={measured['input_lra']}:measured_thresh={measured['input_thresh']}"
+        f":offset={measured['target_offset']}:linear=true"
+    )
+
+    results = {}
+    for rendition in renditions:
+        codec = rendition.codec
+        output = storage.temp_path(codec.extension)
+        try:
+            _run_ffmpeg(
+                [
+                    "-y", "-i", source, "-vn", "-map_metadata", "-1",
+                    "-af", loudnorm,
+                    "-ar", str(codec.sample_rate),
+                    "-c:a", codec.encoder, "-b:a", rendition.bitrate,
+                    *codec.options,
+                    output,
+                ]
+            )
+            stored = storage.import_file(output)
+            results[rendition.name] = stored._asdict()
+        except Exception as e:
+            if os.path.exists(output):
+                os.remove(output)
+            results[rendition.name] = {"error": str(e)}
+    return results
+
+
+class Transcoder:
+    """
+    Optional post-processing of completed downloads into loudness-normalized
+    renditions, e.g. a small Opus file for mobile listeners.
+
+    ffmpeg runs in a bounded process pool, so encoding never competes with
+    the event loop or the download workers. Each download's renditions are
+    tracked in the `renditions` table and claimed like download jobs, so
+    only one worker process transcodes a file, and work interrupted by a
+    crash or restart is picked up again at the next start.
+    Renditions are served by the audio routes once complete; until then
+    clients get the original file.
+    """
+
+    def __init__(self, spec: str = RENDITIONS, workers: int = TRANSCODE_WORKERS):
+        self.renditions = parse_renditions(spec)
+        self.workers = workers
+        self.worker_id: Optional[str] = None
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # (filename, rendition name) -> entry of a completed rendition
+        self._entries: Dict[Tuple[str, str], FileEntry] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.renditions)
+
+    def start(self):
+        if not self.enabled or self._executor is not None:
+            return
+
+        self.worker_id = new_claim_id()
+        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        resumed = self._resume_interrupted()
+        if resumed:
+            logger.info(f"Resuming {resumed} interrupted transcode(s)")
+        logger.info(
+            f"Transcoder started with {self.workers} worker(s) for {', '.join(self.renditions)}"
+        )
+
+    def stop(self):
+        if self._executor is None:
+            return
+        # Interrupted renditions stay `pending` and are resumed on the next start
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+        logger.info("Transcoder stopped")
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+
+    def enqueue(self, download_id: str, source_key: str, names: Optional[List[str]] = None):
+        """Claim and (re)build the renditions of a download from its stored file."""
+        if self._executor is None:
+            return
+
+        names = [name for name in names or self.renditions if name in self.renditions]
+        if not names:
+            return
+        conn = database.sync_connection()
+        try:
+            rows = conn.execute(
+                f"""
+                INSERT INTO renditions (download_id, name, status, claimed_by, updated_at)
+                VALUES {", ".join(["(?, ?, 'pending', ?, ?)"] * len(names))}
+                ON CONFLICT (download_id, name) DO UPDATE
+                SET status = 'pending', error = NULL,
+                    claimed_by = excluded.claimed_by, updated_at = excluded.updated_at
+                WHERE renditions.status != 'pending'
+                RETURNING name
+                """,
+                [
+                    value
+                    for name in names
+                    for value in (download_id, name, self.worker_id, datetime.utcnow())
+                ],
+            ).fetchall()
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+        # Renditions already pending are being built by someone else
+        claimed = [row["name"] for row in rows]
+        if claimed:
+            self._submit(download_id, source_key, claimed)
+
+    def _submit(self, download_id: str, source_key: str, names: List[str]):
+        future = self._executor.submit(
+            transcode, storage.path(source_key), [self.renditions[name] for name in names]
+        )
+        future.add_done_callback(
+            partial(self._on_done, download_id, names, time.monotonic())
+        )
+        logger.info(f"Transcoding download {download_id} to {', '.join(names)}")
+
+    def _on_done(self, download_id: str, names: List[str], submitted_at: float, future: Future):
+        if future.cancelled():
+            return
+
+        error = future.exception()
+        if error is None:
+            results = future.result()
+        else:
+            results = {name: {"error": str(error)} for name in names}
+
+        conn = database.sync_connection()
+        try:
+            # Under the write lock the evictor deletes objects with, see _evict()
+            conn.execute("BEGIN IMMEDIATE")
+            for name in names:
+                result = results.get(name, {"error": "No result"})
+                if "error" not in result and not os.path.exists(storage.path(result["key"])):
+                    result = {"error": f"Stored file {result['key']} was evicted meanwhile"}
+                if "error" in result:
+                    conn.execute(
+                        """
+                        UPDATE renditions
+                        SET status = 'error', error = ?, claimed_by = NULL, updated_at = ?
+                        WHERE download_id = ? AND name = ? AND claimed_by = ?
+                        """,
+                        (result["error"], datetime.utcnow(), download_id, name, self.worker_id),
+                    )
+                    transcode_jobs.inc("error")
+                    logger.error(f"Transcoding {download_id} to {name} failed: {result['error']}")
+                    continue
+
+                conn.execute(
+                    """
+                    UPDATE renditions
+                    SET status = 'completed', storage_path = ?, checksum = ?, size = ?,
+                        content_type = ?, error = NULL, claimed_by = NULL, updated_at = ?
+                    WHERE download_id = ? AND name = ? AND claimed_by = ?
+                    """,
+                    (
+                        result["key"],
+                        result["checksum"],
+                        result["size"],
+                        self.renditions[name].codec.content_type,
+                        datetime.utcnow(),
+                        download_id,
+                        name,
+                        self.worker_id,
+                    ),
+                )
+                transcode_jobs.inc("completed")
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Error updating renditions of {download_id}: {str(e)}")
+            return
+
+        transcode_duration.observe(time.monotonic() - submitted_at)
+        self.invalidate()
+        logger.info(f"Transcoding of download {download_id} finished")
+
+    def _resume_interrupted(self) -> int:
+        """
+        Reclaim renditions left `pending` by processes on this host that no
+        longer exist, or by any process for longer than a transcode may take.
+        """
+        conn = database.sync_connection()
+        cutoff = datetime.utcnow() - timedelta(seconds=TRANSCODE_TIMEOUT)
+        rows = conn.execute(
+            """
+            SELECT r.download_id, r.name, r.claimed_by, r.updated_at, d.storage_path
+            FROM renditions r JOIN downloads d ON d.id = r.download_id
+            WHERE r.status = 'pending' AND d.status = 'completed'
+            AND d.storage_path IS NOT NULL
+            """
+        ).fetchall()
+
+        pending: Dict[Tuple[str, str], List[str]] = {}
+        for row in rows:
+            if row["name"] not in self.renditions:
+                continue
+            stale = row["updated_at"] is None or datetime.fromisoformat(row["updated_at"]) < cutoff
+            if not stale and not is_orphaned_claim(row["claimed_by"]):
+                continue
+            claimed = conn.execute(
+                """
+                UPDATE renditions SET claimed_by = ?, updated_at = ?
+                WHERE download_id = ? AND name = ? AND status = 'pending'
+                AND claimed_by IS ?
+                RETURNING name
+                """,
+                (
+                    self.worker_id,
+                    datetime.utcnow(),
+                    row["download_id"],
+                    row["name"],
+                    row["claimed_by"],
+                ),
+            ).fetchall()
+            conn.commit()
+            if claimed:
+                pending.setdefault((row["download_id"], row["storage_path"]), []).append(row["name"])
+
+        for (download_id, source_key), names in pending.items():
+            self._submit(download_id, source_key, names)
+        return sum(len(names) for names in pending.values())
+
+    async def get(self, filename: str, name: str) -> Optional[FileEntry]:
+        """
+        The completed rendition of a file, or None. A download without any
+        record of the rendition, e.g. one finished before it was configured,
+        is queued for transcoding.
+        """
+        entry = self._entries.get((filename, name))
+        if entry is not None:
+            return entry
+        # The lookup, enqueue and stat block; keep them off the event loop
+        return await asyncio.to_thread(self._lookup, filename, name)
+
+    def _lookup(self, filename: str, name: str) -> Optional[FileEntry]:
+        row = (
+            database.sync_connection()
+            .execute(
+                """
+                SELECT d.id, d.storage_path AS source, r.status, r.storage_path, r.size
+                FROM downloads d
+                LEFT JOIN renditions r ON r.download_id = d.id AND r.name = ?
+                WHERE d.filename = ? AND d.status = 'completed'
+                AND d.storage_path IS NOT NULL
+                LIMIT 1
+                """,
+                (name, filename),
+            )
+            .fetchone()
+        )
+        if row is None:
+            return None
+        if row["status"] is None:
+            self.enqueue(row["id"], row["source"], [name])
+            return None
+        if row["status"] != "completed":
+            return None
+
+        path = storage.path(row["storage_path"])
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        if stat.st_size != row["size"]:
+            logger.error(f"Not serving {name} of {filename}: size differs from the recorded one")
+            return None
+
+        extension = self.renditions[name].codec.extension
+        entry = build_entry(os.path.splitext(filename)[0] + extension, path, stat)
+        with self._lock:
+            self._entries[(filename, name)] = entry
+        return entry
+
+
+transcoder = Transcoder()
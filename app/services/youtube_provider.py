@@ -0,0 +1,67 @@
+import importlib
+import os
+from typing import Any, Iterable
+
+from ..utils.youtube import is_channel_url
+
+# "pytubefix", or "module:attribute" of a YouTubeProvider class or instance
+YOUTUBE_PROVIDER = os.getenv("YOUTUBE_PROVIDER", "pytubefix")
+
+
+class YouTubeProvider:
+    """
+    Source of video metadata and audio streams.
+
+    `video(url)` returns an object shaped like pytubefix's `YouTube` (title,
+    author, length and `streams`), `stream(url)` yields the bytes of a stream
+    URL taken from it, and `collection(url)` yields the video URLs of a
+    playlist or channel, fetching further pages only as they are consumed.
+    All are blocking and called from worker threads or processes. Other providers stand in for YouTube, e.g. the offline one
+    the benchmarks use.
+    """
+
+    def video(self, url: str) -> Any:
+        raise NotImplementedError
+
+    def stream(self, url: str) -> Iterable[bytes]:
+        raise NotImplementedError
+
+    def collection(self, url: str) -> Iterable[str]:
+        raise NotImplementedError
+
+
+class PytubefixProvider(YouTubeProvider):
+    # pytubefix pulls in aiohttp and friends; imported on first use to keep
+    # it off the startup path
+
+    def video(self, url: str) -> Any:
+        from pytubefix import YouTube
+
+        return YouTube(url)
+
+    def stream(self, url: str) -> Iterable[bytes]:
+        from pytubefix import request
+
+        return request.stream(url)
+
+    def collection(self, url: str) -> Iterable[str]:
+        from pytubefix import Channel, Playlist
+
+        source = Channel(url) if is_channel_url(url) else Playlist(url)
+        # video_urls is paged lazily through YouTube's continuation API
+        return iter(source.video_urls)
+
+
+def load_provider(spec: str) -> YouTubeProvider:
+    if spec == "pytubefix":
+        return PytubefixProvider()
+
+    module_name, _, attribute = spec.partition(":")
+    if not attribute:
+        raise ValueError(f"Invalid YouTube provider: {spec}")
+    provider = getattr(importlib.import_module(module_name), attribute)
+    # Read from the environment, so worker processes build the same provider
+    return provider() if isinstance(provider, type) else provider
+
+
+youtube_provider = load_provider(YOUTUBE_PROVIDER)
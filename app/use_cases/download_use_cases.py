@@ -1,74 +1,372 @@
-from typing import Dict, Any, List
+import asyncio
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, Any, List, Optional
+import json
+import os
 import uuid
-from pytubefix import YouTube
-from fastapi import HTTPException, BackgroundTasks
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
 
+from ..models.download import FileInfo
 from ..services.downloader_service import DownloadService
-from ..services.downloader import download_audio
+from ..services.feed_service import feed_cache
+from ..services.file_index import file_index
+from ..services.progress import progress_registry
+from ..services.download_scheduler import download_scheduler
+from ..services.playlist_service import (
+    BATCH_MAX_VIDEOS,
+    expand_collection,
+    is_collection_url,
+)
+from ..utils.pagination import decode_cursor, encode_cursor
 from ..utils.youtube import extract_video_id
+from ..core.events import Subscription, event_bus
 from ..core.logger import get_logger
 
+STATUS_STREAM_HEARTBEAT = float(os.getenv("STATUS_STREAM_HEARTBEAT", "15"))
+
 logger = get_logger("use_cases.downloads")
 
+TERMINAL_STATUSES = ("completed", "error")
+
 
 class DownloadUseCases:
     def __init__(self):
         self.download_service = DownloadService()
 
-    async def create_download(
-        self, url: str, background_tasks: BackgroundTasks
-    ) -> Dict[str, Any]:
-        logger.info(f"Received download request for URL: {url}")
+    async def create_download(self, url: str) -> Dict[str, Any]:
+        logger.info("Received download request for URL: {}", url)
 
         download_id = str(uuid.uuid4())
         video_id = extract_video_id(str(url))
 
         if not video_id:
-            logger.error(f"Invalid YouTube URL provided: {url}")
+            logger.error("Invalid YouTube URL provided: {}", url)
             raise HTTPException(status_code=400, detail="Invalid YouTube URL")
 
         try:
-            yt = YouTube(str(url))
-            video_name = yt.title
-            logger.info(
-                f"Initialized download for video: {video_name} (ID: {video_id})"
-            )
-
             safe_filename = f"{video_id}.m4a"
 
-            result = self.download_service.create_download(
-                download_id, url, video_id, video_name, safe_filename
+            # The title is filled in by the metadata workers, so the client
+            # gets its id without waiting on a YouTube round trip
+            result = await self.download_service.create_download(
+                download_id, url, video_id, None, safe_filename
             )
+            if result is None:
+                return await self._attach_to_existing(video_id)
 
-            background_tasks.add_task(
-                download_audio, str(url), download_id, safe_filename
-            )
-            logger.info(f"Download task queued with ID: {download_id}")
+            download_scheduler.resolve_metadata(download_id, str(url), video_id)
+            download_scheduler.notify()
+            event_bus.publish({"download_id": download_id, "status": "pending"})
+            logger.info("Download job queued with ID: {} (video: {})", download_id, video_id)
 
             return result
 
         except Exception as e:
-            logger.error(f"Error initializing download: {str(e)}", exc_info=True)
+            logger.error("Error initializing download: {}", e, exc_info=True)
             raise HTTPException(
                 status_code=400, detail=f"Error initializing download: {str(e)}"
             )
 
+    async def _attach_to_existing(self, video_id: str) -> Dict[str, Any]:
+        existing = await self.download_service.get_download_by_video_id(video_id)
+        result = {
+            "id": existing["id"],
+            "url": existing["url"],
+            "video_id": existing["video_id"],
+            "status": existing["status"],
+        }
+
+        # Re-stat rather than trust the index: a stale hit would hide a lost file
+        file_entry = await file_index.reload(existing["filename"])
+        if existing["status"] == "completed" and file_entry is not None:
+            logger.info("Video already downloaded: {} (ID: {})", video_id, existing["id"])
+        elif existing["status"] in ("completed", "error", "evicted"):
+            # Failed before, or the file is gone: run the same job again
+            if await self.download_service.requeue_download(existing["id"]):
+                if existing["status"] == "completed":
+                    feed_cache.invalidate()
+                download_scheduler.notify()
+                event_bus.publish({"download_id": existing["id"], "status": "pending"})
+            result["status"] = "pending"
+            logger.info("Requeued download for video: {} (ID: {})", video_id, existing["id"])
+        else:
+            logger.info(
+                "Attached to in-flight download for video: {} (ID: {})", video_id, existing["id"]
+            )
+
+        return result
+
+    async def create_batch(
+        self, urls: List[str], playlist_url: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Queue many videos at once, from explicit URLs and/or a playlist or
+        channel URL. Videos are deduped and inserted in one transaction.
+        """
+        logger.info(
+            "Received batch download request: {} URL(s), playlist: {}", len(urls), playlist_url
+        )
+
+        video_urls: List[str] = []
+        collections: List[str] = [playlist_url] if playlist_url else []
+        rejected: List[str] = []
+        for url in urls:
+            if extract_video_id(url):
+                video_urls.append(url)
+            elif is_collection_url(url):
+                collections.append(url)
+            else:
+                rejected.append(url)
+
+        if len(video_urls) > BATCH_MAX_VIDEOS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"A batch is limited to {BATCH_MAX_VIDEOS} videos",
+            )
+
+        for collection in collections:
+            remaining = BATCH_MAX_VIDEOS - len(video_urls)
+            if remaining <= 0:
+                logger.warning("Batch limit reached, skipping {}", collection)
+                break
+            try:
+                video_urls.extend(
+                    await asyncio.to_thread(expand_collection, collection, remaining)
+                )
+            except Exception as e:
+                logger.error("Error expanding {}: {}", collection, e, exc_info=True)
+                raise HTTPException(
+                    status_code=400, detail=f"Error expanding playlist: {str(e)}"
+                )
+
+        # One job per video, first URL wins
+        jobs: Dict[str, Dict[str, Any]] = {}
+        for url in video_urls:
+            video_id = extract_video_id(url)
+            if not video_id:
+                rejected.append(url)
+            elif video_id not in jobs:
+                jobs[video_id] = {
+                    "id": str(uuid.uuid4()),
+                    "url": url,
+                    "video_id": video_id,
+                    "filename": f"{video_id}.m4a",
+                }
+
+        if not jobs:
+            raise HTTPException(status_code=400, detail="No valid YouTube videos in batch")
+
+        batch_id = str(uuid.uuid4())
+        try:
+            rows = await self.download_service.create_batch(
+                batch_id, playlist_url, list(jobs.values())
+            )
+        except Exception as e:
+            logger.error("Error creating batch: {}", e, exc_info=True)
+            raise HTTPException(status_code=500, detail="Error creating batch")
+
+        queued = 0
+        for row in rows:
+            if row["created"]:
+                download_scheduler.resolve_metadata(row["id"], row["url"], row["video_id"])
+            elif (
+                row["status"] in ("completed", "evicted")
+                and await file_index.reload(row["filename"]) is None
+                and await self.download_service.requeue_download(row["id"])
+            ):
+                # Completed before, but the file is gone
+                row["requeued"] = True
+                feed_cache.invalidate()
+
+            if row["created"] or row["requeued"]:
+                event_bus.publish({"download_id": row["id"], "status": "pending"})
+                queued += 1
+
+        if queued:
+            download_scheduler.notify()
+        logger.info("Batch {} created with {} video(s), {} queued", batch_id, len(rows), queued)
+
+        result = await self.get_batch(batch_id)
+        result["rejected"] = rejected
+        return result
+
+    async def get_batch(self, batch_id: str) -> Dict[str, Any]:
+        batch = await self.download_service.get_batch(batch_id)
+        if batch is None:
+            logger.warning("Batch ID not found: {}", batch_id)
+            raise HTTPException(status_code=404, detail="Batch not found")
+
+        counts = {status: 0 for status in ("pending", "downloading", "completed", "error")}
+        done = 0.0
+        for item in batch["downloads"]:
+            counts[item["status"]] = counts.get(item["status"], 0) + 1
+            live = progress_registry.get(item["id"])
+            item["progress"] = live["progress"] if live else None
+
+            if item["status"] == "completed":
+                done += 1
+            elif item["progress"] and item["progress"]["total_bytes"]:
+                done += min(
+                    item["progress"]["bytes_downloaded"] / item["progress"]["total_bytes"], 1.0
+                )
+
+        total = len(batch["downloads"])
+        batch["progress"] = {
+            "total": total,
+            **counts,
+            "percent": round(100 * done / total, 1) if total else 0.0,
+        }
+        return batch
+
     async def get_download_status(self, download_id: str) -> Dict[str, Any]:
-        logger.debug(f"Checking status for download ID: {download_id}")
+        logger.debug("Checking status for download ID: {}", download_id)
+
+        # Running downloads are answered from memory, with live progress
+        result = progress_registry.get(download_id)
+        if result is not None:
+            return result
 
-        result = self.download_service.get_download_status(download_id)
+        result = await self.download_service.get_download_status(download_id)
         if not result:
-            logger.warning(f"Download ID not found: {download_id}")
+            logger.warning("Download ID not found: {}", download_id)
             raise HTTPException(status_code=404, detail="Download not found")
 
         return result
 
-    async def list_files(self) -> List[Dict[str, Any]]:
+    async def subscribe_status(
+        self, download_id: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """
+        Server-Sent Events stream of state transitions and progress, for one
+        download or, without download_id, for all of them.
+        """
+        snapshot = None
+        if download_id is not None:
+            # Raises 404 for unknown ids before the stream starts
+            snapshot = await self.get_download_status(download_id)
+
+        subscription = event_bus.subscribe(download_id)
+        if subscription is None:
+            logger.warning("Status stream subscriber limit reached")
+            raise HTTPException(status_code=503, detail="Too many status subscribers")
+
+        return self._status_events(subscription, snapshot)
+
+    async def _status_events(
+        self, subscription: Subscription, snapshot: Optional[Dict[str, Any]]
+    ) -> AsyncIterator[str]:
+        try:
+            if snapshot is not None:
+                # Current state first, so late subscribers miss nothing
+                yield _format_event("status", {"download_id": snapshot["id"], **snapshot})
+                if snapshot["status"] in TERMINAL_STATUSES:
+                    return
+
+            while True:
+                events = await subscription.get(timeout=STATUS_STREAM_HEARTBEAT)
+                if not events and subscription.download_id is not None:
+                    # The download may be running in another worker process,
+                    # whose events never reach this one
+                    status = await self.download_service.get_download_status(
+                        subscription.download_id
+                    )
+                    if status is not None and status["status"] in TERMINAL_STATUSES:
+                        yield _format_event("status", {"download_id": status["id"], **status})
+                        return
+
+                if not events:
+                    # Keeps proxies from closing idle streams, and surfaces
+                    # client disconnects
+                    yield ": keepalive\n\n"
+                    continue
+
+                for event in events:
+                    yield _format_event(
+                        "progress" if "progress" in event else "status", event
+                    )
+
+                # A single-download stream ends with the download
+                if subscription.download_id is not None and any(
+                    event["status"] in TERMINAL_STATUSES for event in events
+                ):
+                    return
+        finally:
+            event_bus.unsubscribe(subscription)
+
+    async def list_files(
+        self,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        status: str = "completed",
+        completed_after: Optional[datetime] = None,
+        completed_before: Optional[datetime] = None,
+        video_id: Optional[str] = None,
+        fields: Optional[str] = None,
+    ) -> Dict[str, Any]:
         logger.info("Retrieving list of downloaded files")
+
+        after = None
+        if cursor is not None:
+            after = decode_cursor(cursor, 2)
+            # (sort key timestamp, id), both strings
+            if after is None or not all(isinstance(value, str) for value in after):
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+
+        projection = None
+        if fields:
+            projection = [field.strip() for field in fields.split(",") if field.strip()]
+            unknown = set(projection) - set(FileInfo.model_fields)
+            if unknown:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Unknown fields: {', '.join(sorted(unknown))}",
+                )
+
         try:
-            files = self.download_service.get_completed_downloads()
-            logger.info(f"Found {len(files)} downloaded files")
-            return files
+            # One extra row tells us whether there is a next page
+            rows = await self.download_service.get_downloads_page(
+                status,
+                limit + 1,
+                cursor=tuple(after) if after else None,
+                completed_after=_to_naive_utc(completed_after),
+                completed_before=_to_naive_utc(completed_before),
+                video_id=video_id,
+            )
         except Exception as e:
-            logger.error(f"Error retrieving file list: {str(e)}", exc_info=True)
+            logger.error("Error retrieving file list: {}", e, exc_info=True)
             raise HTTPException(status_code=500, detail="Error retrieving file list")
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]["sort_key"], rows[-1]["id"])
+
+        files = []
+        for row in rows:
+            entry = file_index.get(row["filename"]) if row["filename"] else None
+            # A completed download whose file is gone is not listed
+            if entry is None and row["status"] == "completed":
+                continue
+
+            row.pop("sort_key")
+            row["filepath"] = entry.path if entry else None
+            row["size"] = entry.size if entry else None
+            if projection is not None:
+                row = {field: row[field] for field in projection}
+            files.append(row)
+
+        logger.info("Found {} downloaded files", len(files))
+        return {"data": files, "next_cursor": next_cursor, "limit": limit}
+
+
+def _format_event(name: str, data: Dict[str, Any]) -> str:
+    payload = json.dumps(jsonable_encoder(data), separators=(",", ":"))
+    return f"event: {name}\ndata: {payload}\n\n"
+
+
+def _to_naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    # Timestamps are stored as naive UTC
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
@@ -0,0 +1,342 @@
+import os
+import struct
+from typing import BinaryIO, Iterator, NamedTuple, Optional, Tuple
+
+
+class AudioHeaders(NamedTuple):
+    codec: str
+    duration: float  # seconds
+    bitrate: int  # bits per second, averaged over the audio payload
+    sample_rate: int
+    channels: int
+    # Byte range of the audio payload, for estimating seek offsets
+    data_offset: int
+    data_size: int
+
+
+def parse_headers(path: str) -> Optional[AudioHeaders]:
+    """
+    Duration, codec and bitrate from the container headers alone, reading a
+    few kilobytes at most. None if the format is not recognized.
+    """
+    parsers = {
+        ".m4a": _parse_mp4,
+        ".mp3": _parse_mp3,
+        ".wav": _parse_wav,
+        ".flac": _parse_flac,
+        ".ogg": _parse_ogg,
+        ".opus": _parse_ogg,
+    }
+    parser = parsers.get(os.path.splitext(path)[1].lower())
+    if parser is None:
+        return None
+    with open(path, "rb") as f:
+        try:
+            return parser(f, os.fstat(f.fileno()).st_size)
+        except (struct.error, ValueError, IndexError, TypeError, ZeroDivisionError):
+            return None
+
+
+def _bitrate(size: int, duration: float) -> int:
+    return round(size * 8 / duration) if duration > 0 else 0
+
+
+# MP4 / M4A
+
+
+def _boxes(f: BinaryIO, start: int, end: int) -> Iterator[Tuple[bytes, int, int]]:
+    """(type, payload start, box end) of the boxes between start and end."""
+    position = start
+    while position + 8 <= end:
+        f.seek(position)
+        size, kind = struct.unpack(">I4s", f.read(8))
+        header_size = 8
+        if size == 1:
+            size = struct.unpack(">Q", f.read(8))[0]
+            header_size = 16
+        elif size == 0:
+            size = end - position
+        if size < header_size:
+            return
+        yield kind, position + header_size, position + size
+        position += size
+
+
+def _find(f: BinaryIO, start: int, end: int, *path: bytes) -> Optional[Tuple[int, int]]:
+    for kind, payload, box_end in _boxes(f, start, end):
+        if kind == path[0]:
+            return (payload, box_end) if len(path) == 1 else _find(f, payload, box_end, *path[1:])
+    return None
+
+
+def _descriptor(data: bytes, position: int) -> Tuple[int, int, int]:
+    """Tag, payload start and payload length of an MPEG-4 descriptor."""
+    tag = data[position]
+    length = 0
+    position += 1
+    for _ in range(4):
+        byte = data[position]
+        position += 1
+        length = (length << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            break
+    return tag, position, length
+
+
+def _parse_esds(data: bytes) -> Tuple[Optional[str], int]:
+    """Codec and average bitrate from an `esds` box payload."""
+    tag, position, _ = _descriptor(data, 4)
+    if tag != 0x03:
+        return None, 0
+    flags = data[position + 2]
+    position += 3
+    if flags & 0x80:
+        position += 2
+    if flags & 0x40:
+        position += 1 + data[position]
+    if flags & 0x20:
+        position += 2
+
+    tag, position, _ = _descriptor(data, position)
+    if tag != 0x04:
+        return None, 0
+    object_type = data[position]
+    avg_bitrate = struct.unpack(">I", data[position + 9:position + 13])[0]
+    codec = {0x40: "aac", 0x66: "aac", 0x67: "aac", 0x68: "aac", 0x69: "mp3", 0x6B: "mp3"}.get(
+        object_type, f"mp4a.{object_type:02x}"
+    )
+
+    # AudioSpecificConfig names the AAC profile, e.g. mp4a.40.2 for AAC-LC
+    tag, specific, _ = _descriptor(data, position + 13)
+    if codec == "aac" and tag == 0x05:
+        codec = f"mp4a.40.{data[specific] >> 3}"
+    return codec, avg_bitrate
+
+
+def _parse_mp4(f: BinaryIO, size: int) -> Optional[AudioHeaders]:
+    moov = _find(f, 0, size, b"moov")
+    mdat = _find(f, 0, size, b"mdat")
+    if moov is None:
+        return None
+
+    mvhd = _find(f, *moov, b"mvhd")
+    f.seek(mvhd[0])
+    version = f.read(4)[0]
+    if version == 1:
+        f.seek(16, os.SEEK_CUR)
+        timescale, duration = struct.unpack(">IQ", f.read(12))
+    else:
+        f.seek(8, os.SEEK_CUR)
+        timescale, duration = struct.unpack(">II", f.read(8))
+    seconds = duration / timescale
+
+    codec, bitrate, sample_rate, channels = "unknown", 0, 0, 0
+    for kind, payload, end in _boxes(f, *moov):
+        if kind != b"trak":
+            continue
+        hdlr = _find(f, payload, end, b"mdia", b"hdlr")
+        f.seek(hdlr[0] + 8)
+        if f.read(4) != b"soun":
+            continue
+
+        stsd = _find(f, payload, end, b"mdia", b"minf", b"stbl", b"stsd")
+        # First sample entry: size, format, then the audio sample entry fields
+        f.seek(stsd[0] + 8)
+        entry_size, entry_format = struct.unpack(">I4s", f.read(8))
+        entry = f.read(entry_size - 8)
+        channels, _, _, rate = struct.unpack(">HHII", entry[16:28])
+        sample_rate = rate >> 16
+        codec = entry_format.decode("latin-1").strip().lower()
+        if entry_format == b"mp4a":
+            for child, child_payload, child_end in _boxes(
+                f, stsd[0] + 8 + 36, stsd[0] + 8 + entry_size
+            ):
+                if child == b"esds":
+                    f.seek(child_payload)
+                    codec, bitrate = _parse_esds(f.read(child_end - child_payload))
+                    codec = codec or "mp4a"
+        break
+
+    data_offset, data_size = (mdat[0], mdat[1] - mdat[0]) if mdat else (0, size)
+    return AudioHeaders(
+        codec=codec,
+        duration=seconds,
+        bitrate=bitrate or _bitrate(data_size, seconds),
+        sample_rate=sample_rate,
+        channels=channels,
+        data_offset=data_offset,
+        data_size=data_size,
+    )
+
+
+# MP3
+
+_MP3_BITRATES = {
+    # (MPEG-1?, layer) -> kbit/s by bitrate index
+    (True, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (True, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (True, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (False, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (False, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (False, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+# Version bits -> sample rates by index; 0 is MPEG-2.5, 2 MPEG-2, 3 MPEG-1
+_MP3_SAMPLE_RATES = {0: (11025, 12000, 8000), 2: (22050, 24000, 16000), 3: (44100, 48000, 32000)}
+
+
+def _parse_mp3(f: BinaryIO, size: int) -> Optional[AudioHeaders]:
+    head = f.read(10)
+    offset = 0
+    if head[:3] == b"ID3":
+        tag_size = 0
+        for byte in head[6:10]:
+            tag_size = (tag_size << 7) | (byte & 0x7F)
+        offset = 10 + tag_size + (10 if head[5] & 0x10 else 0)
+
+    f.seek(max(size - 128, 0))
+    end = size - 128 if f.read(3) == b"TAG" else size
+
+    f.seek(offset)
+    data = f.read(64 * 1024)
+    for position in range(len(data) - 4):
+        if data[position] != 0xFF or data[position + 1] & 0xE0 != 0xE0:
+            continue
+        b1, b2, b3 = data[position + 1], data[position + 2], data[position + 3]
+        version, layer_bits = (b1 >> 3) & 3, (b1 >> 1) & 3
+        bitrate_index, rate_index = b2 >> 4, (b2 >> 2) & 3
+        if version == 1 or layer_bits == 0 or bitrate_index in (0, 15) or rate_index == 3:
+            continue
+        break
+    else:
+        return None
+
+    mpeg1 = version == 3
+    layer = 4 - layer_bits
+    bitrate = _MP3_BITRATES[(mpeg1, layer)][bitrate_index] * 1000
+    sample_rate = _MP3_SAMPLE_RATES[version][rate_index]
+    channels = 1 if b3 >> 6 == 3 else 2
+    samples_per_frame = 384 if layer == 1 else 1152 if mpeg1 or layer == 2 else 576
+    data_offset = offset + position
+    data_size = end - data_offset
+
+    # A Xing/Info or VBRI header in the first frame counts the frames of
+    # VBR files; without one the stream is taken as constant bitrate
+    side_info = (32 if channels == 2 else 17) if mpeg1 else (17 if channels == 2 else 9)
+    frames = None
+    xing = position + 4 + side_info
+    if data[xing:xing + 4] in (b"Xing", b"Info"):
+        flags = struct.unpack(">I", data[xing + 4:xing + 8])[0]
+        if flags & 1:
+            frames = struct.unpack(">I", data[xing + 8:xing + 12])[0]
+    elif data[position + 36:position + 40] == b"VBRI":
+        frames = struct.unpack(">I", data[position + 50:position + 54])[0]
+
+    if frames:
+        duration = frames * samples_per_frame / sample_rate
+        bitrate = _bitrate(data_size, duration)
+    else:
+        duration = data_size * 8 / bitrate
+
+    codec = {1: "mp1", 2: "mp2", 3: "mp3"}[layer]
+    return AudioHeaders(codec, duration, bitrate, sample_rate, channels, data_offset, data_size)
+
+
+# WAV
+
+
+def _parse_wav(f: BinaryIO, size: int) -> Optional[AudioHeaders]:
+    riff, _, wave = struct.unpack("<4sI4s", f.read(12))
+    if riff != b"RIFF" or wave != b"WAVE":
+        return None
+
+    fmt = None
+    position = 12
+    while position + 8 <= size:
+        f.seek(position)
+        chunk, chunk_size = struct.unpack("<4sI", f.read(8))
+        if chunk == b"fmt ":
+            fmt = struct.unpack("<HHIIHH", f.read(16))
+        elif chunk == b"data" and fmt is not None:
+            audio_format, channels, sample_rate, byte_rate, _, bits = fmt
+            data_size = min(chunk_size, size - position - 8)
+            if audio_format == 3:
+                codec = f"pcm_f{bits}le"
+            elif bits == 8:
+                codec = "pcm_u8"
+            elif audio_format in (1, 0xFFFE):
+                codec = f"pcm_s{bits}le"
+            else:
+                codec = f"wav_{audio_format:#06x}"
+            return AudioHeaders(
+                codec=codec,
+                duration=data_size / byte_rate,
+                bitrate=byte_rate * 8,
+                sample_rate=sample_rate,
+                channels=channels,
+                data_offset=position + 8,
+                data_size=data_size,
+            )
+        # Chunks are padded to an even size
+        position += 8 + chunk_size + (chunk_size & 1)
+    return None
+
+
+# FLAC
+
+
+def _parse_flac(f: BinaryIO, size: int) -> Optional[AudioHeaders]:
+    if f.read(4) != b"fLaC":
+        return None
+
+    streaminfo = None
+    while True:
+        block_type, length = struct.unpack(">B3s", f.read(4))
+        length = int.from_bytes(length, "big")
+        block = f.read(length)
+        if block_type & 0x7F == 0:
+            streaminfo = block
+        if block_type & 0x80:
+            break
+
+    fields = int.from_bytes(streaminfo[10:18], "big")
+    sample_rate = fields >> 44
+    channels = ((fields >> 41) & 0x7) + 1
+    total_samples = fields & ((1 << 36) - 1)
+    duration = total_samples / sample_rate
+    data_offset = f.tell()
+    data_size = size - data_offset
+    return AudioHeaders(
+        "flac", duration, _bitrate(data_size, duration), sample_rate, channels, data_offset, data_size
+    )
+
+
+# Ogg (Opus, Vorbis)
+
+
+def _parse_ogg(f: BinaryIO, size: int) -> Optional[AudioHeaders]:
+    page = f.read(27 + 255)
+    if page[:4] != b"OggS":
+        return None
+    segments = page[26]
+    f.seek(27 + segments)
+    packet = f.read(30)
+
+    if packet.startswith(b"OpusHead"):
+        codec, channels, pre_skip = "opus", packet[9], struct.unpack("<H", packet[10:12])[0]
+        # Opus always decodes at 48 kHz, granule positions count 48 kHz samples
+        sample_rate = granule_rate = 48000
+    elif packet.startswith(b"\x01vorbis"):
+        codec, channels, pre_skip = "vorbis", packet[11], 0
+        sample_rate = granule_rate = struct.unpack("<I", packet[12:16])[0]
+    else:
+        return None
+
+    # The last page's granule position is the stream length in samples
+    f.seek(max(size - 64 * 1024, 0))
+    tail = f.read()
+    last = tail.rfind(b"OggS")
+    if last < 0:
+        return None
+    granule = struct.unpack("<q", tail[last + 6:last + 14])[0]
+    duration = max(granule - pre_skip, 0) / granule_rate
+    return AudioHeaders(codec, duration, _bitrate(size, duration), sample_rate, channels, 0, size)
@@ -0,0 +1,28 @@
+import os
+import socket
+import uuid
+
+
+def new_claim_id() -> str:
+    """Identifies the process holding a claim, e.g. "host:1234:3fa9c2e1"."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def _process_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        # Our own pid on a claim that is not ours: a previous process reused it
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def is_orphaned_claim(claimed_by: str) -> bool:
+    """True if the claim belongs to a process on this host that no longer exists."""
+    host, _, pid = (claimed_by or "").partition(":")
+    pid = pid.partition(":")[0]
+    return host == socket.gethostname() and pid.isdigit() and not _process_alive(int(pid))
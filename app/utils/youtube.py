@@ -29,3 +29,31 @@ def extract_video_id(url: str) -> str:
             return query["v"][0]
 
     return None
+
+
+def extract_playlist_id(url: str) -> str:
+    """
+    Extract the playlist ID (the `list` query parameter) from a YouTube URL.
+    Returns None if the URL does not reference a playlist.
+    """
+    parsed_url = urlparse(url)
+    if parsed_url.hostname not in ["www.youtube.com", "youtube.com", "m.youtube.com"]:
+        return None
+
+    query = parse_qs(parsed_url.query)
+    if "list" in query:
+        return query["list"][0]
+
+    return None
+
+
+def is_channel_url(url: str) -> bool:
+    """
+    Check whether a URL points to a YouTube channel (/@handle, /channel/,
+    /c/ or /user/ pages).
+    """
+    parsed_url = urlparse(url)
+    if parsed_url.hostname not in ["www.youtube.com", "youtube.com", "m.youtube.com"]:
+        return False
+
+    return re.match(r"^/(@[^/]+|channel/[^/]+|c/[^/]+|user/[^/]+)", parsed_url.path) is not None
@@ -0,0 +1,76 @@
+"""
+Throughput of the database-bound read endpoints under concurrent load.
+
+    python -m benchmarks.bench_db [--requests 2000] [--concurrency 50]
+"""
+import argparse
+import asyncio
+import json
+import sqlite3
+import uuid
+from datetime import datetime
+
+from .common import asgi_request, lifespan, run_load, use_temp_environment
+
+
+def seed(database_path: str, rows: int):
+    conn = sqlite3.connect(database_path)
+    try:
+        conn.executemany(
+            """
+            INSERT INTO downloads (id, url, video_id, videoname, status, filename, created_at, completed_at)
+            VALUES (?, ?, ?, ?, 'completed', ?, ?, ?)
+            """,
+            [
+                (
+                    str(uuid.uuid4()),
+                    f"https://www.youtube.com/watch?v=video{i:06d}",
+                    f"video{i:06d}",
+                    f"Episode {i}",
+                    f"video{i:06d}.m4a",
+                    datetime.utcnow(),
+                    datetime.utcnow(),
+                )
+                for i in range(rows)
+            ],
+        )
+        conn.executemany(
+            "INSERT INTO file_access (filename, access_count) VALUES (?, ?)",
+            [(f"video{i:06d}.m4a", i % 97) for i in range(rows)],
+        )
+        conn.commit()
+        return [r[0] for r in conn.execute("SELECT id FROM downloads LIMIT 100")]
+    finally:
+        conn.close()
+
+
+async def main(requests: int, concurrency: int, rows: int):
+    import os
+
+    from app.main import app
+
+    async with lifespan(app):
+        ids = seed(os.environ["DATABASE_PATH"], rows)
+
+        async def status(i: int):
+            await asgi_request(app, "GET", f"/api/status/{ids[i % len(ids)]}")
+
+        async def stats(i: int):
+            await asgi_request(app, "GET", "/audio/stats", f"skip={i % 50}&limit=10")
+
+        results = {
+            "GET /api/status/{id}": await run_load(status, requests, concurrency),
+            "GET /audio/stats": await run_load(stats, requests, concurrency),
+        }
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--rows", type=int, default=1000)
+    args = parser.parse_args()
+
+    use_temp_environment()
+    asyncio.run(main(args.requests, args.concurrency, args.rows))
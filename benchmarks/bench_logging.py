@@ -0,0 +1,104 @@
+"""
+Request throughput with DEBUG file logging on and off, for the synchronous
+sinks and the background log writer.
+
+Logging is configured at import time, so every configuration runs in its own
+interpreter with console logging disabled.
+
+    python -m benchmarks.bench_logging [--requests 5000] [--concurrency 50]
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from .bench_db import seed
+from .common import asgi_request, lifespan, run_load, use_temp_environment
+
+CONFIGURATIONS = {
+    "sync, file DEBUG": {"LOG_ASYNC": "false", "LOG_FILE_LEVEL": "DEBUG"},
+    "sync, file INFO": {"LOG_ASYNC": "false", "LOG_FILE_LEVEL": "INFO"},
+    "sync, file off": {"LOG_ASYNC": "false", "LOG_FILE_LEVEL": "OFF"},
+    "async, file DEBUG": {"LOG_ASYNC": "true", "LOG_FILE_LEVEL": "DEBUG"},
+    "async, file INFO": {"LOG_ASYNC": "true", "LOG_FILE_LEVEL": "INFO"},
+    "async, file DEBUG, JSON": {
+        "LOG_ASYNC": "true",
+        "LOG_FILE_LEVEL": "DEBUG",
+        "LOG_JSON": "true",
+    },
+}
+
+
+async def measure(requests: int, concurrency: int):
+    from app.main import app
+    from app.core.logger import log_messages_dropped
+
+    async with lifespan(app):
+        ids = seed(os.environ["DATABASE_PATH"], 1000)
+
+        # Both endpoints log on every request, status at DEBUG, files at INFO
+        async def status(i: int):
+            await asgi_request(app, "GET", f"/api/status/{ids[i % len(ids)]}")
+
+        async def files(i: int):
+            await asgi_request(app, "GET", "/api/files", "limit=20")
+
+        results = {
+            "GET /api/status/{id}": await run_load(status, requests, concurrency),
+            "GET /api/files": await run_load(files, requests, concurrency),
+        }
+
+    results["log_messages_dropped"] = log_messages_dropped.value()
+    return results
+
+
+def run_configuration(env: dict, requests: int, concurrency: int) -> dict:
+    with tempfile.NamedTemporaryFile(suffix=".json") as output:
+        subprocess.run(
+            [
+                sys.executable,
+                "-m",
+                "benchmarks.bench_logging",
+                "--requests",
+                str(requests),
+                "--concurrency",
+                str(concurrency),
+                "--output",
+                output.name,
+            ],
+            env={**os.environ, **env},
+            check=True,
+            stdout=subprocess.DEVNULL,
+        )
+        with open(output.name) as f:
+            return json.load(f)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.output:
+        # Child run for one configuration
+        workdir = use_temp_environment()
+        os.environ["LOG_DIR"] = os.path.join(workdir, "logs")
+        os.environ["LOG_CONSOLE_LEVEL"] = "OFF"
+        results = asyncio.run(measure(args.requests, args.concurrency))
+        with open(args.output, "w") as f:
+            json.dump(results, f)
+    else:
+        print(
+            json.dumps(
+                {
+                    name: run_configuration(env, args.requests, args.concurrency)
+                    for name, env in CONFIGURATIONS.items()
+                },
+                indent=2,
+            )
+        )
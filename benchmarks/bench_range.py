@@ -0,0 +1,81 @@
+"""
+Cost of serving audio: full downloads, conditional re-polls and range seeks.
+
+    python -m benchmarks.bench_range [--size-mb 64] [--requests 500] [--concurrency 20]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+
+from .common import asgi_request, lifespan, run_load, use_temp_environment
+
+FILENAME = "bench.m4a"
+RANGE_SIZE = 256 * 1024
+
+
+def create_file(size_mb: int):
+    os.makedirs(os.environ["DOWNLOADS_PATH"], exist_ok=True)
+    with open(os.path.join(os.environ["DOWNLOADS_PATH"], FILENAME), "wb") as f:
+        chunk = os.urandom(1024 * 1024)
+        for _ in range(size_mb):
+            f.write(chunk)
+
+
+async def main(size_mb: int, requests: int, concurrency: int):
+    from app.main import app
+
+    create_file(size_mb)
+    size = size_mb * 1024 * 1024
+    path = f"/audio/{FILENAME}"
+    rng = random.Random(42)
+
+    async with lifespan(app):
+        _, headers, _ = await asgi_request(app, "HEAD", path)
+        etag = headers["etag"]
+
+        async def full(i: int):
+            await asgi_request(app, "GET", path)
+
+        async def revalidate(i: int):
+            status, _, _ = await asgi_request(
+                app, "GET", path, headers=[("If-None-Match", etag)]
+            )
+            assert status == 304
+
+        async def seek(i: int):
+            start = rng.randrange(0, size - RANGE_SIZE)
+            status, _, body = await asgi_request(
+                app,
+                "GET",
+                path,
+                headers=[("Range", f"bytes={start}-{start + RANGE_SIZE - 1}")],
+            )
+            assert status == 206 and len(body) == RANGE_SIZE
+
+        async def head(i: int):
+            await asgi_request(app, "HEAD", path)
+
+        results = {
+            f"GET full ({size_mb} MiB)": await run_load(
+                full, max(requests // 20, 10), concurrency
+            ),
+            "GET If-None-Match (304)": await run_load(revalidate, requests, concurrency),
+            "HEAD": await run_load(head, requests, concurrency),
+            f"GET Range ({RANGE_SIZE // 1024} KiB, random offset)": await run_load(
+                seek, requests, concurrency
+            ),
+        }
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size-mb", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+
+    use_temp_environment()
+    asyncio.run(main(args.size_mb, args.requests, args.concurrency))
@@ -0,0 +1,303 @@
+"""
+Scripted end-to-end scenarios against the offline YouTube stand-in, with
+throughput and p50/p99 latencies reported as JSON so runs can be compared.
+
+    python -m benchmarks.bench_scenarios [--scenarios burst range files stats]
+        [--videos 50] [--video-mb 4] [--rate-mbps 0] [--latency 0.05]
+        [--rows 10000] [--requests 500] [--concurrency 20]
+        [--output results.json] [--compare baseline.json]
+
+  burst   POST /api/downloads/batch with `--videos` new videos and wait for all
+  range   concurrent listeners streaming one file in 256 KiB Range requests
+  files   /api/files over `--rows` completed downloads, first page and full walks
+  stats   /audio/stats over `--rows` files, deep skip vs cursor pages
+
+Every scenario runs in its own interpreter against a scratch database, since
+settings are read at import time.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict
+
+from .bench_db import seed
+from .bench_range import RANGE_SIZE, create_file
+from .common import asgi_request, lifespan, run_load, summarize, use_temp_environment
+
+PROVIDER = "benchmarks.fake_youtube:FakeYouTubeProvider"
+
+SCENARIOS: Dict[str, Callable[[Any, argparse.Namespace], Awaitable[Dict]]] = {}
+
+
+def scenario(name: str):
+    def register(fn):
+        SCENARIOS[name] = fn
+        return fn
+
+    return register
+
+
+@scenario("burst")
+async def download_burst(app, args) -> Dict:
+    from app.core.database import database
+
+    urls = [f"https://www.youtube.com/watch?v=burst{i:06d}" for i in range(args.videos)]
+    started = time.perf_counter()
+    status, _, body = await asgi_request(
+        app,
+        "POST",
+        "/api/downloads/batch",
+        headers=[("Content-Type", "application/json")],
+        body=json.dumps({"urls": urls}).encode(),
+    )
+    submitted = time.perf_counter() - started
+    assert status == 200, body
+    batch_id = json.loads(body)["id"]
+
+    # Polling doubles as a probe of API latency while workers are busy
+    poll_latencies = []
+    while True:
+        poll_started = time.perf_counter()
+        _, _, body = await asgi_request(app, "GET", f"/api/downloads/batch/{batch_id}")
+        poll_latencies.append(time.perf_counter() - poll_started)
+        progress = json.loads(body)["progress"]
+        if progress["completed"] + progress["error"] == progress["total"]:
+            break
+        await asyncio.sleep(0.05)
+    elapsed = time.perf_counter() - started
+
+    rows = await database.fetch_all(
+        "SELECT created_at, completed_at FROM downloads WHERE status = 'completed'"
+    )
+    job_latencies = [
+        (
+            datetime.fromisoformat(row["completed_at"]) - datetime.fromisoformat(row["created_at"])
+        ).total_seconds()
+        for row in rows
+    ]
+    return {
+        "videos": args.videos,
+        "completed": progress["completed"],
+        "errors": progress["error"],
+        "submit_ms": round(submitted * 1000, 3),
+        "elapsed_s": round(elapsed, 3),
+        "videos_per_s": round(progress["completed"] / elapsed, 2),
+        "mb_per_s": round(progress["completed"] * args.video_mb / elapsed, 2),
+        "job_latency": summarize(job_latencies, elapsed) if job_latencies else None,
+        "GET /api/downloads/batch/{id} while downloading": summarize(poll_latencies),
+    }
+
+
+@scenario("range")
+async def range_streaming(app, args) -> Dict:
+    from .bench_range import FILENAME
+
+    create_file(args.video_mb)
+    size = args.video_mb * 1024 * 1024
+    path = f"/audio/{FILENAME}"
+    windows = size // RANGE_SIZE
+
+    # Listener i % concurrency reads the file front to back, one window at a time
+    async def listen(i: int):
+        start = (i // args.concurrency % windows) * RANGE_SIZE
+        status, _, body = await asgi_request(
+            app, "GET", path, headers=[("Range", f"bytes={start}-{start + RANGE_SIZE - 1}")]
+        )
+        assert status == 206 and len(body) == RANGE_SIZE
+
+    result = await run_load(listen, args.requests, args.concurrency)
+    result["mb_per_s"] = round(result["throughput_rps"] * RANGE_SIZE / (1024 * 1024), 1)
+    return {f"GET Range ({RANGE_SIZE // 1024} KiB), {args.concurrency} listeners": result}
+
+
+async def seed_files(rows: int):
+    from app.services.file_index import file_index
+
+    seed(os.environ["DATABASE_PATH"], rows)
+    # A completed download is only listed while its file exists
+    for i in range(rows):
+        with open(os.path.join(os.environ["DOWNLOADS_PATH"], f"video{i:06d}.m4a"), "wb") as f:
+            f.write(b"\0")
+    await file_index.rescan()
+
+
+async def walk(app, path: str, query: str) -> int:
+    pages, cursor = 0, None
+    while True:
+        _, _, body = await asgi_request(
+            app, "GET", path, query + (f"&cursor={cursor}" if cursor else "")
+        )
+        pages += 1
+        cursor = json.loads(body)["next_cursor"]
+        if cursor is None:
+            return pages
+
+
+@scenario("files")
+async def files_listing(app, args) -> Dict:
+    await seed_files(args.rows)
+
+    async def first_page(i: int):
+        await asgi_request(app, "GET", "/api/files", "limit=50")
+
+    async def full_walk(i: int):
+        await walk(app, "/api/files", "limit=500")
+
+    return {
+        "rows": args.rows,
+        "GET /api/files?limit=50": await run_load(first_page, args.requests, args.concurrency),
+        "walk /api/files?limit=500": await run_load(
+            full_walk, max(args.requests // 50, 5), min(args.concurrency, 5)
+        ),
+    }
+
+
+@scenario("stats")
+async def stats_pagination(app, args) -> Dict:
+    await seed_files(args.rows)
+    deepest = max(args.rows - 100, 0)
+
+    async def deep_skip(i: int):
+        await asgi_request(app, "GET", "/audio/stats", f"skip={deepest - i % 100}&limit=100")
+
+    async def cursor_walk(i: int):
+        await walk(app, "/audio/stats", "limit=100")
+
+    return {
+        "rows": args.rows,
+        f"GET /audio/stats?skip={deepest}&limit=100": await run_load(
+            deep_skip, args.requests, args.concurrency
+        ),
+        "walk /audio/stats?limit=100 by cursor": await run_load(
+            cursor_walk, max(args.requests // 100, 5), min(args.concurrency, 5)
+        ),
+    }
+
+
+async def run_scenario(name: str, args: argparse.Namespace) -> Dict:
+    from app.main import app
+
+    async with lifespan(app):
+        return await SCENARIOS[name](app, args)
+
+
+def run_in_subprocess(name: str, argv: list) -> Dict:
+    with tempfile.NamedTemporaryFile(suffix=".json") as output:
+        subprocess.run(
+            [
+                sys.executable,
+                "-m",
+                "benchmarks.bench_scenarios",
+                *argv,
+                "--scenarios",
+                name,
+                "--scenario-output",
+                output.name,
+            ],
+            check=True,
+            stdout=subprocess.DEVNULL,
+        )
+        with open(output.name) as f:
+            return json.load(f)
+
+
+def environment(args: argparse.Namespace) -> Dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True
+        ).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "started_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "commit": commit or None,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "parameters": {
+            key: value
+            for key, value in vars(args).items()
+            if key not in ("output", "compare", "scenario_output")
+        },
+    }
+
+
+def compare(current: Dict, baseline: Dict, path: str = "") -> Dict:
+    """Relative change of every timing and throughput figure, e.g. +0.12 is 12% higher."""
+    changes = {}
+    for key, value in current.items():
+        previous = baseline.get(key) if isinstance(baseline, dict) else None
+        if isinstance(value, dict):
+            changes.update(compare(value, previous or {}, f"{path}{key} / "))
+        elif (
+            isinstance(value, (int, float))
+            and isinstance(previous, (int, float))
+            and previous
+            and key.endswith(("_ms", "_s", "_rps", "_per_s"))
+        ):
+            changes[f"{path}{key}"] = round(value / previous - 1, 3)
+    return changes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--videos", type=int, default=50)
+    parser.add_argument("--video-mb", type=int, default=4)
+    parser.add_argument("--rate-mbps", type=float, default=0, help="per stream, 0 for unlimited")
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--output", help="also write the results to this file")
+    parser.add_argument("--compare", help="results file of an earlier run")
+    parser.add_argument("--scenario-output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.scenario_output:
+        # Child run for one scenario
+        workdir = use_temp_environment()
+        os.makedirs(os.environ["DOWNLOADS_PATH"], exist_ok=True)
+        os.environ.update(
+            YOUTUBE_PROVIDER=PROVIDER,
+            FAKE_YOUTUBE_SIZE=str(args.video_mb * 1024 * 1024),
+            FAKE_YOUTUBE_RATE=str(args.rate_mbps * 1024 * 1024),
+            FAKE_YOUTUBE_LATENCY=str(args.latency),
+            LOG_DIR=os.path.join(workdir, "logs"),
+            LOG_CONSOLE_LEVEL="OFF",
+        )
+        result = asyncio.run(run_scenario(args.scenarios[0], args))
+        with open(args.scenario_output, "w") as f:
+            json.dump(result, f)
+        sys.exit()
+
+    argv = [
+        arg
+        for option, value in vars(args).items()
+        if option not in ("scenarios", "output", "compare", "scenario_output")
+        for arg in (f"--{option.replace('_', '-')}", str(value))
+    ]
+    results = {
+        "environment": environment(args),
+        "scenarios": {name: run_in_subprocess(name, argv) for name in args.scenarios},
+    }
+    if args.compare:
+        with open(args.compare) as f:
+            results["compared_to"] = {
+                "file": args.compare,
+                "changes": compare(results["scenarios"], json.load(f)["scenarios"]),
+            }
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,103 @@
+"""
+Cost of turning /api/files and /audio/stats payloads into response bytes.
+
+Compares FastAPI's default path (validate against the response model, then
+dump with Pydantic) with FAST_JSON_RESPONSES, plus gzip on top.
+
+    python -m benchmarks.bench_serialization [--rows 1000 10000] [--repeat 20]
+"""
+import argparse
+import gzip
+import json
+import time
+import uuid
+from datetime import datetime
+from typing import Callable, Dict, List
+
+from pydantic import TypeAdapter
+
+from app.core.responses import FastJSONResponse, orjson
+from app.models.download import FilePage
+from app.routes.audio import PaginatedStats
+
+
+def files_page(rows: int) -> Dict:
+    now = datetime.utcnow()
+    return {
+        "data": [
+            {
+                "id": str(uuid.uuid4()),
+                "url": f"https://www.youtube.com/watch?v=video{i:06d}",
+                "filename": f"video{i:06d}.m4a",
+                "filepath": f"./downloads/video{i:06d}.m4a",
+                "size": 48_000_000 + i,
+                "created_at": now,
+                "completed_at": now,
+                "video_id": f"video{i:06d}",
+                "videoname": f"Episode {i}",
+                "status": "completed",
+            }
+            for i in range(rows)
+        ],
+        "next_cursor": "WyIyMDI0LTAxLTAxIiwgImlkIl0",
+        "limit": rows,
+    }
+
+
+def stats_page(rows: int) -> Dict:
+    now = datetime.utcnow()
+    return {
+        "data": [
+            {"filename": f"video{i:06d}.m4a", "access_count": rows - i, "last_accessed": now}
+            for i in range(rows)
+        ],
+        "total": rows,
+        "skip": 0,
+        "limit": rows,
+    }
+
+
+def measure(fn: Callable[[], bytes], repeat: int) -> Dict[str, float]:
+    timings: List[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = fn()
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return {
+        "median_ms": round(timings[len(timings) // 2] * 1000, 2),
+        "bytes": len(body),
+    }
+
+
+def run(rows: int, repeat: int) -> Dict[str, Dict]:
+    files = files_page(rows)
+    stats = stats_page(rows)
+    files_adapter = TypeAdapter(FilePage)
+    stats_adapter = TypeAdapter(PaginatedStats)
+
+    fast_files = FastJSONResponse(files).body
+    return {
+        "files: validate + dump (default)": measure(
+            lambda: files_adapter.dump_json(files_adapter.validate_python(files)), repeat
+        ),
+        "files: fast json": measure(lambda: FastJSONResponse(files).body, repeat),
+        "files: fast json + gzip": measure(
+            lambda: gzip.compress(FastJSONResponse(files).body, 6), repeat
+        ),
+        "stats: validate + dump (default)": measure(
+            lambda: stats_adapter.dump_json(stats_adapter.validate_python(stats)), repeat
+        ),
+        "stats: fast json": measure(lambda: FastJSONResponse(stats).body, repeat),
+        "files: gzip ratio": {"ratio": round(len(gzip.compress(fast_files, 6)) / len(fast_files), 3)},
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"fast json backend: {'orjson' if orjson is not None else 'json'}")
+    print(json.dumps({f"{rows} rows": run(rows, args.repeat) for rows in args.rows}, indent=2))
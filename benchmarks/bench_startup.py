@@ -0,0 +1,94 @@
+"""
+Cold start and worker respawn time: a fresh interpreter importing the app
+and running its startup handlers, against an empty database (every
+migration applied) and against an up-to-date one (a uvicorn worker being
+respawned).
+
+    python -m benchmarks.bench_startup [--runs 5]
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from .common import lifespan, use_temp_environment
+
+
+async def startup() -> float:
+    from app.main import app
+
+    started = time.perf_counter()
+    async with lifespan(app):
+        elapsed = time.perf_counter() - started
+    return elapsed
+
+
+def run_child(workdir: str) -> dict:
+    with tempfile.NamedTemporaryFile(suffix=".json") as output:
+        started = time.perf_counter()
+        subprocess.run(
+            [
+                sys.executable,
+                "-m",
+                "benchmarks.bench_startup",
+                "--workdir",
+                workdir,
+                "--output",
+                output.name,
+            ],
+            check=True,
+            stdout=subprocess.DEVNULL,
+        )
+        process = time.perf_counter() - started
+        with open(output.name) as f:
+            result = json.load(f)
+    result["process_s"] = process
+    return result
+
+
+def summarize_runs(runs: list) -> dict:
+    return {
+        key: round(statistics.median(run[key] for run in runs) * 1000, 1)
+        for key in ("import_s", "startup_s", "process_s")
+    }
+
+
+def main(runs: int) -> dict:
+    cold, respawn = [], []
+    for _ in range(runs):
+        workdir = tempfile.mkdtemp(prefix="podcastarr-bench-")
+        cold.append(run_child(workdir))
+        respawn.append(run_child(workdir))
+    return {
+        "cold start, empty database (ms)": summarize_runs(cold),
+        "worker respawn, migrated database (ms)": summarize_runs(respawn),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    parser.add_argument("--output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.output:
+        # Child run: one start of the app in a given scratch directory
+        use_temp_environment(args.workdir)
+        os.environ["LOG_DIR"] = os.path.join(args.workdir, "logs")
+        os.environ["LOG_CONSOLE_LEVEL"] = "OFF"
+
+        started = time.perf_counter()
+        import app.main  # noqa: F401
+
+        result = {"import_s": time.perf_counter() - started}
+        result["startup_s"] = asyncio.run(startup())
+        with open(args.output, "w") as f:
+            json.dump(result, f)
+    else:
+        print(json.dumps(main(args.runs), indent=2))
@@ -0,0 +1,136 @@
+import asyncio
+from contextlib import asynccontextmanager
+import os
+import statistics
+import tempfile
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+
+def use_temp_environment(workdir: Optional[str] = None) -> str:
+    """
+    Point DATABASE_PATH/DOWNLOADS_PATH at a scratch directory. Must run before
+    anything under `app` is imported, since settings are read at import time.
+    """
+    workdir = workdir or tempfile.mkdtemp(prefix="podcastarr-bench-")
+    os.environ["DATABASE_PATH"] = os.path.join(workdir, "data", "downloads.db")
+    os.environ["DOWNLOADS_PATH"] = os.path.join(workdir, "downloads")
+    return workdir
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """Run the app's startup and shutdown handlers, as uvicorn would."""
+    events: asyncio.Queue = asyncio.Queue()
+    started = asyncio.Event()
+    stopped = asyncio.Event()
+
+    async def receive():
+        return await events.get()
+
+    async def send(message):
+        if message["type"].startswith("lifespan.startup"):
+            started.set()
+        elif message["type"].startswith("lifespan.shutdown"):
+            stopped.set()
+
+    task = asyncio.create_task(
+        app({"type": "lifespan", "asgi": {"version": "3.0"}}, receive, send)
+    )
+    await events.put({"type": "lifespan.startup"})
+    await started.wait()
+    try:
+        yield app
+    finally:
+        await events.put({"type": "lifespan.shutdown"})
+        await stopped.wait()
+        await task
+
+
+async def asgi_request(
+    app,
+    method: str,
+    path: str,
+    query: str = "",
+    headers: Iterable[Tuple[str, str]] = (),
+    body: bytes = b"",
+) -> Tuple[int, Dict[str, str], bytes]:
+    """Call an ASGI app in-process, without sockets or an HTTP client."""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0", "spec_version": "2.4"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": [(k.lower().encode(), v.encode()) for k, v in headers],
+        "client": ("127.0.0.1", 50000),
+        "server": ("testserver", 80),
+    }
+    response: Dict[str, Any] = {"status": None, "headers": {}, "body": []}
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = {
+                k.decode(): v.decode() for k, v in message.get("headers", [])
+            }
+        elif message["type"] == "http.response.body":
+            response["body"].append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return response["status"], response["headers"], b"".join(response["body"])
+
+
+async def run_load(
+    request: Callable[[int], Any],
+    total: int,
+    concurrency: int,
+) -> Dict[str, float]:
+    """Fire `total` requests with at most `concurrency` in flight."""
+    latencies: List[float] = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with semaphore:
+            started = time.perf_counter()
+            await request(i)
+            latencies.append(time.perf_counter() - started)
+
+    # Probe how long the event loop is blocked while the load runs
+    loop_lag: List[float] = []
+    done = asyncio.Event()
+
+    async def probe():
+        while not done.is_set():
+            tick = time.perf_counter()
+            await asyncio.sleep(0.001)
+            loop_lag.append(max(time.perf_counter() - tick - 0.001, 0.0))
+
+    probe_task = asyncio.create_task(probe())
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await probe_task
+
+    result = summarize(latencies, elapsed)
+    result["loop_lag_max_ms"] = round(max(loop_lag, default=0.0) * 1000, 3)
+    return result
+
+
+def summarize(latencies: List[float], elapsed: Optional[float] = None) -> Dict[str, float]:
+    ordered = sorted(latencies)
+    elapsed = elapsed if elapsed is not None else sum(ordered)
+    return {
+        "requests": len(ordered),
+        "throughput_rps": round(len(ordered) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(statistics.median(ordered) * 1000, 3),
+        "p99_ms": round(ordered[int(len(ordered) * 0.99) - 1] * 1000, 3),
+    }
@@ -0,0 +1,101 @@
+"""
+Offline stand-in for YouTube, serving synthetic audio.
+
+Select it before `app` is imported, so worker processes pick it up too:
+
+    YOUTUBE_PROVIDER=benchmarks.fake_youtube:FakeYouTubeProvider
+
+Tuned with FAKE_YOUTUBE_SIZE (bytes per video), FAKE_YOUTUBE_RATE (bytes per
+second per stream, 0 for unlimited), FAKE_YOUTUBE_LATENCY (seconds per
+metadata lookup, playlist page and before the first byte) and
+FAKE_YOUTUBE_COLLECTION_SIZE (videos per playlist or channel).
+"""
+import hashlib
+import os
+import time
+from typing import Iterator, List
+from urllib.parse import parse_qs, urlparse
+
+from app.services.youtube_provider import YouTubeProvider
+
+FAKE_YOUTUBE_SIZE = int(os.getenv("FAKE_YOUTUBE_SIZE", str(4 * 1024 * 1024)))
+FAKE_YOUTUBE_RATE = float(os.getenv("FAKE_YOUTUBE_RATE", "0"))
+FAKE_YOUTUBE_LATENCY = float(os.getenv("FAKE_YOUTUBE_LATENCY", "0.05"))
+FAKE_YOUTUBE_COLLECTION_SIZE = int(os.getenv("FAKE_YOUTUBE_COLLECTION_SIZE", "50"))
+CHUNK_SIZE = 64 * 1024
+# Videos per continuation page, as YouTube returns them
+PAGE_SIZE = 100
+
+
+class FakeStream:
+    itag = 140
+    mime_type = "audio/mp4"
+    abr = "128kbps"
+    codecs = ["mp4a.40.2"]
+
+    def __init__(self, video_id: str, size: int):
+        self.filesize = size
+        self.url = f"fake://stream/{video_id}?size={size}"
+
+
+class FakeStreams(List[FakeStream]):
+    def filter(self, **kwargs) -> "FakeStreams":
+        return self
+
+    def get_audio_only(self) -> FakeStream:
+        return self[0]
+
+
+class FakeVideo:
+    def __init__(self, video_id: str, size: int):
+        self.title = f"Synthetic episode {video_id}"
+        self.author = "Benchmark"
+        self.length = max(size // 16000, 1)  # ~128 kbit/s
+        self.streams = FakeStreams([FakeStream(video_id, size)])
+
+
+class FakeYouTubeProvider(YouTubeProvider):
+    def __init__(
+        self,
+        size: int = FAKE_YOUTUBE_SIZE,
+        rate: float = FAKE_YOUTUBE_RATE,
+        latency: float = FAKE_YOUTUBE_LATENCY,
+        collection_size: int = FAKE_YOUTUBE_COLLECTION_SIZE,
+    ):
+        self.size = size
+        self.rate = rate
+        self.latency = latency
+        self.collection_size = collection_size
+
+    def video(self, url: str) -> FakeVideo:
+        time.sleep(self.latency)
+        parsed = urlparse(url)
+        video_id = parse_qs(parsed.query).get("v", [parsed.path.rsplit("/", 1)[-1]])[0]
+        return FakeVideo(video_id, self.size)
+
+    def stream(self, url: str) -> Iterator[bytes]:
+        parsed = urlparse(url)
+        video_id = parsed.path.rsplit("/", 1)[-1]
+        size = int(parse_qs(parsed.query)["size"][0])
+
+        # Distinct content per video, so storage does not dedupe the files
+        block = hashlib.sha256(video_id.encode()).digest() * (CHUNK_SIZE // 32)
+        time.sleep(self.latency)
+        started = time.monotonic()
+        sent = 0
+        while sent < size:
+            chunk = block[: min(CHUNK_SIZE, size - sent)]
+            sent += len(chunk)
+            yield chunk
+            if self.rate > 0:
+                ahead = sent / self.rate - (time.monotonic() - started)
+                if ahead > 0:
+                    time.sleep(ahead)
+
+    def collection(self, url: str) -> Iterator[str]:
+        # Stable video IDs per playlist or channel URL, one page at a time
+        for index in range(self.collection_size):
+            if index % PAGE_SIZE == 0:
+                time.sleep(self.latency)
+            video_id = hashlib.sha256(f"{url}#{index}".encode()).hexdigest()[:11]
+            yield f"https://www.youtube.com/watch?v={video_id}"